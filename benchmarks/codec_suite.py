@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Codec benchmark suite. Generates synthetic messages of every type, close to what spiders and workers send: pages with
+links, requests with Scrapy meta and redirects, batches of scoring log messages, and runs them through every codec.
+Reports encoding and decoding throughput (ops/s), average encoded message size (bytes) and peak memory allocated while
+encoding and decoding a single message (bytes, measured with :mod:`tracemalloc`, MsgPack based codecs allocate 1 MB
+packer buffer for every message). Results are printed as JSON lines, one line per codec and message type, to be
+compared between runs, or as a table::
+
+    python benchmarks/codec_suite.py --messages 2000 > before.jsonl
+    python benchmarks/codec_suite.py --codecs msgpack compact --format table
+"""
+from __future__ import absolute_import, print_function
+
+import json
+import random
+import tracemalloc
+from argparse import ArgumentParser
+from time import time
+
+from frontera.core.models import Request, Response
+from frontera.utils.fingerprint import sha1
+from frontera.utils.misc import load_object
+
+
+CODECS = ['msgpack', 'json', 'fastjson', 'compact']
+LINKS = [10, 100, 1000]
+BATCH = 100
+FIELDS = ['codec', 'type', 'messages', 'bytes', 'encode_ops', 'decode_ops', 'encode_peak', 'decode_peak']
+
+
+def make_domain(host):
+    return {b'name': host.encode(), b'netloc': host.encode(), b'scheme': b'http', b'sld': b'', b'tld': b'',
+            b'subdomain': b'', b'fingerprint': sha1(host)}
+
+
+def make_request(rnd, i):
+    host = 'host%d.example.com' % rnd.randint(0, 1000)
+    url = 'http://%s/catalog/%d/item-%d.html?ref=%d' % (host, rnd.randint(0, 100), i, rnd.randint(0, 10000))
+    meta = {b'fingerprint': sha1(url), b'domain': make_domain(host), b'jid': 1, b'score': rnd.random(),
+            b'state': 0, b'origin_is_frontier': True,
+            b'scrapy_meta': {b'depth': rnd.randint(0, 5), b'download_timeout': 30.0, b'download_slot': host,
+                             b'link_text': 'Item %d' % i, b'dont_retry': False}}
+    if rnd.random() < 0.1:
+        redirects = ['http://%s/r/%d' % (host, n) for n in range(rnd.randint(1, 3))]
+        meta[b'scrapy_meta'][b'redirect_urls'] = redirects
+        meta[b'scrapy_meta'][b'redirect_times'] = len(redirects)
+        meta[b'redirect_urls'] = redirects
+        meta[b'redirect_fingerprints'] = [sha1(redirect) for redirect in redirects]
+        meta[b'redirect_domains'] = [make_domain(host) for _ in redirects]
+    return Request(url, method=b'GET', meta=meta, cookies={b'session': b'%032x' % rnd.getrandbits(128)},
+                   headers={b'Referer': b'http://%s/' % host.encode(), b'Accept-Language': b'en',
+                            b'Accept': b'text/html,application/xhtml+xml'})
+
+
+def make_response(rnd, request, body_size):
+    return Response(request.url, status_code=200, request=request,
+                    headers={b'Content-Type': b'text/html; charset=utf-8', b'Server': b'nginx',
+                             b'Content-Length': str(body_size).encode()},
+                    body=b'x' * body_size)
+
+
+def make_messages(rnd, count):
+    """
+    :return: list of tuples (message type, encode function getter, decode function getter, messages).
+    """
+    requests = [make_request(rnd, i) for i in range(count)]
+    responses = [make_response(rnd, request, rnd.randint(1000, 50000)) for request in requests]
+    encode = lambda name: lambda enc: getattr(enc, name)
+    decode = lambda dec: dec.decode
+    cases = [
+        ('request', encode('encode_request'), lambda dec: dec.decode_request, requests),
+        ('update_score', lambda enc: lambda r: enc.encode_update_score(r, 0.5, True), decode, requests),
+        ('page_crawled', encode('encode_page_crawled'), decode, responses),
+        ('request_error', lambda enc: lambda r: enc.encode_request_error(r, 'DNS lookup failed'), decode, requests),
+        ('offset', lambda enc: lambda i: enc.encode_offset(i % 16, i * 1000), decode, list(range(count))),
+    ]
+    batches = [requests[i:i + BATCH] for i in range(0, count, BATCH)]
+    cases.append(('batch_update_score_%d' % BATCH,
+                  lambda enc: lambda batch: enc.encode_batch([enc.encode_update_score(r, 0.5, True) for r in batch]),
+                  lambda dec: lambda buffer: list(dec.decode_messages(buffer)), batches))
+    for links in LINKS:
+        pages = [(requests[i], [make_request(rnd, n) for n in range(links)])
+                 for i in range(max(10, count // links))]
+        cases.append(('links_extracted_%d' % links, lambda enc: lambda pair: enc.encode_links_extracted(*pair),
+                      decode, pages))
+    return cases
+
+
+def get_peak(func, message):
+    tracemalloc.start()
+    func(message)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def measure(codec, encode, decode, messages, send_body):
+    encoder = load_object('frontera.contrib.backends.remote.codecs.%s.Encoder' % codec)(Request, send_body=send_body)
+    decoder = load_object('frontera.contrib.backends.remote.codecs.%s.Decoder' % codec)(Request, Response)
+    encode, decode = encode(encoder), decode(decoder)
+
+    started = time()
+    encoded = [encode(message) for message in messages]
+    encoding = time() - started
+    started = time()
+    for buffer in encoded:
+        decode(buffer)
+    decoding = time() - started
+
+    sample = range(min(len(messages), 100))
+    return {
+        'messages': len(messages),
+        'bytes': sum(len(buffer) for buffer in encoded) // len(encoded),
+        'encode_ops': int(len(messages) / encoding),
+        'decode_ops': int(len(messages) / decoding),
+        'encode_peak': sum(get_peak(encode, messages[i]) for i in sample) // len(sample),
+        'decode_peak': sum(get_peak(decode, encoded[i]) for i in sample) // len(sample),
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Codec benchmark suite")
+    parser.add_argument('--messages', type=int, default=2000, help="Number of messages of every type")
+    parser.add_argument('--codecs', nargs='+', default=CODECS, help="Codec modules from "
+                                                                    "frontera.contrib.backends.remote.codecs")
+    parser.add_argument('--send-body', action='store_true', help="Encode page_crawled messages with body")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of synthetic messages")
+    parser.add_argument('--format', choices=['json', 'table'], default='json', help="Output format")
+    args = parser.parse_args()
+
+    cases = make_messages(random.Random(args.seed), args.messages)
+    if args.format == 'table':
+        print("%-8s %-22s %8s %10s %12s %12s %12s %12s" % tuple(FIELDS))
+    for name, encode, decode, messages in cases:
+        for codec in args.codecs:
+            result = measure(codec, encode, decode, messages, args.send_body)
+            result.update(codec=codec, type=name)
+            if args.format == 'table':
+                print("%-8s %-22s %8d %10d %12d %12d %12d %12d" % tuple(result[field] for field in FIELDS))
+            else:
+                print(json.dumps(result, sort_keys=True))
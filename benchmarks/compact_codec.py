@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Compares compact codec with msgpack and json codecs: average size of encoded message in bytes, and time of encoding
+and decoding per message.
+
+    python benchmarks/compact_codec.py --messages 20000
+"""
+from __future__ import absolute_import, print_function
+
+from argparse import ArgumentParser
+from time import time
+
+from frontera.contrib.backends.remote.codecs import compact, json, msgpack
+from frontera.core.models import Request, Response
+from frontera.utils.fingerprint import sha1
+
+
+def make_request(i):
+    host = 'host%d.example.com' % (i % 100)
+    return Request('http://%s/some/path/page%d.html' % (host, i), method=b'GET',
+                   headers={b'Referer': b'http://example.com/', b'Accept-Language': b'en',
+                            b'Accept': b'text/html,application/xhtml+xml'},
+                   cookies={b'session': b'0123456789abcdef'},
+                   meta={b'fingerprint': sha1(str(i)), b'depth': 2, b'jid': 0, b'score': 0.5, b'state': 0,
+                         b'domain': {b'name': host.encode(), b'netloc': host.encode(), b'scheme': b'http',
+                                     b'sld': b'', b'tld': b'', b'subdomain': b'', b'fingerprint': sha1(host)},
+                         b'scrapy_meta': {b'download_timeout': 30.0, b'redirect_urls': [], b'dont_retry': False},
+                         b'origin_is_frontier': True})
+
+
+def measure(encode, decode, messages):
+    started = time()
+    encoded = [encode(message) for message in messages]
+    encoding = time() - started
+    started = time()
+    for buffer in encoded:
+        decode(buffer)
+    decoding = time() - started
+    return (sum(len(buffer) for buffer in encoded) / float(len(encoded)),
+            encoding / len(messages) * 1E+6, decoding / len(messages) * 1E+6)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Compact codec benchmark")
+    parser.add_argument('--messages', type=int, default=20000, help="Number of messages")
+    parser.add_argument('--links', type=int, default=20, help="Number of links in links extracted message")
+    args = parser.parse_args()
+
+    requests = [make_request(i) for i in range(args.messages)]
+    links = [(request, requests[:args.links]) for request in requests[:args.messages // args.links]]
+    responses = [Response(request.url, status_code=200, headers={b'Content-Type': b'text/html', b'Server': b'nginx'},
+                          request=request) for request in requests]
+    cases = [
+        ('request', lambda enc: enc.encode_request, lambda dec: dec.decode_request, requests),
+        ('update_score', lambda enc: lambda r: enc.encode_update_score(r, 0.5, True), lambda dec: dec.decode,
+         requests),
+        ('page_crawled', lambda enc: enc.encode_page_crawled, lambda dec: dec.decode, responses),
+        ('links_extracted', lambda enc: lambda pair: enc.encode_links_extracted(*pair), lambda dec: dec.decode,
+         links),
+    ]
+    codecs = [('msgpack', msgpack), ('json', json), ('compact', compact)]
+    print("%-16s %-8s %12s %12s %12s" % ('', 'codec', 'size, B', 'encode, us', 'decode, us'))
+    for name, get_encode, get_decode, messages in cases:
+        for codec_name, codec in codecs:
+            encoder, decoder = codec.Encoder(Request), codec.Decoder(Request, Response)
+            size, encoding, decoding = measure(get_encode(encoder), get_decode(decoder), messages)
+            print("%-16s %-8s %12.0f %12.2f %12.2f" % (name, codec_name, size, encoding, decoding))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Compares throughput of Kafka message bus consumer, polling batches of records, with consumer iterating over records one
+by one, as it was done before. Messages are produced to a topic once, and then read by both consumers from the
+beginning, in new consumer groups. Requires running Kafka broker or compatible service, e.g. Redpanda::
+
+    python benchmarks/kafka_consumer.py --location 127.0.0.1:9092 --messages 100000 --count 512
+"""
+from __future__ import absolute_import, print_function
+
+from argparse import ArgumentParser
+from time import time
+from uuid import uuid4
+
+from kafka import KafkaProducer
+
+from frontera.contrib.messagebus.kafkabus import Consumer
+from frontera.settings import Settings
+
+
+class IteratingConsumer(Consumer):
+    """Consumer iterating over records, stopped by consumer timeout, as it was done before."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs['consumer_timeout_ms'] = 100
+        super(IteratingConsumer, self).__init__(*args, **kwargs)
+
+    def get_messages(self, timeout=0.1, count=1):
+        result = []
+        while count > 0:
+            try:
+                m = next(self._consumer)
+                result.append(m.value)
+                count -= 1
+            except StopIteration:
+                break
+        return result
+
+
+def produce(location, topic, messages, size):
+    producer = KafkaProducer(bootstrap_servers=location)
+    body = b'x' * size
+    for _ in range(messages):
+        producer.send(topic, value=body)
+    producer.flush()
+    producer.close()
+
+
+def consume(consumer_cls, location, topic, messages, count, fetch_kwargs):
+    consumer = consumer_cls(location, False, None, topic, 'benchmark-%s' % uuid4().hex, 0,
+                            auto_offset_reset='earliest', **fetch_kwargs)
+    received = calls = 0
+    started = time()
+    while received < messages:
+        batch = consumer.get_messages(timeout=1.0, count=count)
+        if not batch and time() - started > 60:
+            break
+        received += len(batch)
+        calls += 1
+    elapsed = time() - started
+    consumer.close()
+    return received, calls, elapsed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Kafka consumer benchmark")
+    parser.add_argument('--location', default='127.0.0.1:9092', help="Kafka broker host:port")
+    parser.add_argument('--messages', type=int, default=100000, help="Number of messages")
+    parser.add_argument('--size', type=int, default=200, help="Size of message, bytes")
+    parser.add_argument('--count', type=int, default=512, help="Count of get_messages")
+    args = parser.parse_args()
+
+    settings = Settings()
+    fetch_kwargs = {
+        'fetch_min_bytes': settings.get('KAFKA_FETCH_MIN_BYTES'),
+        'fetch_max_bytes': settings.get('KAFKA_FETCH_MAX_BYTES'),
+        'fetch_max_wait_ms': settings.get('KAFKA_FETCH_MAX_WAIT_MS'),
+        'max_partition_fetch_bytes': settings.get('KAFKA_MAX_PARTITION_FETCH_BYTES'),
+    }
+    topic = 'benchmark-%s' % uuid4().hex
+    produce(args.location, topic, args.messages, args.size)
+    print("%-10s %10s %10s %10s %12s" % ('consumer', 'received', 'calls', 'seconds', 'msg/s'))
+    for name, consumer_cls in [('iterating', IteratingConsumer), ('polling', Consumer)]:
+        received, calls, elapsed = consume(consumer_cls, args.location, topic, args.messages, args.count,
+                                           fetch_kwargs)
+        print("%-10s %10d %10d %10.2f %12d" % (name, received, calls, elapsed, received / elapsed))
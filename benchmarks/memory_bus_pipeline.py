@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline throughput over in-process message bus, without broker. Spider, strategy worker and DB worker are simulated by
+threads of one process, passing messages of the same types and with the same encoding, as the real components do:
+spider sends crawled pages and extracted links to spider log, strategy worker scores the links and sends them to
+scoring log, DB worker schedules them to spider feed, which is read by spider. Reports pages and messages per second
+for every codec, including passthrough codec, which doesn't serialize messages at all::
+
+    python benchmarks/memory_bus_pipeline.py --pages 2000 --links 20 --codecs passthrough msgpack compact
+"""
+from __future__ import absolute_import, print_function
+
+from argparse import ArgumentParser
+from threading import Thread, Event
+from time import time
+
+from frontera.core.models import Request, Response
+from frontera.settings import Settings
+from frontera.utils.fingerprint import sha1
+from frontera.utils.misc import load_object
+
+
+CODECS = ['passthrough', 'msgpack', 'compact']
+
+
+def make_request(url):
+    return Request(url, meta={b'fingerprint': sha1(url), b'jid': 0, b'domain': {b'name': b'example.com',
+                                                                            b'fingerprint': sha1('example.com')}})
+
+
+class Pipeline(object):
+    def __init__(self, message_bus, codec, settings):
+        self.bus = load_object(message_bus)(settings)
+        self.encoder = load_object('frontera.contrib.backends.remote.codecs.%s.Encoder' % codec)(Request)
+        self.decoder = load_object('frontera.contrib.backends.remote.codecs.%s.Decoder' % codec)(Request, Response)
+        self.stop = Event()
+        # messages received by every component, counted separately by threads
+        self.messages = {}
+
+    def strategy_worker(self):
+        consumer = self.bus.spider_log().consumer(partition_id=0, type=b'sw')
+        producer = self.bus.scoring_log().producer()
+        self.messages['sw'] = 0
+        while not self.stop.is_set():
+            for buffer in consumer.get_messages(timeout=0.1, count=512):
+                for event in self.decoder.decode_messages(buffer):
+                    self.messages['sw'] += 1
+                    if event[0] == 'links_extracted':
+                        for link in event[2]:
+                            producer.send(None, self.encoder.encode_update_score(link, 0.5, True))
+
+    def db_worker(self):
+        spider_log = self.bus.spider_log().consumer(partition_id=None, type=b'db')
+        scoring_log = self.bus.scoring_log().consumer()
+        producer = self.bus.spider_feed().producer()
+        self.messages['db'] = 0
+        while not self.stop.is_set():
+            for buffer in spider_log.get_messages(timeout=0.01, count=512):
+                for _ in self.decoder.decode_messages(buffer):
+                    self.messages['db'] += 1
+            for buffer in scoring_log.get_messages(timeout=0.01, count=512):
+                for event in self.decoder.decode_messages(buffer):
+                    self.messages['db'] += 1
+                    producer.send(b'example.com', self.encoder.encode_request(event[1]))
+
+    def spider(self, pages, links):
+        producer = self.bus.spider_log().producer()
+        consumer = self.bus.spider_feed().consumer(0)
+        for i in range(pages):
+            request = make_request('http://example.com/page/%d' % i)
+            producer.send(request.meta[b'fingerprint'], self.encoder.encode_page_crawled(
+                Response(request.url, body=b'x' * 1000, request=request)))
+            producer.send(request.meta[b'fingerprint'], self.encoder.encode_links_extracted(
+                request, [make_request('http://example.com/page/%d/link/%d' % (i, n)) for n in range(links)]))
+        received = 0
+        while received < pages * links:
+            buffers = consumer.get_messages(timeout=2.0, count=512)
+            if not buffers:
+                break
+            for buffer in buffers:
+                self.decoder.decode_request(buffer)
+                received += 1
+        self.messages['spider'] = received
+        return received
+
+    def run(self, pages, links):
+        threads = [Thread(target=self.strategy_worker), Thread(target=self.db_worker)]
+        for thread in threads:
+            thread.start()
+        started = time()
+        received = self.spider(pages, links)
+        elapsed = time() - started
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+        return received, elapsed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Pipeline throughput over message bus")
+    parser.add_argument('--pages', type=int, default=2000, help="Number of crawled pages")
+    parser.add_argument('--links', type=int, default=20, help="Number of links extracted from every page")
+    parser.add_argument('--codecs', nargs='+', default=CODECS, help="Codec modules from "
+                                                                    "frontera.contrib.backends.remote.codecs")
+    parser.add_argument('--message-bus', default='frontera.contrib.messagebus.memory.MessageBus',
+                        help="Message bus class")
+    args = parser.parse_args()
+
+    print("%-12s %10s %10s %12s %12s" % ('codec', 'requests', 'seconds', 'pages/s', 'messages/s'))
+    for codec in args.codecs:
+        settings = Settings()
+        settings.set('SPIDER_LOG_PARTITIONS', 1)
+        settings.set('SPIDER_FEED_PARTITIONS', 1)
+        for topic in ['SPIDER_LOG_TOPIC', 'SPIDER_FEED_TOPIC', 'SCORING_LOG_TOPIC', 'STATS_LOG_TOPIC']:
+            settings.set(topic, '%s-%s' % (settings.get(topic), codec))
+        pipeline = Pipeline(args.message_bus, codec, settings)
+        received, elapsed = pipeline.run(args.pages, args.links)
+        print("%-12s %10d %10.2f %12d %12d" % (codec, received, elapsed, args.pages / elapsed,
+                                               sum(pipeline.messages.values()) / elapsed))
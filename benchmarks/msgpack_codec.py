@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Compares msgpack codec copying request meta with ``restruct_for_pack`` before packing against packing with ``default``
+hook: time per message and memory temporarily allocated per message, measured with :mod:`tracemalloc` as the peak of
+traced memory during encoding of a single message, less the peak of packing an empty list (packer buffer).
+
+    python benchmarks/msgpack_codec.py --messages 20000
+"""
+from __future__ import absolute_import, print_function
+
+import tracemalloc
+from argparse import ArgumentParser
+from time import time
+
+from msgpack import packb
+
+from frontera.contrib.backends.remote.codecs.msgpack import Encoder
+from frontera.core.models import Request
+from frontera.utils.msgpack import restruct_for_pack
+
+
+class RestructEncoder(Encoder):
+    """Encoder packing request meta copied with restruct_for_pack, as it was done before."""
+
+    def _prepare(self, request):
+        return [request.url, request.method, request.headers, request.cookies, restruct_for_pack(request.meta)]
+
+    def encode_request(self, request):
+        return packb(self._prepare(request), use_bin_type=True)
+
+    def encode_update_score(self, request, score, schedule):
+        return packb([b'us', self._prepare(request), score, schedule], use_bin_type=True)
+
+    def encode_links_extracted(self, request, links):
+        return packb([b'le', self._prepare(request), [self._prepare(link) for link in links]], use_bin_type=True)
+
+
+def make_request(i):
+    fprint = b'%040x' % i
+    return Request('http://host%d.example.com/some/path/page%d.html' % (i % 100, i),
+                   headers={b'Referer': b'http://example.com/', b'Accept-Language': b'en'},
+                   cookies={b'session': b'0123456789abcdef'},
+                   meta={b'fingerprint': fprint, b'depth': 2, b'jid': 0, b'score': 0.5, b'state': 0,
+                         b'domain': {b'name': b'host%d.example.com' % (i % 100), b'fingerprint': fprint[:8]},
+                         b'scrapy_meta': {b'download_timeout': 30.0, b'download_slot': 'host%d' % (i % 100),
+                                          b'redirect_urls': [], b'dont_retry': False},
+                         b'origin_is_frontier': True})
+
+
+def get_peak(func, message):
+    tracemalloc.start()
+    func(message)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def measure(func, messages):
+    started = time()
+    for message in messages:
+        func(message)
+    elapsed = time() - started
+
+    baseline = get_peak(packb, [])
+    peaks = [get_peak(func, message) - baseline for message in messages[:1000]]
+    return elapsed / len(messages) * 1E+6, sum(peaks) / float(len(peaks))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Msgpack codec benchmark")
+    parser.add_argument('--messages', type=int, default=20000, help="Number of messages")
+    parser.add_argument('--links', type=int, default=20, help="Number of links in links extracted message")
+    args = parser.parse_args()
+
+    requests = [make_request(i) for i in range(args.messages)]
+    links = [(request, requests[:args.links]) for request in requests[:args.messages // args.links]]
+    cases = [
+        ('request', lambda enc: enc.encode_request, requests),
+        ('update_score', lambda enc: lambda r: enc.encode_update_score(r, 0.5, True), requests),
+        ('links_extracted', lambda enc: lambda pair: enc.encode_links_extracted(*pair), links),
+    ]
+    print("%-16s %14s %14s %14s %14s" % ('', 'restruct, us', 'default, us', 'restruct, B', 'default, B'))
+    for name, get_func, messages in cases:
+        restruct = measure(get_func(RestructEncoder(Request)), messages)
+        default = measure(get_func(Encoder(Request)), messages)
+        print("%-16s %14.2f %14.2f %14.0f %14.0f" % (name, restruct[0], default[0], restruct[1], default[1]))
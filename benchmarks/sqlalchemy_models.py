@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Compares SQLAlchemy backend queue and metadata models with pickled columns against packed models on SQLite file
+database: time of scheduling and dequeuing, time of metadata writes and the resulting database size.
+
+    python benchmarks/sqlalchemy_models.py --requests 20000
+"""
+from __future__ import absolute_import, print_function
+
+from argparse import ArgumentParser
+from os.path import getsize, join
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+
+from frontera.contrib.backends.sqlalchemy.components import Metadata, Queue
+from frontera.contrib.backends.sqlalchemy.models import MetadataModel, QueueModel, PackedMetadataModel, \
+    PackedQueueModel
+from frontera.core.models import Request
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def make_requests(count, hosts):
+    requests = []
+    for i in range(count):
+        fprint = b'%040x' % i
+        r = Request('http://host%d.example.com/some/path/page%d.html?query=%d' % (i % hosts, i, i),
+                    headers={b'Referer': b'http://example.com/', b'Accept-Language': b'en'},
+                    cookies={b'session': b'0123456789abcdef'},
+                    meta={b'fingerprint': fprint, b'depth': 2, b'jid': 0, b'origin_is_frontier': True,
+                          b'domain': {b'name': b'host%d.example.com' % (i % hosts), b'fingerprint': fprint[:8]},
+                          b'scrapy_meta': {b'download_timeout': 30.0}})
+        requests.append(r)
+    return requests
+
+
+def run(path, metadata_model, queue_model, requests, batch_size):
+    engine = create_engine('sqlite:///' + path)
+    session_cls = sessionmaker()
+    session_cls.configure(bind=engine)
+    metadata_model.__table__.create(bind=engine)
+    queue_model.__table__.create(bind=engine)
+    metadata = Metadata(session_cls, metadata_model, 10000)
+    queue = Queue(session_cls, queue_model, 1)
+
+    result = {}
+    started = time()
+    for i in range(0, len(requests), batch_size):
+        metadata.links_extracted(None, requests[i:i + batch_size])
+    result['metadata_write'] = time() - started
+
+    started = time()
+    for i in range(0, len(requests), batch_size):
+        queue.schedule([(r.meta[b'fingerprint'], 0.5, r, True) for r in requests[i:i + batch_size]])
+    result['schedule'] = time() - started
+    result['size'] = getsize(path)
+
+    started = time()
+    dequeued = 0
+    while True:
+        batch = queue.get_next_requests(batch_size, 0, max_requests_per_host=batch_size)
+        if not batch:
+            break
+        dequeued += len(batch)
+    result['get_next_requests'] = time() - started
+    assert dequeued == len(requests)
+
+    metadata.frontier_stop()
+    queue.frontier_stop()
+    engine.dispose()
+    return result
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="SQLAlchemy backend models benchmark")
+    parser.add_argument('--requests', type=int, default=20000, help="Number of requests")
+    parser.add_argument('--hosts', type=int, default=100, help="Number of hosts")
+    parser.add_argument('--batch-size', type=int, default=256, help="Batch size")
+    args = parser.parse_args()
+
+    requests = make_requests(args.requests, args.hosts)
+    tmpdir = mkdtemp()
+    try:
+        pickled = run(join(tmpdir, 'pickled.db'), MetadataModel, QueueModel, requests, args.batch_size)
+        packed = run(join(tmpdir, 'packed.db'), PackedMetadataModel, PackedQueueModel, requests, args.batch_size)
+    finally:
+        rmtree(tmpdir)
+
+    print("%-20s %12s %12s %8s" % ('', 'pickled', 'packed', 'ratio'))
+    for key in ['metadata_write', 'schedule', 'get_next_requests', 'size']:
+        print("%-20s %12.3f %12.3f %8.2f" % (key, pickled[key], packed[key], packed[key] / float(pickled[key])))
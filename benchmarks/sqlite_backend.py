@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Compares SQLAlchemy backend on SQLite against raw sqlite3 backend on a database file: metadata writes, states flush
+and fetch, scheduling and dequeuing with per host limit.
+
+    python benchmarks/sqlite_backend.py --requests 20000
+"""
+from __future__ import absolute_import, print_function
+
+from argparse import ArgumentParser
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+
+from frontera.core.components import States
+from frontera.core.manager import LocalFrontierManager
+from frontera.core.models import Request
+from frontera.settings import Settings
+
+
+def make_requests(count, hosts):
+    requests = []
+    for i in range(count):
+        fprint = b'%040x' % i
+        r = Request('http://host%d.example.com/some/path/page%d.html' % (i % hosts, i),
+                    headers={b'Referer': b'http://example.com/'},
+                    meta={b'fingerprint': fprint, b'depth': 2, b'jid': 0,
+                          b'domain': {b'name': b'host%d.example.com' % (i % hosts), b'fingerprint': fprint[:8]}})
+        requests.append(r)
+    return requests
+
+
+def timed(result, key, func, *args):
+    started = time()
+    func(*args)
+    result[key] = result.get(key, 0.0) + time() - started
+
+
+def run(settings, requests, batch_size):
+    manager = LocalFrontierManager.from_settings(settings)
+    backend = manager.backend
+    result = {}
+    for i in range(0, len(requests), batch_size):
+        batch = requests[i:i + batch_size]
+        timed(result, 'links_extracted', backend.metadata.links_extracted, None, batch)
+        for r in batch:
+            r.meta[b'state'] = States.QUEUED
+        timed(result, 'states_flush', lambda: (backend.states.update_cache(batch), backend.states.flush()))
+        timed(result, 'schedule', backend.queue.schedule, [(r.meta[b'fingerprint'], 0.5, r, True) for r in batch])
+
+    backend.states._cache.clear()
+    fingerprints = [r.meta[b'fingerprint'] for r in requests]
+    for i in range(0, len(fingerprints), batch_size):
+        timed(result, 'states_fetch', backend.states.fetch, fingerprints[i:i + batch_size])
+
+    dequeued = []
+
+    def dequeue():
+        while True:
+            batch = backend.queue.get_next_requests(batch_size, 0, max_requests_per_host=10, min_requests=1,
+                                                    min_hosts=1)
+            if not batch:
+                break
+            dequeued.extend(batch)
+    timed(result, 'get_next_requests', dequeue)
+    assert len(dequeued) == len(requests)
+    manager.stop()
+    return result
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="SQLite backends benchmark")
+    parser.add_argument('--requests', type=int, default=20000, help="Number of requests")
+    parser.add_argument('--hosts', type=int, default=100, help="Number of hosts")
+    parser.add_argument('--batch-size', type=int, default=256, help="Batch size")
+    args = parser.parse_args()
+
+    tmpdir = mkdtemp()
+    try:
+        settings = Settings()
+        settings.BACKEND = 'frontera.contrib.backends.sqlalchemy.Distributed'
+        settings.SQLALCHEMYBACKEND_ENGINE = 'sqlite:///' + join(tmpdir, 'sqlalchemy.db')
+        sqlalchemy = run(settings, make_requests(args.requests, args.hosts), args.batch_size)
+
+        settings = Settings()
+        settings.BACKEND = 'frontera.contrib.backends.sqlite.SQLiteBackend'
+        settings.SQLITE_DATABASE = join(tmpdir, 'sqlite.db')
+        sqlite = run(settings, make_requests(args.requests, args.hosts), args.batch_size)
+    finally:
+        rmtree(tmpdir)
+
+    print("%-20s %12s %12s %8s" % ('', 'sqlalchemy', 'sqlite', 'speedup'))
+    for key in ['links_extracted', 'states_flush', 'states_fetch', 'schedule', 'get_next_requests']:
+        print("%-20s %12.3f %12.3f %8.1f" % (key, sqlalchemy[key], sqlite[key], sqlalchemy[key] / sqlite[key]))
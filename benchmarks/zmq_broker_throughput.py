@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Measures throughput of ZeroMQ broker in event loop and threaded modes. For every mode the broker is started in a
+separate process, producer processes send spider log messages as fast as they can, and strategy worker and DB worker
+consumers count received messages. Reports messages per second delivered to each consumer, and share of messages lost
+on high water marks::
+
+    python benchmarks/zmq_broker_throughput.py --producers 2 --messages 50000 --size 200
+"""
+from __future__ import absolute_import, print_function
+
+import subprocess
+import sys
+from argparse import ArgumentParser
+from multiprocessing import get_context
+from time import time, sleep
+
+from frontera.contrib.messagebus.zeromq import MessageBus
+from frontera.settings import Settings
+
+
+MODES = [('loop', []), ('threaded', ['--threaded'])]
+
+
+def get_settings(port):
+    settings = Settings()
+    settings.set('ZMQ_BASE_PORT', port)
+    settings.set('SPIDER_LOG_PARTITIONS', 1)
+    return settings
+
+
+def produce(port, messages, size):
+    producer = MessageBus(get_settings(port)).spider_log().producer()
+    sleep(1.0)
+    body = b'x' * size
+    for _ in range(messages):
+        producer.send(b'0' * 40, body)
+    producer.flush()
+    sleep(1.0)
+
+
+def consume(consumers, idle_timeout=2.0, startup=5.0):
+    """
+    :return: list of tuples (received messages, seconds between first and last message) of every consumer.
+    """
+    counts = [0] * len(consumers)
+    first, last = [None] * len(consumers), [None] * len(consumers)
+    idle_since = time() + startup
+    while time() - idle_since < idle_timeout:
+        for i, consumer in enumerate(consumers):
+            for _ in consumer.get_messages(timeout=0.01, count=1024):
+                now = time()
+                if first[i] is None:
+                    first[i] = now
+                last[i] = now
+                counts[i] += 1
+                idle_since = now
+    return [(count, (end - start) if count else 0.0) for count, start, end in zip(counts, first, last)]
+
+
+def run(mode_args, port, producers, messages, size):
+    broker = subprocess.Popen([sys.executable, '-m', 'frontera.contrib.messagebus.zeromq.broker', '--port', str(port),
+                               '--log-level', 'WARN'] + mode_args, stderr=subprocess.DEVNULL)
+    try:
+        sleep(1.0)
+        spider_log = MessageBus(get_settings(port)).spider_log()
+        consumers = [spider_log.consumer(partition_id=0, type=b'sw'), spider_log.consumer(partition_id=None, type=b'db')]
+        # ZeroMQ context of message bus is created on import, so it can't be shared with forked processes
+        processes = [get_context('spawn').Process(target=produce, args=(port, messages, size)) for _ in range(producers)]
+        for process in processes:
+            process.start()
+        results = consume(consumers)
+        for process in processes:
+            process.join()
+        return results
+    finally:
+        broker.terminate()
+        broker.wait()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="ZeroMQ broker throughput benchmark")
+    parser.add_argument('--producers', type=int, default=2, help="Number of producer processes")
+    parser.add_argument('--messages', type=int, default=50000, help="Number of messages sent by every producer")
+    parser.add_argument('--size', type=int, default=200, help="Size of message body, bytes")
+    parser.add_argument('--port', type=int, default=5620, help="Base port of broker")
+    args = parser.parse_args()
+
+    sent = args.producers * args.messages
+    print("%-10s %-10s %12s %12s %8s" % ('mode', 'consumer', 'received', 'msg/s', 'lost, %'))
+    for name, mode_args in MODES:
+        results = run(mode_args, args.port, args.producers, args.messages, args.size)
+        for consumer, (received, elapsed) in zip(['sw', 'db'], results):
+            print("%-10s %-10s %12d %12d %8.1f" % (name, consumer, received, received / elapsed if elapsed else 0,
+                                                  100.0 * (sent - received) / sent))
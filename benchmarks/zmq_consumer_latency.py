@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Measures end-to-end latency of ZeroMQ message bus through the local broker, and CPU time of consumer process, for
+consumer waiting on poller and consumer polling the socket with sleeps of a tenth of timeout between attempts, as it
+was done before. Producer sends messages with a timestamp, at random intervals. The broker has to be running::
+
+    python -m frontera.contrib.messagebus.zeromq.broker &
+    python benchmarks/zmq_consumer_latency.py --messages 2000 --timeout 1.0
+"""
+from __future__ import absolute_import, print_function
+
+import random
+from argparse import ArgumentParser
+from struct import pack, unpack
+from threading import Thread
+from time import time, sleep
+
+import zmq
+
+from frontera.contrib.messagebus.zeromq import MessageBus, Consumer
+from frontera.settings import Settings
+
+try:
+    from time import process_time
+except ImportError:
+    from time import clock as process_time
+
+
+class SleepingConsumer(Consumer):
+    """Consumer sleeping between attempts to receive, as it was done before."""
+
+    def get_messages(self, timeout=0.1, count=1):
+        started = time()
+        sleep_time = timeout / 10.0
+        while count:
+            try:
+                msg = self.subscriber.recv_multipart(copy=True, flags=zmq.NOBLOCK)
+            except zmq.Again:
+                if time() - started > timeout:
+                    break
+                sleep(sleep_time)
+            else:
+                yield msg[1]
+                count -= 1
+
+
+def produce(stream, messages, interval):
+    producer = stream.producer()
+    sleep(0.5)
+    for _ in range(messages):
+        producer.send(None, pack('>d', time()))
+        sleep(random.uniform(0, 2 * interval))
+    producer.send(None, b'stop')
+
+
+def consume(consumer, timeout, count):
+    latencies = []
+    started = process_time()
+    while True:
+        for message in consumer.get_messages(timeout=timeout, count=count):
+            if message == b'stop':
+                return latencies, process_time() - started
+            latencies.append(time() - unpack('>d', message)[0])
+
+
+def percentile(values, q):
+    return sorted(values)[int(len(values) * q)]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="ZeroMQ consumer latency benchmark")
+    parser.add_argument('--messages', type=int, default=2000, help="Number of messages")
+    parser.add_argument('--interval', type=float, default=0.002, help="Average interval between messages, s")
+    parser.add_argument('--timeout', type=float, default=1.0, help="Timeout of get_messages, s")
+    parser.add_argument('--count', type=int, default=512, help="Count of get_messages")
+    args = parser.parse_args()
+
+    bus = MessageBus(Settings())
+    stream = bus.scoring_log()
+    location = stream.out_location
+    print("%-10s %12s %12s %12s %12s" % ('consumer', 'mean, ms', 'p50, ms', 'p99, ms', 'cpu, s'))
+    for name, consumer_cls in [('sleeping', SleepingConsumer), ('poller', Consumer)]:
+        consumer = consumer_cls(bus.context, location, None, b'us')
+        producer = Thread(target=produce, args=(stream, args.messages, args.interval))
+        producer.start()
+        latencies, cpu = consume(consumer, args.timeout, args.count)
+        producer.join()
+        consumer.subscriber.close()
+        print("%-10s %12.3f %12.3f %12.3f %12.3f" % (name, sum(latencies) / len(latencies) * 1000,
+                                                    percentile(latencies, 0.5) * 1000,
+                                                    percentile(latencies, 0.99) * 1000, cpu))
@@ -7,6 +7,7 @@ from frontera.contrib.backends.partitioners import Crc32NamePartitioner
 from frontera.utils.misc import chunks, get_crc32, time_elapsed
 from frontera.contrib.backends.remote.codecs.msgpack import Decoder, Encoder
 from frontera.contrib.backends.hbase.domaincache import DomainCache
+from frontera.contrib.backends.revisiting import RevisitingQueue
 
 from happybase import Connection
 from msgpack import Unpacker, Packer, packb
@@ -25,6 +26,11 @@ from random import choice
 from collections import defaultdict, Iterable
 import logging
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 _pack_functions = {
     'url': to_bytes,
     'depth': lambda x: pack('>I', 0),
@@ -82,11 +88,50 @@ class LRUCacheWithStats(LRUCache):
         return key, val
 
 
+def get_buckets(scores, count):
+    """
+    Maps scores from 0.0 to 1.0 to ``count`` equal intervals, the last interval is inclusive from right. Computed
+    for the whole batch at once with NumPy, if it's installed.
+
+    :param scores: list of floats
+    :param int count: number of intervals
+    :return: list of interval indexes
+    """
+    if np is not None:
+        values = np.asarray(scores, dtype=np.float64)
+        if not ((values >= 0.0) & (values <= 1.0)).all():
+            raise OverflowError
+        return np.minimum((values * count).astype(np.int64), count - 1).tolist()
+    buckets = []
+    for score in scores:
+        if not 0.0 <= score <= 1.0:
+            raise OverflowError
+        buckets.append(min(int(score * count), count - 1))
+    return buckets
+
+
 class HBaseQueue(Queue):
+    """
+    Row keys are either strings ``<partition id>_<score interval>_<timestamp>``, or, if ``binary_keys`` is set,
+    binary keys packed as 4 bytes partition id, 1 byte score interval index and 8 bytes timestamp. Binary column
+    qualifiers are 2 bytes score interval indexes. Layouts can't be mixed within the same table.
+
+    Number of requests in every partition is kept in HBase counters in ``counts`` row of the queue table, in ``f:<partition
+    id>`` columns. Counters are initialized by a scan of the queue table when the row is missing.
+
+    If ``dedup`` is set, every queued fingerprint has a marker row ``fp:<binary fingerprint>`` in the queue table with
+    the row key and column of its queue cell. Scheduling of already queued fingerprint removes the previous entry, so
+    it works as a score update. Markers are removed together with their entries.
+    """
     GET_RETRIES = 3
+    COUNTS_ROW = b'counts'
+    MARKER_PREFIX = b'fp:'
 
-    def __init__(self, connection, partitions, table_name, drop=False, use_snappy=False):
+    def __init__(self, connection, partitions, table_name, drop=False, use_snappy=False, binary_keys=False,
+                 dedup=False):
         self.connection = connection
+        self.binary_keys = binary_keys
+        self.dedup = dedup
         self.partitions = [i for i in range(0, partitions)]
         self.partitioner = Crc32NamePartitioner(self.partitions)
         self.logger = logging.getLogger("hbase.queue")
@@ -98,16 +143,68 @@ class HBaseQueue(Queue):
             tables.remove(self.table_name)
 
         if self.table_name not in tables:
-            schema = {'f': {'max_versions': 1}}
-            if use_snappy:
-                schema['f']['compression'] = 'SNAPPY'
-            self.connection.create_table(self.table_name, schema)
+            self.connection.create_table(self.table_name, self.get_schema(use_snappy))
 
         class DumbResponse:
             pass
 
         self.decoder = Decoder(Request, DumbResponse)
         self.encoder = Encoder(Request)
+        self._init_counts()
+
+    @staticmethod
+    def get_schema(use_snappy=False):
+        schema = {'f': {'max_versions': 1}}
+        if use_snappy:
+            schema['f']['compression'] = 'SNAPPY'
+        return schema
+
+    def _count_column(self, partition_id):
+        return to_bytes('f:%d' % partition_id)
+
+    def _prefix(self, partition_id):
+        if self.binary_keys:
+            return pack('>I', partition_id)
+        return to_bytes('%d_' % partition_id)
+
+    def _row_key(self, partition_id, interval, timestamp):
+        if self.binary_keys:
+            return pack('>IBQ', partition_id, interval, timestamp)
+        return to_bytes('%d_%0.2f_%0.2f_%d' % (partition_id, interval / 100, (interval + 1) / 100, timestamp))
+
+    def _row_partition(self, rk):
+        if self.binary_keys:
+            return unpack('>I', rk[:4])[0]
+        return int(rk.split(b'_', 1)[0])
+
+    def _marker_key(self, fingerprint):
+        return self.MARKER_PREFIX + fingerprint
+
+    def _row_timestamp(self, rk):
+        if self.binary_keys:
+            return unpack('>Q', rk[-8:])[0]
+        return int(rk.rsplit(b'_', 1)[1])
+
+    def _column(self, interval):
+        if self.binary_keys:
+            return b'f:' + pack('>H', interval)
+        return to_bytes('f:%0.3f_%0.3f' % (interval / 1000, (interval + 1) / 1000))
+
+    def _init_counts(self):
+        table = self.connection.table(self.table_name)
+        if table.row(self.COUNTS_ROW):
+            return
+        for partition_id in self.partitions:
+            count = 0
+            for _, data in table.scan(row_prefix=self._prefix(partition_id), batch_size=256):
+                count += sum(1 for cq, buf in six.iteritems(data) if cq != b'f:t' for _ in Unpacker(BytesIO(buf)))
+            table.counter_set(self.COUNTS_ROW, self._count_column(partition_id), count)
+
+    def _update_counts(self, deltas):
+        table = self.connection.table(self.table_name)
+        for partition_id, delta in six.iteritems(deltas):
+            if delta:
+                table.counter_inc(self.COUNTS_ROW, self._count_column(partition_id), delta)
 
     def frontier_start(self):
         pass
@@ -135,9 +232,9 @@ class HBaseQueue(Queue):
 
         Where score is mapped from 0.0 to 1.0
         score intervals are
+          [0.00-0.01)
           [0.01-0.02)
           [0.02-0.03)
-          [0.03-0.04)
          ...
           [0.99-1.00]
         random_str - the time when links was scheduled for retrieval, microsecs
@@ -145,18 +242,8 @@ class HBaseQueue(Queue):
         :param batch: iterable of Request objects
         :return:
         """
-
-        def get_interval(score, resolution):
-            if score < 0.0 or score > 1.0:
-                raise OverflowError
-
-            i = int(score / resolution)
-            if i % 10 == 0 and i > 0:
-                i = i - 1  # last interval is inclusive from right
-            return (i * resolution, (i + 1) * resolution)
-
         random_str = int(time() * 1E+6)
-        data = dict()
+        partition_ids, items = [], []
         for request, score in batch:
             domain = request.meta[b'domain']
             fingerprint = request.meta[b'fingerprint']
@@ -172,21 +259,35 @@ class HBaseQueue(Queue):
                 key_crc32 = domain
             else:
                 raise TypeError("partitioning key and info isn't provided")
-            item = (unhexlify(fingerprint), key_crc32, self.encoder.encode_request(request), score)
-            score = 1 - score  # because of lexicographical sort in HBase
-            rk = "%d_%s_%d" % (partition_id, "%0.2f_%0.2f" % get_interval(score, 0.01), random_str)
-            data.setdefault(rk, []).append((score, item))
+            partition_ids.append(partition_id)
+            items.append((unhexlify(fingerprint), key_crc32, self.encoder.encode_request(request), score))
+
+        if self.dedup:
+            # the last entry of the same fingerprint wins
+            last = dict((item[0], i) for i, item in enumerate(items))
+            partition_ids = [partition_ids[i] for i in sorted(six.itervalues(last))]
+            items = [items[i] for i in sorted(six.itervalues(last))]
+
+        scores = [1 - item[3] for item in items]  # because of lexicographical sort in HBase
+        data = dict()
+        deltas = dict()
+        markers = dict()
+        for partition_id, row_interval, column_interval, item in zip(partition_ids, get_buckets(scores, 100),
+                                                                     get_buckets(scores, 1000), items):
+            rk = self._row_key(partition_id, row_interval, random_str)
+            column = self._column(column_interval)
+            data.setdefault(rk, {}).setdefault(column, []).append(item)
+            deltas[partition_id] = deltas.get(partition_id, 0) + 1
+            if self.dedup:
+                markers[self._marker_key(item[0])] = {b'f:rk': rk, b'f:c': column}
 
         table = self.connection.table(self.table_name)
+        packer = Packer()
         with table.batch(transaction=True) as b:
-            for rk, tuples in six.iteritems(data):
-                obj = dict()
-                for score, item in tuples:
-                    column = 'f:%0.3f_%0.3f' % get_interval(score, 0.001)
-                    obj.setdefault(column, []).append(item)
-
+            if markers:
+                self._remove_duplicates(table, b, list(markers.keys()), deltas)
+            for rk, obj in six.iteritems(data):
                 final = dict()
-                packer = Packer()
                 for column, items in six.iteritems(obj):
                     stream = BytesIO()
                     for item in items:
@@ -194,6 +295,52 @@ class HBaseQueue(Queue):
                     final[column] = stream.getvalue()
                 final[b'f:t'] = str(timestamp)
                 b.put(rk, final)
+            for key, marker in six.iteritems(markers):
+                b.put(key, marker)
+        self._update_counts(deltas)
+
+    def _remove_duplicates(self, table, b, marker_keys, deltas):
+        """
+        Removes previous entries of fingerprints having markers from their queue cells, and rows left empty.
+
+        :param table: queue table
+        :param b: batch to put changes in
+        :param marker_keys: list of marker row keys of scheduled fingerprints
+        :param deltas: dict of partition id -> count delta to update with removed entries
+        """
+        cells = dict()
+        for key, marker in table.rows(marker_keys):
+            cells.setdefault(marker[b'f:rk'], {}).setdefault(marker[b'f:c'], set()).add(key[len(self.MARKER_PREFIX):])
+        if not cells:
+            return
+        packer = Packer()
+        for rk, row in table.rows(list(cells.keys())):
+            changed, left, removed = dict(), 0, 0
+            for column, buf in six.iteritems(row):
+                if column == b'f:t':
+                    continue
+                items = list(Unpacker(BytesIO(buf)))
+                if column in cells[rk]:
+                    kept = [item for item in items if item[0] not in cells[rk][column]]
+                    if len(kept) != len(items):
+                        changed[column] = b''.join(packer.pack(item) for item in kept)
+                        removed += len(items) - len(kept)
+                        items = kept
+                left += len(items)
+            if not removed:
+                # entries were already dequeued
+                continue
+            if not left:
+                b.delete(rk)
+            else:
+                empty = [column for column, buf in six.iteritems(changed) if not buf]
+                if empty:
+                    b.delete(rk, columns=empty)
+                cells_left = dict((column, buf) for column, buf in six.iteritems(changed) if buf)
+                if cells_left:
+                    b.put(rk, cells_left)
+            partition_id = self._row_partition(rk)
+            deltas[partition_id] = deltas.get(partition_id, 0) - removed
 
     def get_next_requests(self, max_n_requests, partition_id, **kwargs):
         """
@@ -215,10 +362,11 @@ class HBaseQueue(Queue):
 
         meta_map = {}
         queue = {}
+        row_fprints = {}
         limit = min_requests
         tries = 0
         count = 0
-        prefix = to_bytes('%d_' % partition_id)
+        prefix = self._prefix(partition_id)
         # now_ts = int(time())
         # TODO: figure out how to use filter here, Thrift filter above causes full scan
         # filter = "PrefixFilter ('%s') AND SingleColumnValueFilter ('f', 't', <=, 'binary:%d')" % (prefix, now_ts)
@@ -229,6 +377,7 @@ class HBaseQueue(Queue):
                               tries, limit, count, len(queue.keys()))
             meta_map.clear()
             queue.clear()
+            row_fprints.clear()
             count = 0
             # XXX pypy hot-fix: non-exhausted generator must be closed manually
             # otherwise "finally" piece in table.scan() method won't be executed
@@ -243,6 +392,7 @@ class HBaseQueue(Queue):
                         unpacker = Unpacker(stream)
                         for item in unpacker:
                             fprint, key_crc32, _, _ = item
+                            row_fprints.setdefault(rk, []).append(fprint)
                             if key_crc32 not in queue:
                                 queue[key_crc32] = []
                             if max_requests_per_host is not None and len(queue[key_crc32]) > max_requests_per_host:
@@ -292,11 +442,59 @@ class HBaseQueue(Queue):
         with table.batch(transaction=True) as b:
             for rk in trash_can:
                 b.delete(rk)
+                if self.dedup:
+                    for fprint in row_fprints[rk]:
+                        b.delete(self._marker_key(fprint))
+        # requests skipped by per host limit are removed too together with their rows
+        self._update_counts({partition_id: -sum(len(row_fprints[rk]) for rk in trash_can)})
         self.logger.debug("%d row keys removed", len(trash_can))
         return results
 
+    def evict(self, partition_id, capacity=None, ttl=None):
+        """
+        Scans the whole partition and evicts rows scheduled more than ``ttl`` seconds ago, then rows with the lowest
+        score intervals until there are at most ``capacity`` requests. Rows are removed as a whole, so the partition
+        can end up with less than ``capacity`` requests.
+
+        :return: list of fingerprints of evicted requests.
+        """
+        table = self.connection.table(self.table_name)
+        prefix = self._prefix(partition_id)
+        deadline = (time() - ttl) * 1E+6 if ttl is not None else None
+        rows, to_delete, evicted = [], [], []
+        for rk, data in table.scan(row_prefix=prefix, batch_size=256):
+            fprints = [hexlify(item[0]) for cq, buf in six.iteritems(data) if cq != b'f:t'
+                       for item in Unpacker(BytesIO(buf))]
+            if deadline is not None and self._row_timestamp(rk) < deadline:
+                to_delete.append(rk)
+                evicted.extend(fprints)
+            else:
+                rows.append((rk, fprints))
+        if capacity is not None:
+            count = sum(len(fprints) for _, fprints in rows)
+            # rows are sorted by score interval in descending order
+            while rows and count > capacity:
+                rk, fprints = rows.pop()
+                to_delete.append(rk)
+                evicted.extend(fprints)
+                count -= len(fprints)
+        with table.batch(transaction=True) as b:
+            for rk in to_delete:
+                b.delete(rk)
+            if self.dedup:
+                for fprint in evicted:
+                    b.delete(self._marker_key(unhexlify(fprint)))
+        self._update_counts({partition_id: -len(evicted)})
+        self.logger.debug("%d row keys evicted", len(to_delete))
+        return evicted
+
     def count(self):
-        raise NotImplementedError
+        return sum(six.itervalues(self.partition_counts()))
+
+    def partition_counts(self):
+        row = self.connection.table(self.table_name).row(self.COUNTS_ROW)
+        return dict((partition_id, unpack('>q', row[self._count_column(partition_id)])[0]
+                     if self._count_column(partition_id) in row else 0) for partition_id in self.partitions)
 
 
 class HBaseState(States):
@@ -318,10 +516,13 @@ class HBaseState(States):
             tables.remove(self._table_name)
 
         if self._table_name not in tables:
-            schema = {'s': {'max_versions': 1, 'block_cache_enabled': 1,
-                            'bloom_filter_type': 'ROW', 'in_memory': True, }
-                      }
-            connection.create_table(self._table_name, schema)
+            connection.create_table(self._table_name, self.get_schema())
+
+    @staticmethod
+    def get_schema():
+        return {'s': {'max_versions': 1, 'block_cache_enabled': 1,
+                      'bloom_filter_type': 'ROW', 'in_memory': True, }
+                }
 
     def update_cache(self, objs):
         objs = objs if isinstance(objs, Iterable) else [objs]
@@ -387,17 +588,21 @@ class HBaseMetadata(Metadata):
             tables.remove(self._table_name)
 
         if self._table_name not in tables:
-            schema = {'m': {'max_versions': 1},
-                      'c': {'max_versions': 1}
-                      }
-            if use_snappy:
-                schema['m']['compression'] = 'SNAPPY'
-                schema['c']['compression'] = 'SNAPPY'
-            connection.create_table(self._table_name, schema)
+            connection.create_table(self._table_name, self.get_schema(use_snappy))
         table = connection.table(self._table_name)
         self.batch = table.batch(batch_size=batch_size)
         self.store_content = store_content
 
+    @staticmethod
+    def get_schema(use_snappy=False):
+        schema = {'m': {'max_versions': 1},
+                  'c': {'max_versions': 1}
+                  }
+        if use_snappy:
+            schema['m']['compression'] = 'SNAPPY'
+            schema['c']['compression'] = 'SNAPPY'
+        return schema
+
     def frontier_start(self):
         pass
 
@@ -508,7 +713,10 @@ class HBaseBackend(DistributedBackend):
     def _init_queue(self, settings):
         self._queue = HBaseQueue(self.connection, self.queue_partitions,
                                  settings.get('HBASE_QUEUE_TABLE'), drop=settings.get('HBASE_DROP_ALL_TABLES'),
-                                 use_snappy=settings.get('HBASE_USE_SNAPPY'))
+                                 use_snappy=settings.get('HBASE_USE_SNAPPY'),
+                                 binary_keys=settings.get('HBASE_QUEUE_BINARY_KEYS'),
+                                 dedup=settings.get('HBASE_QUEUE_DEDUP'))
+        self._queue = RevisitingQueue.from_settings(self._queue, settings)
 
     def _init_metadata(self, settings):
         self._metadata = HBaseMetadata(self.connection, settings.get('HBASE_METADATA_TABLE'),
@@ -534,6 +742,9 @@ class HBaseBackend(DistributedBackend):
         o = cls(manager)
         o._init_queue(manager.settings)
         o._init_metadata(manager.settings)
+        if manager.settings.get('POLITENESS_ENABLED'):
+            # domain metadata is owned by strategy worker and read by DB worker politeness layer
+            o._init_domain_metadata(manager.settings)
         return o
 
     @classmethod
@@ -583,7 +794,7 @@ class HBaseBackend(DistributedBackend):
         self.metadata.request_error(page, error)
 
     def finished(self):
-        raise NotImplementedError
+        return self.queue.count() == 0
 
     def get_next_requests(self, max_next_requests, **kwargs):
         self.logger.debug("Querying queue table.")
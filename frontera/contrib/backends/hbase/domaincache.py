@@ -10,7 +10,7 @@ from w3lib.util import to_bytes, to_native_str
 
 from frontera.core.components import DomainMetadata
 from frontera.contrib.backends.hbase.utils import HardenedBatch
-from frontera.utils.msgpack import restruct_for_pack
+from frontera.utils.msgpack import pack_default
 
 import collections
 from cachetools import Cache
@@ -257,10 +257,13 @@ class DomainCache(LRUCache, DomainMetadata):
     def _get_domain_table(self, connection, table_name):
         tables = set(connection.tables())
         if table_name not in tables:
-            schema = {'m': {'max_versions': 1}}
-            connection.create_table(table_name, schema)
+            connection.create_table(table_name, self.get_schema())
         return connection.table(table_name)
 
+    @staticmethod
+    def get_schema():
+        return {'m': {'max_versions': 1}}
+
     def _get_item(self, key):
         self.stats["hbase_gets"] += 1
         hbase_key = to_bytes(key)
@@ -287,10 +290,9 @@ class DomainCache(LRUCache, DomainMetadata):
         for k, v in six.iteritems(value):
             if k.startswith('_'):
                 continue
-            # convert set to list manually for successful serialization
-            v = restruct_for_pack(v)
             k = to_bytes(k)
-            data[b"m:%s" % k] = packb(v, use_bin_type=True)
+            # sets are converted to lists by the hook
+            data[b"m:%s" % k] = packb(v, use_bin_type=True, default=pack_default)
         tries = 3
         while data and tries > 0:
             try:
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Prints HBase shell statements creating HBase backend tables pre-split into regions, so writes of a fresh crawl are
+spread across region servers from the start. HBase Thrift API used by happybase can't create pre-split tables, so
+tables have to be created with HBase shell before the first start of workers::
+
+    python -m frontera.contrib.backends.hbase.presplit --config myproject.settings | hbase shell -n
+
+Tables which already exist are used by the backend as is, unless :setting:`HBASE_DROP_ALL_TABLES` is set.
+"""
+from __future__ import absolute_import, print_function
+from argparse import ArgumentParser
+from struct import pack
+
+import six
+from w3lib.util import to_bytes, to_native_str
+
+from frontera.contrib.backends.hbase import HBaseQueue, HBaseState, HBaseMetadata
+from frontera.contrib.backends.hbase.domaincache import DomainCache
+from frontera.settings import Settings
+
+
+DOMAIN_ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+_shell_options = {
+    'max_versions': 'VERSIONS',
+    'compression': 'COMPRESSION',
+    'in_memory': 'IN_MEMORY',
+    'bloom_filter_type': 'BLOOMFILTER',
+    'block_cache_enabled': 'BLOCKCACHE',
+    'time_to_live': 'TTL'
+}
+_boolean_options = ('in_memory', 'block_cache_enabled')
+
+
+def queue_split_keys(partitions, regions, binary_keys=False):
+    """
+    Splits queue table between partition prefixes, so every region holds about the same number of partitions.
+
+    :param int partitions: number of spider feed partitions.
+    :param int regions: number of regions, at most one region per partition is created.
+    :param bool binary_keys: split points for binary row keys, see :setting:`HBASE_QUEUE_BINARY_KEYS`.
+    :return: sorted list of split points.
+    """
+    prefixes = sorted(pack('>I', partition_id) if binary_keys else to_bytes('%d_' % partition_id)
+                      for partition_id in range(partitions))
+    regions = min(regions, partitions)
+    return [prefixes[len(prefixes) * i // regions] for i in range(1, regions)]
+
+
+def fingerprint_split_keys(regions):
+    """
+    Splits the keyspace of binary fingerprints evenly by the first two bytes. Is used for states and metadata tables.
+
+    :param int regions: number of regions.
+    :return: sorted list of split points.
+    """
+    regions = min(regions, 65536)
+    return [pack('>H', 65536 * i // regions) for i in range(1, regions)]
+
+
+def domain_split_keys(regions):
+    """
+    Splits domain metadata table by the first character of domain name.
+
+    :param int regions: number of regions, at most one region per character is created.
+    :return: sorted list of split points.
+    """
+    regions = min(regions, len(DOMAIN_ALPHABET))
+    return [to_bytes(DOMAIN_ALPHABET[len(DOMAIN_ALPHABET) * i // regions]) for i in range(1, regions)]
+
+
+def get_tables(settings, regions=None):
+    """
+    :param settings: frontera settings.
+    :param int regions: number of regions, defaults to :setting:`HBASE_PRESPLIT_REGIONS`.
+    :return: list of tuples (table name, schema, split points).
+    """
+    regions = regions or settings.get('HBASE_PRESPLIT_REGIONS')
+    use_snappy = settings.get('HBASE_USE_SNAPPY')
+    return [
+        (settings.get('HBASE_QUEUE_TABLE'), HBaseQueue.get_schema(use_snappy),
+         queue_split_keys(settings.get('SPIDER_FEED_PARTITIONS'), regions, settings.get('HBASE_QUEUE_BINARY_KEYS'))),
+        (settings.get('HBASE_STATES_TABLE'), HBaseState.get_schema(), fingerprint_split_keys(regions)),
+        (settings.get('HBASE_METADATA_TABLE'), HBaseMetadata.get_schema(use_snappy), fingerprint_split_keys(regions)),
+        (settings.get('HBASE_DOMAIN_METADATA_TABLE'), DomainCache.get_schema(), domain_split_keys(regions)),
+    ]
+
+
+def _format_value(option, value):
+    if option in _boolean_options:
+        return 'true' if value else 'false'
+    if isinstance(value, six.integer_types):
+        return str(value)
+    return "'%s'" % value
+
+
+def _format_key(key):
+    return '"%s"' % ''.join(chr(c) if 0x20 <= c < 0x7f and chr(c) not in '"\\#' else '\\x%02x' % c
+                            for c in bytearray(key))
+
+
+def create_statement(namespace, table_name, schema, split_keys):
+    """
+    :return: HBase shell statement creating the table with column families from schema and split points.
+    """
+    families = []
+    for name, options in sorted(six.iteritems(schema)):
+        family = ["NAME => '%s'" % name]
+        family.extend('%s => %s' % (_shell_options[option], _format_value(option, value))
+                      for option, value in sorted(six.iteritems(options)))
+        families.append('{%s}' % ', '.join(family))
+    statement = "create '%s:%s', %s" % (namespace, to_native_str(table_name), ', '.join(families))
+    if split_keys:
+        statement += ', SPLITS => [%s]' % ', '.join(_format_key(key) for key in split_keys)
+    return statement
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Prints HBase shell statements creating pre-split HBase backend tables")
+    parser.add_argument('--config', type=str, required=True,
+                        help='Settings module name, should be accessible by import.')
+    parser.add_argument('--regions', type=int, help="Number of regions per table, defaults to HBASE_PRESPLIT_REGIONS")
+    args = parser.parse_args()
+    settings = Settings(module=args.config)
+    for table_name, schema, split_keys in get_tables(settings, args.regions):
+        print(create_statement(settings.get('HBASE_NAMESPACE'), table_name, schema, split_keys))
@@ -1,10 +1,14 @@
 from __future__ import absolute_import
 
 from collections import Iterable
+from heapq import heapify, heappop, heappush
+from itertools import count
+from time import time
 
 import logging
 import six
 from frontera.contrib.backends.partitioners import Crc32NamePartitioner
+from frontera.contrib.backends.revisiting import RevisitingQueue
 from frontera.core.components import Metadata, Queue, States, DistributedBackend
 from frontera.utils.heap import Heap
 from frontera.utils.url import parse_domain_from_url_fast
@@ -49,31 +53,71 @@ class MemoryMetadata(Metadata):
 
 
 class MemoryQueue(Queue):
+    """
+    Requests are kept in a heap per partition. Requests with ``crawl_at`` in the future are kept in a separate heap
+    of every partition ordered by due time, and are moved to the main one when they're due.
+    """
     def __init__(self, partitions):
         self.partitions = [i for i in range(0, partitions)]
         self.partitioner = Crc32NamePartitioner(self.partitions)
         self.logger = logging.getLogger("memory.queue")
         self.heap = {}
+        self.delayed = {}
         for partition in self.partitions:
             self.heap[partition] = Heap(self._compare_pages)
+            self.delayed[partition] = []
+        self._sequence = count()
 
     def count(self):
-        return sum([len(h.heap) for h in six.itervalues(self.heap)])
+        return sum(six.itervalues(self.partition_counts()))
+
+    def partition_counts(self):
+        return dict((partition_id, len(self.heap[partition_id].heap) + len(self.delayed[partition_id]))
+                    for partition_id in self.partitions)
+
+    def _release_delayed(self, partition_id, now):
+        delayed = self.delayed[partition_id]
+        while delayed and delayed[0][0] <= now:
+            _, _, request = heappop(delayed)
+            self.heap[partition_id].push(request)
 
     def get_next_requests(self, max_n_requests, partition_id, **kwargs):
+        self._release_delayed(partition_id, time())
         return self.heap[partition_id].pop(max_n_requests)
 
     def schedule(self, batch):
+        now = time()
         for fprint, score, request, schedule in batch:
             if schedule:
                 request.meta[b'_scr'] = score
+                request.meta[b'_ts'] = request.meta.get(b'crawl_at', now)
                 _, hostname, _, _, _, _ = parse_domain_from_url_fast(request.url)
                 if not hostname:
                     self.logger.error("Can't get hostname for URL %s, fingerprint %s", request.url, fprint)
                     partition_id = self.partitions[0]
                 else:
                     partition_id = self.partitioner.partition(hostname, self.partitions)
-                self.heap[partition_id].push(request)
+                if request.meta[b'_ts'] > now:
+                    heappush(self.delayed[partition_id], (request.meta[b'_ts'], next(self._sequence), request))
+                else:
+                    self.heap[partition_id].push(request)
+
+    def evict(self, partition_id, capacity=None, ttl=None):
+        self._release_delayed(partition_id, time())
+        heap = self.heap[partition_id]
+        kept, evicted = heap.heap, []
+        if ttl is not None:
+            deadline = time() - ttl
+            evicted = [w for w in kept if w.obj.meta[b'_ts'] < deadline]
+            kept = [w for w in kept if w.obj.meta[b'_ts'] >= deadline]
+        if capacity is not None and len(kept) > capacity:
+            kept = sorted(kept, key=lambda w: w.obj.meta[b'_scr'], reverse=True)
+            evicted.extend(kept[capacity:])
+            kept = kept[:capacity]
+        if evicted:
+            heapify(kept)
+            heap.heap = kept
+        return [w.obj.meta[b'fingerprint'] for w in evicted]
 
     def _compare_pages(self, first, second):
         return cmp(first.meta[b'_scr'], second.meta[b'_scr'])
@@ -114,7 +158,7 @@ class MemoryDistributedBackend(DistributedBackend):
     def __init__(self, manager):
         settings = manager.settings
         self._states = MemoryStates(1000)
-        self._queue = MemoryQueue(settings.get('SPIDER_FEED_PARTITIONS'))
+        self._queue = RevisitingQueue.from_settings(MemoryQueue(settings.get('SPIDER_FEED_PARTITIONS')), settings)
         self.queue_partitions = settings.get('SPIDER_FEED_PARTITIONS')
         self._domain_metadata = dict()
 
@@ -128,7 +172,7 @@ class MemoryDistributedBackend(DistributedBackend):
         pass
 
     def finished(self):
-        pass
+        return self.queue.count() == 0
 
     def links_extracted(self, request, links):
         pass
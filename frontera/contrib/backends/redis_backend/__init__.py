@@ -5,6 +5,7 @@ from frontera.utils.url import parse_domain_from_url_fast
 from frontera import DistributedBackend
 from frontera.core.components import Metadata, Queue, States
 from frontera.contrib.backends.partitioners import Crc32NamePartitioner
+from frontera.contrib.backends.revisiting import RevisitingQueue
 from frontera.utils.misc import get_crc32, load_object
 import functools
 import logging
@@ -98,9 +99,19 @@ class RedisPipeline(object):
 
 
 class RedisQueue(Queue):
+    """
+    Every partition is a sorted set of requests by score interval. Requests with ``crawl_at`` in the future are kept
+    in a separate sorted set of every partition by due time, and are moved to the partition when they're due.
+
+    Number of requests in every partition, delayed ones included, is kept in ``queue:counts`` hash and is updated on
+    every change of the queue.
+    """
     MAX_SCORE = 1.0
     MIN_SCORE = 0.0
     SCORE_STEP = 0.01
+    EVICT_CHUNK_SIZE = 1000
+    RELEASE_CHUNK_SIZE = 1000
+    COUNTS_KEY = 'queue:counts'
 
     def __init__(self, manager, pool, partitions, delete_all_keys=False):
         settings = manager.settings
@@ -117,6 +128,20 @@ class RedisQueue(Queue):
 
         if delete_all_keys:
             self._redis.flushdb()
+        self._init_counts()
+
+    def _init_counts(self):
+        for partition_id in self._partitions:
+            self._redis_pipeline.zcard(partition_id)
+            self._redis_pipeline.zcard(self._delayed_key(partition_id))
+        sizes = self._redis_pipeline.execute() or []
+        for partition_id, size, delayed_size in zip(self._partitions, sizes[::2], sizes[1::2]):
+            self._redis_pipeline.hsetnx(self.COUNTS_KEY, partition_id, size + delayed_size)
+        self._redis_pipeline.execute()
+
+    def _update_count(self, partition_id, delta):
+        if delta:
+            self._redis.hincrby(self.COUNTS_KEY, partition_id, delta)
 
     def _get_items(self, partition_id, start, now_ts, queue, max_requests_per_host, max_host_items, count,
                    max_n_requests, to_remove):
@@ -139,6 +164,23 @@ class RedisQueue(Queue):
                 break
         return start, count, max_host_items
 
+    @staticmethod
+    def _delayed_key(partition_id):
+        return '{}:delayed'.format(partition_id)
+
+    def _release_delayed(self, partition_id, now_ts):
+        key = self._delayed_key(partition_id)
+        while True:
+            due = self._redis.zrangebyscore(key, '-inf', now_ts, start=0, num=self.RELEASE_CHUNK_SIZE)
+            if not due:
+                return
+            items = dict((data, int(self.get_interval_start(unpackb(data, use_list=False)[4]) * 100)) for data in due)
+            self._redis_pipeline.zadd(partition_id, mapping=items)
+            self._redis_pipeline.zrem(key, *due)
+            self._redis_pipeline.execute()
+            if len(due) < self.RELEASE_CHUNK_SIZE:
+                return
+
     def get_next_requests(self, max_n_requests, partition_id, **kwargs):
         """
         Fetch new batch from priority queue.
@@ -153,6 +195,7 @@ class RedisQueue(Queue):
         queue = {}
         count = 0
         now_ts = int(time())
+        self._release_delayed(partition_id, now_ts)
         max_host_items = 0
         to_remove = []
         start = 0
@@ -175,7 +218,7 @@ class RedisQueue(Queue):
                 request.meta[FIELD_SCORE] = score
                 results.append(request)
         if len(to_remove) > 0:
-            self._redis.zrem(partition_id, *to_remove)
+            self._update_count(partition_id, -(self._redis.zrem(partition_id, *to_remove) or 0))
         return results
 
     def schedule(self, batch):
@@ -205,6 +248,7 @@ class RedisQueue(Queue):
 
     def _schedule(self, batch, timestamp):
         data = dict()
+        delayed = timestamp > time()
         for request, score in batch:
             domain = request.meta[FIELD_DOMAIN]
             fingerprint = request.meta[FIELD_FINGERPRINT]
@@ -217,14 +261,62 @@ class RedisQueue(Queue):
             else:
                 raise TypeError("domain of unknown type.")
             item = (timestamp, fingerprint, host_crc32, self._encoder.encode_request(request), score)
-            interval_start = self.get_interval_start(score)
-            data.setdefault(partition_id, {})[packb(item)] = int(interval_start * 100)
-        for (key, items) in data.items():
-            self._redis_pipeline.zadd(key, mapping=items)
+            if delayed:
+                key, value = self._delayed_key(partition_id), timestamp
+            else:
+                key, value = partition_id, int(self.get_interval_start(score) * 100)
+            data.setdefault((key, partition_id), {})[packb(item)] = value
+        keys = list(data.keys())
+        for key, partition_id in keys:
+            self._redis_pipeline.zadd(key, mapping=data[(key, partition_id)])
+        added = self._redis_pipeline.execute() or []
+        for (_, partition_id), count in zip(keys, added):
+            if count:
+                self._redis_pipeline.hincrby(self.COUNTS_KEY, partition_id, count)
         self._redis_pipeline.execute()
 
     def count(self):
-        return sum([self._redis.zcard(partition_id) for partition_id in self._partitions])
+        return sum(self.partition_counts().values())
+
+    def partition_counts(self):
+        counts = self._redis.hgetall(self.COUNTS_KEY) or {}
+        return dict((int(partition_id), int(count)) for partition_id, count in counts.items())
+
+    def evict(self, partition_id, capacity=None, ttl=None):
+        """
+        Evicts requests scheduled (or due with ``crawl_at``) more than ``ttl`` seconds ago, it requires reading the
+        whole partition, then the lowest score requests above ``capacity``.
+
+        :return: list of fingerprints of evicted requests.
+        """
+        self._release_delayed(partition_id, int(time()))
+        to_remove = []
+        if ttl is not None:
+            deadline = time() - ttl
+            start = 0
+            while True:
+                chunk = self._redis.zrange(partition_id, start, start + self.EVICT_CHUNK_SIZE - 1)
+                if not chunk:
+                    break
+                start += len(chunk)
+                to_remove.extend(data for data in chunk if unpackb(data, use_list=False)[0] < deadline)
+        if capacity is not None:
+            excess = (self._redis.zcard(partition_id) or 0) - len(to_remove) - capacity
+            if excess > 0:
+                expired = set(to_remove)
+                start = 0
+                while excess > 0:
+                    chunk = self._redis.zrange(partition_id, start, start + excess + len(expired) - 1)
+                    if not chunk:
+                        break
+                    start += len(chunk)
+                    for data in chunk:
+                        if data not in expired and excess > 0:
+                            to_remove.append(data)
+                            excess -= 1
+        if to_remove:
+            self._update_count(partition_id, -(self._redis.zrem(partition_id, *to_remove) or 0))
+        return [unpackb(data, use_list=False)[1] for data in to_remove]
 
     def frontier_start(self):
         pass
@@ -399,7 +491,8 @@ class RedisBackend(DistributedBackend):
             self._states = RedisState(self.pool, settings.get('REDIS_STATE_CACHE_SIZE_LIMIT'))
         if typ in ["db_worker", "all"]:
             clear = settings.get('REDIS_DROP_ALL_TABLES')
-            self._queue = RedisQueue(manager, self.pool, self.queue_partitions, delete_all_keys=clear)
+            self._queue = RevisitingQueue.from_settings(
+                RedisQueue(manager, self.pool, self.queue_partitions, delete_all_keys=clear), settings)
             self._metadata = RedisMetadata(
                 self.pool,
                 clear
@@ -441,7 +534,7 @@ class RedisBackend(DistributedBackend):
         self.metadata.request_error(page, error)
 
     def finished(self):
-        raise NotImplementedError
+        return self.queue.count() == 0
 
     def get_next_requests(self, max_next_requests, **kwargs):
         next_pages = []
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+""" A compact binary codec for Frontera. Messages are MsgPack arrays with positional fields and numeric message types.
+Hex fingerprints of documents and domains are sent as 20 bytes binary strings, domain info is reduced to name and
+fingerprint, since other fields (netloc, scheme, sld, tld, subdomain) can be derived from URL and aren't used by workers,
+and common methods and header names are replaced with numeric codes.
+
+Links in links_extracted messages refer to header and cookie profiles by index in the profile table of the message,
+so identical headers and cookies of links are sent once per message.
+
+Fingerprints which aren't hex strings and domain dicts with custom fields are sent in meta as is.
+"""
+from __future__ import absolute_import
+
+from binascii import hexlify, unhexlify, Error as BinasciiError
+
+import six
+from msgpack import packb, unpackb, Unpacker
+from w3lib.util import to_native_str
+
+from frontera.core.codec import BaseDecoder, BaseEncoder
+from frontera.utils.msgpack import pack_default
+
+
+PAGE_CRAWLED = 1
+LINKS_EXTRACTED = 2
+REQUEST_ERROR = 3
+UPDATE_SCORE = 4
+NEW_JOB_ID = 5
+OFFSET = 6
+STATS = 7
+REQUESTS_EVICTED = 8
+
+# single messages are arrays, so batch of messages is marked with a leading zero
+BATCH_HEADER = packb(0)
+
+METHODS = [b'GET', b'POST', b'HEAD', b'PUT', b'DELETE', b'OPTIONS', b'PATCH']
+
+HEADER_NAMES = [b'Accept', b'Accept-Charset', b'Accept-Encoding', b'Accept-Language', b'Accept-Ranges', b'Age',
+                b'Cache-Control', b'Connection', b'Content-Encoding', b'Content-Language', b'Content-Length',
+                b'Content-Type', b'Cookie', b'Date', b'Etag', b'Expires', b'If-Modified-Since', b'If-None-Match',
+                b'Last-Modified', b'Location', b'Pragma', b'Referer', b'Server', b'Set-Cookie', b'Transfer-Encoding',
+                b'User-Agent', b'Vary', b'Via', b'X-Powered-By']
+
+DOMAIN_FIELDS = frozenset([b'name', b'fingerprint', b'netloc', b'scheme', b'sld', b'tld', b'subdomain'])
+
+_method_codes = dict((method, code) for code, method in enumerate(METHODS))
+_header_codes = dict((name, code) for code, name in enumerate(HEADER_NAMES))
+
+
+def _packb(obj):
+    return packb(obj, use_bin_type=True, default=pack_default)
+
+
+def _pack_fingerprint(fingerprint):
+    if isinstance(fingerprint, bytes) and len(fingerprint) == 40:
+        try:
+            packed = unhexlify(fingerprint)
+        except (BinasciiError, TypeError):
+            return None
+        # upper case hex wouldn't be restored as is
+        if hexlify(packed) == fingerprint:
+            return packed
+    return None
+
+
+def _pack_headers(headers):
+    if not headers:
+        return headers
+    return {_header_codes.get(name, name): value for name, value in six.iteritems(headers)}
+
+
+def _unpack_headers(headers):
+    if not headers:
+        return headers
+    return {HEADER_NAMES[name] if isinstance(name, int) else name: value for name, value in six.iteritems(headers)}
+
+
+def _pack_meta(meta):
+    """
+    :return: tuple (fingerprint, domain, meta), where fingerprint and domain are packed to positional fields and
+    removed from meta, or are None if meta has them in other form.
+    """
+    fingerprint = _pack_fingerprint(meta.get(b'fingerprint'))
+    domain = meta.get(b'domain')
+    if isinstance(domain, dict) and b'name' in domain and DOMAIN_FIELDS.issuperset(domain):
+        domain_fingerprint = domain.get(b'fingerprint')
+        packed_fingerprint = _pack_fingerprint(domain_fingerprint)
+        domain = [domain[b'name'], packed_fingerprint] if domain_fingerprint is None or packed_fingerprint else None
+    else:
+        domain = None
+    if fingerprint is None and domain is None:
+        return None, None, meta
+    meta = meta.copy()
+    if fingerprint is not None:
+        del meta[b'fingerprint']
+    if domain is not None:
+        del meta[b'domain']
+    return fingerprint, domain, meta
+
+
+def _unpack_meta(fingerprint, domain, meta):
+    if fingerprint is not None:
+        meta[b'fingerprint'] = hexlify(fingerprint)
+    if domain is not None:
+        name, domain_fingerprint = domain
+        meta[b'domain'] = {b'name': name}
+        if domain_fingerprint is not None:
+            meta[b'domain'][b'fingerprint'] = hexlify(domain_fingerprint)
+    return meta
+
+
+class _ProfileTable(object):
+    """Table of distinct pairs of headers and cookies in a message."""
+
+    def __init__(self):
+        self.ids = {}
+        self.profiles = []
+
+    def get_id(self, headers, cookies):
+        key = _packb([headers, cookies])
+        profile_id = self.ids.get(key)
+        if profile_id is None:
+            profile_id = self.ids[key] = len(self.profiles)
+            self.profiles.append([_pack_headers(headers), cookies])
+        return profile_id
+
+
+def _prepare_request_message(request, profiles=None):
+    fingerprint, domain, meta = _pack_meta(request.meta)
+    method = _method_codes.get(request.method, request.method)
+    if profiles is None:
+        return [request.url, method, _pack_headers(request.headers), request.cookies, fingerprint, domain, meta]
+    return [request.url, method, profiles.get_id(request.headers, request.cookies), None, fingerprint, domain, meta]
+
+
+def _prepare_response_message(response, send_body):
+    fingerprint, domain, meta = _pack_meta(response.meta)
+    return [response.url, response.status_code, _pack_headers(response.headers),
+            response.body if send_body else None, fingerprint, domain, meta]
+
+
+class Encoder(BaseEncoder):
+    def __init__(self, request_model, *a, **kw):
+        self.send_body = True if 'send_body' in kw and kw['send_body'] else False
+
+    def encode_page_crawled(self, response):
+        return _packb([PAGE_CRAWLED, _prepare_response_message(response, self.send_body)])
+
+    def encode_links_extracted(self, request, links):
+        profiles = _ProfileTable()
+        links = [_prepare_request_message(link, profiles) for link in links]
+        return _packb([LINKS_EXTRACTED, _prepare_request_message(request), links, profiles.profiles])
+
+    def encode_request_error(self, request, error):
+        return _packb([REQUEST_ERROR, _prepare_request_message(request), str(error)])
+
+    def encode_request(self, request):
+        return _packb(_prepare_request_message(request))
+
+    def encode_update_score(self, request, score, schedule):
+        return _packb([UPDATE_SCORE, _prepare_request_message(request), score, schedule])
+
+    def encode_new_job_id(self, job_id):
+        return _packb([NEW_JOB_ID, int(job_id)])
+
+    def encode_offset(self, partition_id, offset):
+        return _packb([OFFSET, int(partition_id), int(offset)])
+
+    def encode_stats(self, stats):
+        return _packb([STATS, stats])
+
+    def encode_requests_evicted(self, fingerprints):
+        return _packb([REQUESTS_EVICTED, list(fingerprints)])
+
+    def encode_batch(self, messages):
+        return BATCH_HEADER + b''.join(messages)
+
+
+class Decoder(BaseDecoder):
+    def __init__(self, request_model, response_model, *a, **kw):
+        self._request_model = request_model
+        self._response_model = response_model
+
+    def _response_from_object(self, obj):
+        url = to_native_str(obj[0])
+        return self._response_model(url=url,
+                                    status_code=obj[1],
+                                    body=obj[3],
+                                    headers=_unpack_headers(obj[2]),
+                                    request=self._request_model(url=url,
+                                                                meta=_unpack_meta(obj[4], obj[5], obj[6])))
+
+    def _request_from_object(self, obj, profiles=None):
+        if isinstance(obj[2], int):
+            # every request gets own copies, since headers and cookies can be changed later
+            headers, cookies = profiles[obj[2]]
+            headers, cookies = dict(headers) if headers else headers, dict(cookies) if cookies else cookies
+        else:
+            headers, cookies = _unpack_headers(obj[2]), obj[3]
+        return self._request_model(url=to_native_str(obj[0]),
+                                   method=METHODS[obj[1]] if isinstance(obj[1], int) else obj[1],
+                                   headers=headers,
+                                   cookies=cookies,
+                                   meta=_unpack_meta(obj[4], obj[5], obj[6]))
+
+    def _message_from_object(self, obj):
+        if obj[0] == PAGE_CRAWLED:
+            return ('page_crawled', self._response_from_object(obj[1]))
+        if obj[0] == LINKS_EXTRACTED:
+            profiles = [(_unpack_headers(headers), cookies) for headers, cookies in obj[3]]
+            return ('links_extracted', self._request_from_object(obj[1]),
+                    [self._request_from_object(x, profiles) for x in obj[2]])
+        if obj[0] == UPDATE_SCORE:
+            return ('update_score', self._request_from_object(obj[1]), obj[2], obj[3])
+        if obj[0] == REQUEST_ERROR:
+            return ('request_error', self._request_from_object(obj[1]), to_native_str(obj[2]))
+        if obj[0] == NEW_JOB_ID:
+            return ('new_job_id', int(obj[1]))
+        if obj[0] == OFFSET:
+            return ('offset', int(obj[1]), int(obj[2]))
+        if obj[0] == STATS:
+            return ('stats', obj[1])
+        if obj[0] == REQUESTS_EVICTED:
+            return ('requests_evicted', obj[1])
+        raise TypeError('Unknown message type')
+
+    def decode(self, buffer):
+        return self._message_from_object(unpackb(buffer, encoding='utf-8'))
+
+    def decode_messages(self, buffer):
+        if not buffer.startswith(BATCH_HEADER):
+            yield self.decode(buffer)
+            return
+        unpacker = Unpacker(encoding='utf-8', max_buffer_size=len(buffer))
+        unpacker.feed(buffer[len(BATCH_HEADER):])
+        for message in self._decode_batch(unpacker, self._message_from_object):
+            yield message
+
+    def decode_request(self, buffer):
+        return self._request_from_object(unpackb(buffer, encoding='utf-8'))
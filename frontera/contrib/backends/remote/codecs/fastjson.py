@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+""" A faster JSON codec for Frontera. Implemented using native json library.
+
+Messages are JSON arrays with positional fields, like in MsgPack codec. Byte strings are sent as JSON strings as is,
+and text strings are tagged with a leading ``\\u0000`` character, so the type is restored without wrapping every value
+in a type tagged structure. Byte strings which aren't valid UTF-8 (or begin with a tag character) are sent base64
+encoded, with a leading ``\\u0001``. Dicts with keys other than strings are sent as ``{"\\u0002": [[key, value], ...]}``.
+Tuples are decoded as lists.
+"""
+from __future__ import absolute_import
+
+import json
+from base64 import b64decode, b64encode
+
+import six
+from w3lib.util import to_native_str
+
+from frontera.core.codec import BaseDecoder, BaseEncoder
+
+
+TEXT = u'\x00'
+BINARY = u'\x01'
+PAIRS = u'\x02'
+
+_tags = (TEXT, BINARY, PAIRS)
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('ascii')
+
+
+def _pack_bytes(value):
+    try:
+        text = value.decode('utf-8')
+    except UnicodeDecodeError:
+        return BINARY + b64encode(value).decode('ascii')
+    if text and text[0] in _tags:
+        return BINARY + b64encode(value).decode('ascii')
+    return text
+
+
+def _pack(obj):
+    if isinstance(obj, bytes):
+        return _pack_bytes(obj)
+    if isinstance(obj, six.text_type):
+        return TEXT + obj
+    if isinstance(obj, dict):
+        packed = {}
+        for key, value in six.iteritems(obj):
+            if isinstance(key, bytes):
+                packed[_pack_bytes(key)] = _pack(value)
+            elif isinstance(key, six.text_type):
+                packed[TEXT + key] = _pack(value)
+            else:
+                return {PAIRS: [[_pack(k), _pack(v)] for k, v in six.iteritems(obj)]}
+        return packed
+    if isinstance(obj, (list, tuple)):
+        return [_pack(item) for item in obj]
+    return obj
+
+
+def _unpack(obj):
+    if isinstance(obj, six.text_type):
+        if not obj:
+            return b''
+        if obj[0] == TEXT:
+            return obj[1:]
+        if obj[0] == BINARY:
+            return b64decode(obj[1:])
+        return obj.encode('utf-8')
+    if isinstance(obj, dict):
+        if PAIRS in obj:
+            return {_unpack(key): _unpack(value) for key, value in obj[PAIRS]}
+        return {_unpack(key): _unpack(value) for key, value in six.iteritems(obj)}
+    if isinstance(obj, list):
+        return [_unpack(item) for item in obj]
+    return obj
+
+
+def _prepare_request_message(request):
+    return [request.url, _pack(request.method), _pack(request.headers), _pack(request.cookies), _pack(request.meta)]
+
+
+def _prepare_response_message(response, send_body):
+    return [response.url, response.status_code, _pack(response.meta), _pack(response.headers),
+            _pack_bytes(response.body) if send_body and response.body is not None else None]
+
+
+class Encoder(BaseEncoder):
+    def __init__(self, request_model, *a, **kw):
+        self.send_body = True if 'send_body' in kw and kw['send_body'] else False
+
+    def encode_page_crawled(self, response):
+        return _dumps(['pc', _prepare_response_message(response, self.send_body)])
+
+    def encode_links_extracted(self, request, links):
+        return _dumps(['le', _prepare_request_message(request), [_prepare_request_message(link) for link in links]])
+
+    def encode_request_error(self, request, error):
+        return _dumps(['re', _prepare_request_message(request), str(error)])
+
+    def encode_request(self, request):
+        return _dumps(_prepare_request_message(request))
+
+    def encode_update_score(self, request, score, schedule):
+        return _dumps(['us', _prepare_request_message(request), score, schedule])
+
+    def encode_new_job_id(self, job_id):
+        return _dumps(['njid', int(job_id)])
+
+    def encode_offset(self, partition_id, offset):
+        return _dumps(['of', int(partition_id), int(offset)])
+
+    def encode_stats(self, stats):
+        return _dumps(['st', stats])
+
+    def encode_requests_evicted(self, fingerprints):
+        return _dumps(['ev', _pack(list(fingerprints))])
+
+    def encode_batch(self, messages):
+        # encoded messages have no raw line breaks, so batch is sent as JSON lines
+        return b'\n'.join(messages)
+
+
+class Decoder(BaseDecoder):
+    def __init__(self, request_model, response_model, *a, **kw):
+        self._request_model = request_model
+        self._response_model = response_model
+
+    def _response_from_object(self, obj):
+        url = to_native_str(obj[0])
+        return self._response_model(url=url,
+                                    status_code=obj[1],
+                                    body=_unpack(obj[4]) if obj[4] is not None else None,
+                                    headers=_unpack(obj[3]),
+                                    request=self._request_model(url=url,
+                                                                meta=_unpack(obj[2])))
+
+    def _request_from_object(self, obj):
+        return self._request_model(url=to_native_str(obj[0]),
+                                   method=_unpack(obj[1]),
+                                   headers=_unpack(obj[2]),
+                                   cookies=_unpack(obj[3]),
+                                   meta=_unpack(obj[4]))
+
+    def _message_from_object(self, obj):
+        if obj[0] == 'pc':
+            return ('page_crawled',
+                    self._response_from_object(obj[1]))
+        if obj[0] == 'le':
+            return ('links_extracted',
+                    self._request_from_object(obj[1]),
+                    [self._request_from_object(x) for x in obj[2]])
+        if obj[0] == 'us':
+            return ('update_score', self._request_from_object(obj[1]), obj[2], obj[3])
+        if obj[0] == 're':
+            return ('request_error', self._request_from_object(obj[1]), to_native_str(obj[2]))
+        if obj[0] == 'njid':
+            return ('new_job_id', int(obj[1]))
+        if obj[0] == 'of':
+            return ('offset', int(obj[1]), int(obj[2]))
+        if obj[0] == 'st':
+            return ('stats', obj[1])
+        if obj[0] == 'ev':
+            return ('requests_evicted', _unpack(obj[1]))
+        raise TypeError('Unknown message type')
+
+    def decode(self, buffer):
+        return self._message_from_object(json.loads(to_native_str(buffer)))
+
+    def decode_messages(self, buffer):
+        lines = buffer.split(b'\n' if isinstance(buffer, bytes) else '\n')
+        if len(lines) == 1:
+            yield self.decode(buffer)
+            return
+        for message in self._decode_batch(lines, self.decode):
+            yield message
+
+    def decode_request(self, buffer):
+        return self._request_from_object(json.loads(to_native_str(buffer)))
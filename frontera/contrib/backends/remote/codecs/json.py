@@ -143,6 +143,16 @@ class Encoder(BaseEncoder, CrawlFrontierJSONEncoder):
             'stats': stats
         })
 
+    def encode_requests_evicted(self, fingerprints):
+        return self.encode({
+            'type': 'requests_evicted',
+            'fingerprints': list(fingerprints)
+        })
+
+    def encode_batch(self, messages):
+        # encoded messages have no raw line breaks, so batch is sent as JSON lines
+        return '\n'.join(messages)
+
 
 class Decoder(json.JSONDecoder, BaseDecoder):
     def __init__(self, request_model, response_model, *a, **kw):
@@ -186,8 +196,18 @@ class Decoder(json.JSONDecoder, BaseDecoder):
             return ('offset', int(message['partition_id']), int(message['offset']))
         if message['type'] == 'stats':
             return ('stats', message['stats'])
+        if message['type'] == 'requests_evicted':
+            return ('requests_evicted', message['fingerprints'])
         raise TypeError('Unknown message type')
 
+    def decode_messages(self, message):
+        lines = message.split(b'\n' if isinstance(message, bytes) else '\n')
+        if len(lines) == 1:
+            yield self.decode(message)
+            return
+        for decoded in self._decode_batch(lines, self.decode):
+            yield decoded
+
     def decode_request(self, message):
         obj = _convert_from_saved_type(super(Decoder, self).decode(message))
         return self._request_model(url=obj['url'],
@@ -4,13 +4,21 @@
 from __future__ import absolute_import
 
 from frontera.core.codec import BaseDecoder, BaseEncoder
-from frontera.utils.msgpack import restruct_for_pack
-from msgpack import packb, unpackb
+from frontera.utils.msgpack import pack_default
+from msgpack import packb, unpackb, Unpacker
 from w3lib.util import to_native_str
 
 
+def _packb(obj):
+    return packb(obj, use_bin_type=True, default=pack_default)
+
+
+# single messages are arrays, so batch of messages is marked with a leading binary string
+BATCH_HEADER = _packb(b'bt')
+
+
 def _prepare_request_message(request):
-    return [request.url, request.method, request.headers, request.cookies, restruct_for_pack(request.meta)]
+    return [request.url, request.method, request.headers, request.cookies, request.meta]
 
 
 def _prepare_response_message(response, send_body):
@@ -22,29 +30,34 @@ class Encoder(BaseEncoder):
         self.send_body = True if 'send_body' in kw and kw['send_body'] else False
 
     def encode_page_crawled(self, response):
-        return packb([b'pc', _prepare_response_message(response, self.send_body)], use_bin_type=True)
+        return _packb([b'pc', _prepare_response_message(response, self.send_body)])
 
     def encode_links_extracted(self, request, links):
-        return packb([b'le', _prepare_request_message(request), [_prepare_request_message(link) for link in links]],
-                     use_bin_type=True)
+        return _packb([b'le', _prepare_request_message(request), [_prepare_request_message(link) for link in links]])
 
     def encode_request_error(self, request, error):
-        return packb([b're', _prepare_request_message(request), str(error)], use_bin_type=True)
+        return _packb([b're', _prepare_request_message(request), str(error)])
 
     def encode_request(self, request):
-        return packb(_prepare_request_message(request), use_bin_type=True)
+        return _packb(_prepare_request_message(request))
 
     def encode_update_score(self, request, score, schedule):
-        return packb([b'us', _prepare_request_message(request), score, schedule], use_bin_type=True)
+        return _packb([b'us', _prepare_request_message(request), score, schedule])
 
     def encode_new_job_id(self, job_id):
-        return packb([b'njid', int(job_id)], use_bin_type=True)
+        return _packb([b'njid', int(job_id)])
 
     def encode_offset(self, partition_id, offset):
-        return packb([b'of', int(partition_id), int(offset)], use_bin_type=True)
+        return _packb([b'of', int(partition_id), int(offset)])
 
     def encode_stats(self, stats):
-        return packb([b'st', stats], use_bin_type=True)
+        return _packb([b'st', stats])
+
+    def encode_requests_evicted(self, fingerprints):
+        return _packb([b'ev', list(fingerprints)])
+
+    def encode_batch(self, messages):
+        return BATCH_HEADER + b''.join(messages)
 
 
 class Decoder(BaseDecoder):
@@ -69,7 +82,18 @@ class Decoder(BaseDecoder):
                                    meta=obj[4])
 
     def decode(self, buffer):
-        obj = unpackb(buffer, encoding='utf-8')
+        return self._message_from_object(unpackb(buffer, encoding='utf-8'))
+
+    def decode_messages(self, buffer):
+        if not buffer.startswith(BATCH_HEADER):
+            yield self.decode(buffer)
+            return
+        unpacker = Unpacker(encoding='utf-8', max_buffer_size=len(buffer))
+        unpacker.feed(buffer[len(BATCH_HEADER):])
+        for message in self._decode_batch(unpacker, self._message_from_object):
+            yield message
+
+    def _message_from_object(self, obj):
         if obj[0] == b'pc':
             return ('page_crawled',
                     self._response_from_object(obj[1]))
@@ -87,6 +111,8 @@ class Decoder(BaseDecoder):
             return ('offset', int(obj[1]), int(obj[2]))
         if obj[0] == b'st':
             return ('stats', obj[1])
+        if obj[0] == b'ev':
+            return ('requests_evicted', obj[1])
         raise TypeError('Unknown message type')
 
     def decode_request(self, buffer):
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+""" A codec passing messages as Python objects, without serialization. It works only with in-process message bus, see
+:class:`frontera.contrib.messagebus.memory.MessageBus`, and gives a baseline for measuring costs of serialization.
+
+Messages are tuples in the form returned by decoders, so requests and responses are shared by producer and all
+consumers of the message, and changes made by one of them are seen by others.
+"""
+from __future__ import absolute_import
+
+from frontera.core.codec import BaseDecoder, BaseEncoder
+
+
+class Encoder(BaseEncoder):
+    def __init__(self, request_model, *a, **kw):
+        pass
+
+    def encode_page_crawled(self, response):
+        return ('page_crawled', response)
+
+    def encode_links_extracted(self, request, links):
+        return ('links_extracted', request, links)
+
+    def encode_request_error(self, request, error):
+        return ('request_error', request, str(error))
+
+    def encode_request(self, request):
+        return request
+
+    def encode_update_score(self, request, score, schedule):
+        return ('update_score', request, score, schedule)
+
+    def encode_new_job_id(self, job_id):
+        return ('new_job_id', int(job_id))
+
+    def encode_offset(self, partition_id, offset):
+        return ('offset', int(partition_id), int(offset))
+
+    def encode_stats(self, stats):
+        return ('stats', stats)
+
+    def encode_requests_evicted(self, fingerprints):
+        return ('requests_evicted', list(fingerprints))
+
+    def encode_batch(self, messages):
+        # single messages are tuples
+        return list(messages)
+
+
+class Decoder(BaseDecoder):
+    def __init__(self, request_model, response_model, *a, **kw):
+        pass
+
+    def decode(self, buffer):
+        if not isinstance(buffer, tuple):
+            raise TypeError('Unknown message type')
+        return buffer
+
+    def decode_messages(self, buffer):
+        if isinstance(buffer, list):
+            for message in self._decode_batch(buffer, self.decode):
+                yield message
+        else:
+            yield self.decode(buffer)
+
+    def decode_request(self, buffer):
+        return buffer
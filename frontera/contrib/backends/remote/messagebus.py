@@ -2,6 +2,7 @@
 from __future__ import absolute_import
 from frontera import Backend
 from frontera.core import OverusedBuffer
+from frontera.core.messagebus import BatchProducer
 from frontera.utils.misc import load_object
 import logging
 import six
@@ -18,7 +19,7 @@ class MessageBusBackend(Backend):
         store_content = settings.get('STORE_CONTENT')
         self._encoder = encoder_cls(manager.request_model, send_body=store_content)
         self._decoder = decoder_cls(manager.request_model, manager.response_model)
-        self.spider_log_producer = self.mb.spider_log().producer()
+        self.spider_log_producer = BatchProducer.from_settings(self.mb.spider_log().producer(), self._encoder, settings)
         spider_feed = self.mb.spider_feed()
         self.partition_id = int(settings.get('SPIDER_PARTITION_ID'))
         if self.partition_id < 0 or self.partition_id >= settings.get('SPIDER_FEED_PARTITIONS'):
@@ -43,6 +44,7 @@ class MessageBusBackend(Backend):
     def frontier_stop(self):
         self.spider_log_producer.flush()
         self.consumer.close()
+        self.mb.close()
 
     def add_seeds(self, seeds):
         raise NotImplementedError("The seeds addition using spider log isn't allowed")
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+from time import time
+
+from frontera.contrib.backends.remote.codecs.msgpack import Encoder, Decoder
+from frontera.core.components import Queue
+from frontera.core.models import Request, Response
+from frontera.utils.timingwheel import TimingWheel
+
+
+FIELD_REVISIT_INTERVAL = b'revisit_interval'
+
+
+class RevisitingQueue(Queue):
+    """
+    Wraps any :class:`Queue <frontera.core.components.Queue>` and schedules periodic revisits of dequeued requests.
+
+    Every request returned by :meth:`get_next_requests` is put on the :class:`TimingWheel
+    <frontera.utils.timingwheel.TimingWheel>` with its revisit interval, and is scheduled back to the wrapped queue
+    with the same score when it's due. The interval is taken from request ``meta[b'revisit_interval']`` (seconds),
+    which crawling strategy can set per URL, or defaults to ``default_interval``. Requests without interval aren't
+    revisited. A request scheduled again by crawling strategy before its revisit is due leaves the wheel, and is put
+    back when it's dequeued, so setting interval to 0 stops revisiting of the URL.
+
+    Pending revisits are kept in process memory as fingerprint, score and msgpack encoded request, and are lost on
+    restart: URLs dequeued before restart are revisited only when crawling strategy schedules them again.
+
+    :param queue: wrapped queue.
+    :param float default_interval: revisit interval in seconds, or None to revisit only requests with interval in meta.
+    :param float resolution: timing wheel tick in seconds.
+    :param int slots: number of slots on every wheel level.
+    :param int levels: number of wheel levels.
+    """
+    def __init__(self, queue, default_interval=None, resolution=1.0, slots=64, levels=4):
+        self.queue = queue
+        self.default_interval = default_interval
+        self.wheel = TimingWheel(resolution, slots, levels, start=time())
+        self.pending = {}
+        self.encoder = Encoder(Request)
+        self.decoder = Decoder(Request, Response)
+        self.logger = logging.getLogger("revisiting.queue")
+
+    @classmethod
+    def from_settings(cls, queue, settings):
+        """
+        Wraps the queue if revisiting is enabled with :setting:`REVISITING_ENABLED` setting.
+
+        :return: RevisitingQueue or queue itself.
+        """
+        if not settings.get('REVISITING_ENABLED'):
+            return queue
+        return cls(queue,
+                   default_interval=settings.get('REVISITING_DEFAULT_INTERVAL'),
+                   resolution=settings.get('REVISITING_WHEEL_RESOLUTION'),
+                   slots=settings.get('REVISITING_WHEEL_SLOTS'),
+                   levels=settings.get('REVISITING_WHEEL_LEVELS'))
+
+    def frontier_start(self):
+        self.queue.frontier_start()
+
+    def frontier_stop(self):
+        self.queue.frontier_stop()
+
+    def _get_interval(self, request):
+        interval = request.meta.get(FIELD_REVISIT_INTERVAL, self.default_interval)
+        return interval if interval and interval > 0 else None
+
+    def release(self, now=None):
+        """
+        Schedules due revisits to the wrapped queue.
+
+        :param float now: current time, defaults to :func:`time.time`.
+        :return: number of scheduled requests.
+        """
+        batch = []
+        for fingerprint in self.wheel.advance(now or time()):
+            score, encoded = self.pending.pop(fingerprint)
+            request = self.decoder.decode_request(encoded)
+            batch.append((fingerprint, score, request, True))
+        if batch:
+            self.queue.schedule(batch)
+            self.logger.debug("Scheduled %d revisits", len(batch))
+        return len(batch)
+
+    def get_next_requests(self, max_n_requests, partition_id, **kwargs):
+        self.release()
+        requests = self.queue.get_next_requests(max_n_requests, partition_id, **kwargs)
+        now = time()
+        for request in requests:
+            interval = self._get_interval(request)
+            if interval is None:
+                continue
+            fingerprint = request.meta[b'fingerprint']
+            self.pending[fingerprint] = (request.meta.get(b'score', 1.0), self.encoder.encode_request(request))
+            self.wheel.remove(fingerprint)
+            self.wheel.add(fingerprint, now + interval)
+        return requests
+
+    def schedule(self, batch):
+        for fprint, score, request, schedule in batch:
+            if schedule:
+                request.meta[b'score'] = score
+                # the request goes to the queue now, and is put on the wheel again when it's dequeued
+                if fprint in self.pending:
+                    del self.pending[fprint]
+                    self.wheel.remove(fprint)
+        self.queue.schedule(batch)
+
+    def evict(self, partition_id, capacity=None, ttl=None):
+        return self.queue.evict(partition_id, capacity, ttl)
+
+    def partition_counts(self):
+        """
+        Returns counts of the wrapped queue, pending revisits aren't included.
+        """
+        return self.queue.partition_counts()
+
+    def count(self):
+        """
+        Returns count of documents in the wrapped queue together with pending revisits.
+
+        :return: int
+        """
+        return self.queue.count() + len(self.wheel)
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 
+from frontera.contrib.backends.revisiting import RevisitingQueue
 from frontera.contrib.backends.sqlalchemy.components import Metadata, Queue, States, DomainMetadata
 from frontera.contrib.backends.sqlalchemy.models import DeclarativeBase
 from frontera.core.components import DistributedBackend
@@ -55,10 +56,17 @@ class Distributed(DistributedBackend):
         clear_content = settings.get('SQLALCHEMYBACKEND_CLEAR_CONTENT')
         metadata_m = self.models['MetadataModel']
         queue_m = self.models['QueueModel']
-        self.check_and_create_tables(drop, clear_content, (metadata_m, queue_m))
+        counts_m = self.models.get('QueueCountModel')
+        self.check_and_create_tables(drop, clear_content, [m for m in (metadata_m, queue_m, counts_m) if m])
+        if settings.get('POLITENESS_ENABLED'):
+            # domain metadata is owned by strategy worker and read by DB worker politeness layer
+            self.check_and_create_tables(False, False, (self.models['DomainMetadataModel'],))
+            self._domain_metadata = DomainMetadata(self.session_cls)
         self._metadata = Metadata(self.session_cls, metadata_m,
                                   settings.get('SQLALCHEMYBACKEND_CACHE_SIZE'))
-        self._queue = Queue(self.session_cls, queue_m, settings.get('SPIDER_FEED_PARTITIONS'))
+        self._queue = RevisitingQueue.from_settings(Queue(self.session_cls, queue_m,
+                                                          settings.get('SPIDER_FEED_PARTITIONS'),
+                                                          counts_cls=counts_m), settings)
 
     @classmethod
     def strategy_worker(cls, manager):
@@ -125,5 +133,5 @@ class Distributed(DistributedBackend):
         self.metadata.request_error(request, error)
 
     def finished(self):
-        raise NotImplementedError
+        return self.queue.count() == 0
 
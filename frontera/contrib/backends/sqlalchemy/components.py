@@ -9,12 +9,14 @@ from cachetools import LRUCache
 from datetime import datetime
 from frontera.contrib.backends.memory import MemoryStates
 from frontera.contrib.backends.partitioners import Crc32NamePartitioner
-from frontera.contrib.backends.sqlalchemy.models import DeclarativeBase, DomainMetadataModel as DomainMetadataKV
+from frontera.contrib.backends.sqlalchemy.models import DeclarativeBase, DomainMetadataModel as DomainMetadataKV, \
+    is_packed
 from frontera.core.components import Metadata as BaseMetadata, Queue as BaseQueue, DomainMetadata as BaseDomainMetadata
 from frontera.core.models import Request, Response
 from frontera.utils.misc import get_crc32, chunks
 from frontera.utils.url import parse_domain_from_url_fast
 from six.moves import range
+from sqlalchemy import func
 from w3lib.util import to_native_str, to_bytes
 
 
@@ -43,7 +45,8 @@ class Metadata(BaseMetadata):
     def __init__(self, session_cls, model_cls, cache_size):
         self.session = session_cls(expire_on_commit=False)
         self.model = model_cls
-        self.table = DeclarativeBase.metadata.tables['metadata']
+        self.packed = is_packed(model_cls)
+        self.table = model_cls.__table__
         self.cache = LRUCache(cache_size)
         self.logger = logging.getLogger("sqlalchemy.metadata")
 
@@ -80,10 +83,13 @@ class Metadata(BaseMetadata):
         db_page = self.cache[obj.meta[b'fingerprint']]
         db_page.fetched_at = datetime.utcnow()
         if isinstance(obj, Response):
+            db_page.status_code = obj.status_code
+            if self.packed:
+                db_page.request = obj.request
+                return db_page
             db_page.headers = obj.request.headers
             db_page.method = to_native_str(obj.request.method)
             db_page.cookies = obj.request.cookies
-            db_page.status_code = obj.status_code
         return db_page
 
     def _create_page(self, obj):
@@ -91,9 +97,14 @@ class Metadata(BaseMetadata):
         db_page.fingerprint = to_native_str(obj.meta[b'fingerprint'])
         db_page.url = obj.url
         db_page.created_at = datetime.utcnow()
-        db_page.meta = obj.meta
         db_page.depth = 0
+        if isinstance(obj, Response):
+            db_page.status_code = obj.status_code
+        if self.packed:
+            db_page.request = obj if isinstance(obj, Request) else obj.request
+            return db_page
 
+        db_page.meta = obj.meta
         if isinstance(obj, Request):
             db_page.headers = obj.headers
             db_page.method = to_native_str(obj.method)
@@ -102,7 +113,6 @@ class Metadata(BaseMetadata):
             db_page.headers = obj.request.headers
             db_page.method = to_native_str(obj.request.method)
             db_page.cookies = obj.request.cookies
-            db_page.status_code = obj.status_code
         return db_page
 
     @retry_and_rollback
@@ -148,44 +158,117 @@ class States(MemoryStates):
 
 
 class Queue(BaseQueue):
-    def __init__(self, session_cls, queue_cls, partitions, ordering='default'):
+
+    DELETE_CHUNK_SIZE = 512
+
+    def __init__(self, session_cls, queue_cls, partitions, ordering='default', counts_cls=None):
+        """
+        :param counts_cls: model of the table with number of requests in every partition, it's updated in the same
+         transaction with the queue. If it isn't set, counts are computed with a query.
+        """
+        self.session_cls = session_cls
         self.session = session_cls()
         self.queue_model = queue_cls
+        self.counts_model = counts_cls
+        self.packed = is_packed(queue_cls)
         self.logger = logging.getLogger("sqlalchemy.queue")
         self.partitions = [i for i in range(0, partitions)]
         self.partitioner = Crc32NamePartitioner(self.partitions)
         self.ordering = ordering
+        if counts_cls is not None:
+            self._init_counts()
+
+    @retry_and_rollback
+    def _init_counts(self):
+        model = self.queue_model
+        existing = set(partition_id for partition_id, in self.session.query(self.counts_model.partition_id))
+        missing = [partition_id for partition_id in self.partitions if partition_id not in existing]
+        if not missing:
+            return
+        counts = dict(self.session.query(model.partition_id, func.count(model.id)).group_by(model.partition_id))
+        self.session.add_all([self.counts_model(partition_id=partition_id, count=counts.get(partition_id, 0))
+                              for partition_id in missing])
+        self.session.commit()
+
+    def _update_counts(self, deltas):
+        if self.counts_model is None:
+            return
+        model = self.counts_model
+        for partition_id, delta in six.iteritems(deltas):
+            if delta:
+                self.session.query(model).filter(model.partition_id == partition_id) \
+                    .update({model.count: model.count + delta}, synchronize_session=False)
 
     def frontier_stop(self):
         self.session.close()
 
-    def _order_by(self, query):
+    def _order_by_columns(self):
         if self.ordering == 'created':
-            return query.order_by(self.queue_model.created_at)
+            return [self.queue_model.created_at]
         if self.ordering == 'created_desc':
-            return query.order_by(self.queue_model.created_at.desc())
-        return query.order_by(self.queue_model.score, self.queue_model.created_at)  # TODO: remove second parameter,
+            return [self.queue_model.created_at.desc()]
+        return [self.queue_model.score, self.queue_model.created_at]  # TODO: remove second parameter,
         # it's not necessary for proper crawling, but needed for tests
 
+    def _order_by(self, query):
+        return query.order_by(*self._order_by_columns())
+
+    def _select_batch(self, max_n_requests, partition_id, max_requests_per_host=None):
+        """
+        Selects a batch of queue rows using a single query. If ``max_requests_per_host`` is set, rows are ranked
+        within every host with ROW_NUMBER() window function and only the first ``max_requests_per_host`` rows of
+        each host are taken.
+
+        :return: list of rows with id, fingerprint, score, host_crc32 columns and either request column for packed
+         models or url, meta, headers, cookies and method columns
+        """
+        model = self.queue_model
+        columns = [model.id, model.fingerprint, model.score, model.host_crc32]
+        if self.packed:
+            columns.append(model.request)
+        else:
+            columns.extend([model.url, model.meta, model.headers, model.cookies, model.method])
+        query = self.session.query(*columns).filter(model.partition_id == partition_id)
+        if max_requests_per_host is not None:
+            host_rank = func.row_number().over(partition_by=model.host_crc32,
+                                               order_by=self._order_by_columns()).label('host_rank')
+            ranked = self.session.query(model.id.label('id'), host_rank) \
+                .filter(model.partition_id == partition_id).subquery()
+            query = query.join(ranked, ranked.c.id == model.id).filter(ranked.c.host_rank <= max_requests_per_host)
+        return self._order_by(query).limit(max_n_requests).all()
+
+    def _delete_batch(self, ids, partition_id):
+        deleted = 0
+        for chunk in chunks(ids, self.DELETE_CHUNK_SIZE):
+            deleted += self.session.query(self.queue_model).filter(self.queue_model.id.in_(chunk)) \
+                .delete(synchronize_session=False)
+        self._update_counts({partition_id: -deleted})
+        self.session.commit()
+
+    def _request_from_row(self, row):
+        if self.packed:
+            r = row.request.request
+        else:
+            method = row.method or b'GET'
+            r = Request(row.url, method=method, meta=row.meta, headers=row.headers, cookies=row.cookies)
+        r.meta[b'fingerprint'] = to_bytes(row.fingerprint)
+        r.meta[b'score'] = row.score
+        return r
+
     def get_next_requests(self, max_n_requests, partition_id, **kwargs):
         """
         Dequeues new batch of requests for crawling.
 
         :param max_n_requests: maximum number of requests to return
         :param partition_id: partition id
+        :param kwargs: max_requests_per_host
         :return: list of :class:`Request <frontera.core.models.Request>` objects.
         """
         results = []
         try:
-            for item in self._order_by(self.session.query(self.queue_model).filter_by(partition_id=partition_id)).\
-                    limit(max_n_requests):
-                method = item.method or b'GET'
-                r = Request(item.url, method=method, meta=item.meta, headers=item.headers, cookies=item.cookies)
-                r.meta[b'fingerprint'] = to_bytes(item.fingerprint)
-                r.meta[b'score'] = item.score
-                results.append(r)
-                self.session.delete(item)
-            self.session.commit()
+            rows = self._select_batch(max_n_requests, partition_id, kwargs.get('max_requests_per_host'))
+            results = [self._request_from_row(row) for row in rows]
+            self._delete_batch([row.id for row in rows], partition_id)
         except Exception as exc:
             self.logger.exception(exc)
             self.session.rollback()
@@ -194,6 +277,7 @@ class Queue(BaseQueue):
     @retry_and_rollback
     def schedule(self, batch):
         to_save = []
+        deltas = dict()
         for fprint, score, request, schedule in batch:
             if schedule:
                 _, hostname, _, _, _, _ = parse_domain_from_url_fast(request.url)
@@ -204,22 +288,67 @@ class Queue(BaseQueue):
                 else:
                     partition_id = self.partitioner.partition(hostname, self.partitions)
                     host_crc32 = get_crc32(hostname)
-                q = self.queue_model(fingerprint=to_native_str(fprint), score=score, url=request.url, meta=request.meta,
-                                     headers=request.headers, cookies=request.cookies, method=to_native_str(request.method),
-                                     partition_id=partition_id, host_crc32=host_crc32, created_at=time()*1E+6)
-                to_save.append(q)
                 request.meta[b'state'] = States.QUEUED
+                if self.packed:
+                    q = self.queue_model(fingerprint=to_native_str(fprint), score=score, request=request,
+                                         partition_id=partition_id, host_crc32=host_crc32, created_at=time()*1E+6)
+                else:
+                    q = self.queue_model(fingerprint=to_native_str(fprint), score=score, url=request.url,
+                                         meta=request.meta, headers=request.headers, cookies=request.cookies,
+                                         method=to_native_str(request.method), partition_id=partition_id,
+                                         host_crc32=host_crc32, created_at=time()*1E+6)
+                to_save.append(q)
+                deltas[partition_id] = deltas.get(partition_id, 0) + 1
         self.session.bulk_save_objects(to_save)
+        self._update_counts(deltas)
         self.session.commit()
 
     @retry_and_rollback
     def count(self):
-        return self.session.query(self.queue_model).count()
+        if self.counts_model is None:
+            return self.session.query(self.queue_model).count()
+        return sum(six.itervalues(self.partition_counts()))
 
+    def partition_counts(self):
+        # could be called from another thread, e.g. by DB worker status resource
+        session = self.session_cls()
+        try:
+            if self.counts_model is None:
+                model = self.queue_model
+                counts = dict(session.query(model.partition_id, func.count(model.id)).group_by(model.partition_id))
+            else:
+                counts = dict(session.query(self.counts_model.partition_id, self.counts_model.count))
+        finally:
+            session.close()
+        return dict((partition_id, counts.get(partition_id, 0)) for partition_id in self.partitions)
 
-class BroadCrawlingQueue(Queue):
+    @retry_and_rollback
+    def evict(self, partition_id, capacity=None, ttl=None):
+        """
+        Evicts requests created more than ``ttl`` seconds ago, then the lowest score requests above ``capacity``,
+        the most recent ones first among requests with the same score.
+
+        :return: list of fingerprints of evicted requests.
+        """
+        model = self.queue_model
+        rows = []
+        if ttl is not None:
+            deadline = (time() - ttl) * 1E+6
+            rows.extend(self.session.query(model.id, model.fingerprint)
+                        .filter(model.partition_id == partition_id, model.created_at < deadline).all())
+            self._delete_batch([row.id for row in rows], partition_id)
+        if capacity is not None:
+            excess = self.session.query(model.id).filter(model.partition_id == partition_id).count() - capacity
+            if excess > 0:
+                lowest = self.session.query(model.id, model.fingerprint) \
+                    .filter(model.partition_id == partition_id) \
+                    .order_by(model.score, model.created_at.desc()).limit(excess).all()
+                self._delete_batch([row.id for row in lowest], partition_id)
+                rows.extend(lowest)
+        return [to_bytes(row.fingerprint) for row in rows]
 
-    GET_RETRIES = 3
+
+class BroadCrawlingQueue(Queue):
 
     @retry_and_rollback
     def get_next_requests(self, max_n_requests, partition_id, **kwargs):
@@ -231,6 +360,9 @@ class BroadCrawlingQueue(Queue):
          - max_n_requests
          - min_hosts & min_requests
 
+        Per host limit is applied in the database, so the whole partition is considered in a single query and
+        min_hosts & min_requests are met whenever the partition holds enough requests.
+
         :param max_n_requests:
         :param partition_id:
         :param kwargs: min_requests, min_hosts, max_requests_per_host
@@ -241,42 +373,18 @@ class BroadCrawlingQueue(Queue):
         max_requests_per_host = kwargs.pop("max_requests_per_host", None)
         assert(max_n_requests > min_requests)
 
-        queue = {}
-        limit = max_n_requests
-        tries = 0
-        count = 0
-        while tries < self.GET_RETRIES:
-            tries += 1
-            limit *= 5.5 if tries > 1 else 1.0
-            self.logger.debug("Try %d, limit %d, last attempt: requests %d, hosts %d",
-                              tries, limit, count, len(queue.keys()))
-            queue.clear()
-            count = 0
-            for item in self._order_by(self.session.query(self.queue_model).filter_by(partition_id=partition_id)).\
-                    limit(limit):
-                if item.host_crc32 not in queue:
-                    queue[item.host_crc32] = []
-                if max_requests_per_host is not None and len(queue[item.host_crc32]) > max_requests_per_host:
-                    continue
-                queue[item.host_crc32].append(item)
-                count += 1
-                if count > max_n_requests:
-                    break
-            if min_hosts is not None and len(queue.keys()) < min_hosts:
-                continue
-            if min_requests is not None and count < min_requests:
-                continue
-            break
-        self.logger.debug("Finished: tries %d, hosts %d, requests %d", tries, len(queue.keys()), count)
-
+        rows = self._select_batch(max_n_requests, partition_id, max_requests_per_host)
+        hosts = set()
         results = []
-        for items in six.itervalues(queue):
-            for item in items:
-                method = item.method or b'GET'
-                results.append(Request(item.url, method=method,
-                                       meta=item.meta, headers=item.headers, cookies=item.cookies))
-                self.session.delete(item)
-        self.session.commit()
+        for row in rows:
+            hosts.add(row.host_crc32)
+            results.append(self._request_from_row(row))
+        self.logger.debug("Finished: hosts %d, requests %d", len(hosts), len(results))
+        if (min_hosts is not None and len(hosts) < min_hosts) or \
+                (min_requests is not None and len(results) < min_requests):
+            self.logger.debug("Partition %d doesn't have enough requests to satisfy min_hosts/min_requests",
+                              partition_id)
+        self._delete_batch([row.id for row in rows], partition_id)
         return results
 
 
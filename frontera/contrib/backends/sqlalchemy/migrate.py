@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Migrates SQLAlchemy backend tables with pickled meta, headers and cookies columns to the models storing the whole
+request in a single packed column (see :class:`RequestType <frontera.contrib.backends.sqlalchemy.models.RequestType>`).
+"""
+from __future__ import absolute_import
+
+from argparse import ArgumentParser
+import logging
+
+from frontera.contrib.backends.sqlalchemy.models import MetadataModel, QueueModel, PackedMetadataModel, \
+    PackedQueueModel
+from frontera.core.models import Request
+from frontera.utils.misc import load_object
+from sqlalchemy import create_engine
+from sqlalchemy.engine.reflection import Inspector
+from sqlalchemy.orm import sessionmaker
+
+
+logger = logging.getLogger(__name__)
+
+
+def _request_from_row(row):
+    return Request(row.url, method=row.method or b'GET', headers=row.headers, cookies=row.cookies, meta=row.meta)
+
+
+def migrate_table(session_cls, source_model, target_model, batch_size=1000):
+    """
+    Copies all rows from the table of ``source_model`` to the table of ``target_model``, packing url, method,
+    headers, cookies and meta into the request column. Rows are read in primary key order using keyset pagination,
+    so the source table could be of any size.
+
+    :param session_cls: SQLAlchemy session class.
+    :param source_model: model with pickled columns, e.g. :class:`QueueModel`.
+    :param target_model: packed model, e.g. :class:`PackedQueueModel`.
+    :param int batch_size: number of rows read and written within one transaction.
+    :return: number of migrated rows.
+    """
+    columns = [c.name for c in target_model.__table__.columns
+               if c.name != 'request' and c.name in source_model.__table__.columns]
+    pk = source_model.__mapper__.primary_key[0]
+    session = session_cls()
+    migrated = 0
+    last = None
+    try:
+        while True:
+            query = session.query(source_model).order_by(pk)
+            if last is not None:
+                query = query.filter(pk > last)
+            rows = query.limit(batch_size).all()
+            if not rows:
+                break
+            last = getattr(rows[-1], pk.key)
+            objects = []
+            for row in rows:
+                values = dict((name, getattr(row, name)) for name in columns)
+                values['request'] = _request_from_row(row)
+                objects.append(target_model(**values))
+            session.bulk_save_objects(objects)
+            session.commit()
+            session.expunge_all()
+            migrated += len(rows)
+            logger.info("%s: %d rows migrated", target_model.__table__.name, migrated)
+    finally:
+        session.close()
+    return migrated
+
+
+def migrate(engine, models=None, batch_size=1000, drop_source=False):
+    """
+    Creates the tables of packed models and migrates the data there.
+
+    :param engine: SQLAlchemy engine.
+    :param models: list of (source model, target model) pairs, defaults to metadata and queue models.
+    :param int batch_size: number of rows read and written within one transaction.
+    :param bool drop_source: drop source tables after migration.
+    """
+    models = models or [(MetadataModel, PackedMetadataModel), (QueueModel, PackedQueueModel)]
+    session_cls = sessionmaker()
+    session_cls.configure(bind=engine)
+    tables = Inspector.from_engine(engine).get_table_names()
+    for source_model, target_model in models:
+        if source_model.__table__.name not in tables:
+            logger.warning("Table %s doesn't exist, skipping", source_model.__table__.name)
+            continue
+        if target_model.__table__.name not in tables:
+            target_model.__table__.create(bind=engine)
+        count = migrate_table(session_cls, source_model, target_model, batch_size)
+        logger.info("Migrated %d rows from %s to %s", count, source_model.__table__.name,
+                    target_model.__table__.name)
+        if drop_source:
+            source_model.__table__.drop(bind=engine)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Frontera SQLAlchemy backend packed models migration utility")
+    parser.add_argument('--engine', type=str, required=True, help="SQLAlchemy database URL")
+    parser.add_argument('--models', type=str, nargs=2, action='append', metavar=('SOURCE', 'TARGET'),
+                        help="Source and target model paths, can be repeated. Defaults to metadata and queue models")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Rows per transaction")
+    parser.add_argument('--drop-source', action='store_true', help="Drop source tables after migration")
+    parser.add_argument('--log-level', '-L', type=str, default='INFO',
+                        help="Log level, for ex. DEBUG, INFO, WARN, ERROR, FATAL")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+    models = [(load_object(s), load_object(t)) for s, t in args.models] if args.models else None
+    migrate(create_engine(args.engine), models, args.batch_size, args.drop_source)
@@ -1,11 +1,93 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
-from sqlalchemy import Column, String, Integer, PickleType, SmallInteger, Float, DateTime, BigInteger
-from sqlalchemy.ext.declarative import declarative_base
+from frontera.core.models import Request, Response
+from frontera.utils.misc import load_object
+from sqlalchemy import Column, String, Integer, PickleType, SmallInteger, Float, DateTime, BigInteger, Index, \
+    LargeBinary
+from sqlalchemy.ext.declarative import declarative_base, declared_attr
+from sqlalchemy.types import TypeDecorator
 
 DeclarativeBase = declarative_base()
 
 
+class PackedRequest(object):
+    """
+    Encoded :class:`Request <frontera.core.models.Request>` as it's stored in the database. The request is decoded
+    only on first access to :attr:`request`, so rows can be loaded and copied around without paying for decoding.
+    """
+    __slots__ = ('data', '_decoder', '_request')
+
+    def __init__(self, data, decoder):
+        self.data = data
+        self._decoder = decoder
+        self._request = None
+
+    @property
+    def request(self):
+        if self._request is None:
+            self._request = self._decoder.decode_request(self.data)
+        return self._request
+
+    def __eq__(self, other):
+        return isinstance(other, PackedRequest) and self.data == other.data
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return '<PackedRequest: %d bytes>' % len(self.data)
+
+
+class RequestType(TypeDecorator):
+    """
+    Stores the whole :class:`Request <frontera.core.models.Request>` (url, method, headers, cookies and meta) in a
+    single binary column using encoder and decoder of Frontera codec. Accepts either Request or
+    :class:`PackedRequest` objects, and returns :class:`PackedRequest` objects.
+
+    :param str codec: path to the codec module, defaults to msgpack.
+    """
+    impl = LargeBinary
+
+    def __init__(self, codec='frontera.contrib.backends.remote.codecs.msgpack', *args, **kwargs):
+        super(RequestType, self).__init__(*args, **kwargs)
+        self.codec = codec
+        self.encoder = load_object(codec + '.Encoder')(Request)
+        self.decoder = load_object(codec + '.Decoder')(Request, Response)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, PackedRequest):
+            return value.data
+        return self.encoder.encode_request(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return PackedRequest(bytes(value), self.decoder)
+
+
+def is_packed(model):
+    """
+    Checks if the model stores requests packed with :class:`RequestType`.
+    """
+    column = model.__table__.c.get('request')
+    return column is not None and isinstance(column.type, RequestType)
+
+
+def _queue_table_args(tablename):
+    # batch selection filters by partition and orders by score and creation time, see
+    # sqlalchemy.components.Queue._select_batch
+    return (
+        Index('ix_%s_partition_id_score_created_at' % tablename, 'partition_id', 'score', 'created_at'),
+        {
+            'mysql_charset': 'utf8',
+            'mysql_engine': 'InnoDB',
+            'mysql_row_format': 'DYNAMIC',
+        },
+    )
+
+
 class MetadataModel(DeclarativeBase):
     __tablename__ = 'metadata'
     __table_args__ = (
@@ -37,8 +119,12 @@ class MetadataModel(DeclarativeBase):
         return '<Metadata:%s (%s)>' % (self.url, self.fingerprint)
 
 
-class StateModel(DeclarativeBase):
-    __tablename__ = 'states'
+class PackedMetadataModel(DeclarativeBase):
+    """
+    Same as :class:`MetadataModel`, but meta, headers, cookies and method are stored within a single packed request
+    column instead of pickled columns.
+    """
+    __tablename__ = 'packed_metadata'
     __table_args__ = (
         {
             'mysql_charset': 'utf8',
@@ -48,17 +134,25 @@ class StateModel(DeclarativeBase):
     )
 
     fingerprint = Column(String(40), primary_key=True, nullable=False)
-    state = Column(SmallInteger())
+    url = Column(String(1024), nullable=False)
+    depth = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    fetched_at = Column(DateTime, nullable=True)
+    status_code = Column(String(20))
+    score = Column(Float)
+    error = Column(String(128))
+    request = Column(RequestType())
 
     @classmethod
     def query(cls, session):
         return session.query(cls)
 
     def __repr__(self):
-        return '<State:%s=%d>' % (self.fingerprint, self.state)
+        return '<PackedMetadata:%s (%s)>' % (self.url, self.fingerprint)
 
 
-class QueueModelMixin(object):
+class StateModel(DeclarativeBase):
+    __tablename__ = 'states'
     __table_args__ = (
         {
             'mysql_charset': 'utf8',
@@ -67,8 +161,24 @@ class QueueModelMixin(object):
         },
     )
 
+    fingerprint = Column(String(40), primary_key=True, nullable=False)
+    state = Column(SmallInteger())
+
+    @classmethod
+    def query(cls, session):
+        return session.query(cls)
+
+    def __repr__(self):
+        return '<State:%s=%d>' % (self.fingerprint, self.state)
+
+
+class QueueModelMixin(object):
+    @declared_attr
+    def __table_args__(cls):
+        return _queue_table_args(cls.__tablename__)
+
     id = Column(Integer, primary_key=True)
-    partition_id = Column(Integer, index=True)
+    partition_id = Column(Integer)
     score = Column(Float, index=True)
     url = Column(String(1024), nullable=False)
     fingerprint = Column(String(40), nullable=False)
@@ -92,6 +202,56 @@ class QueueModel(QueueModelMixin, DeclarativeBase):
         return '<Queue:%s (%d)>' % (self.url, self.id)
 
 
+class PackedQueueModelMixin(object):
+    """
+    Queue model storing the whole request in a single packed column, see :class:`RequestType`.
+    """
+    @declared_attr
+    def __table_args__(cls):
+        return _queue_table_args(cls.__tablename__)
+
+    id = Column(Integer, primary_key=True)
+    partition_id = Column(Integer)
+    score = Column(Float, index=True)
+    fingerprint = Column(String(40), nullable=False)
+    host_crc32 = Column(Integer, nullable=False)
+    request = Column(RequestType())
+    created_at = Column(BigInteger, index=True)
+    depth = Column(SmallInteger)
+
+
+class PackedQueueModel(PackedQueueModelMixin, DeclarativeBase):
+    __tablename__ = 'packed_queue'
+
+    @classmethod
+    def query(cls, session):
+        return session.query(cls)
+
+    def __repr__(self):
+        return '<PackedQueue:%s (%d)>' % (self.fingerprint, self.id)
+
+
+class QueueCountModel(DeclarativeBase):
+    __tablename__ = 'queue_counts'
+    __table_args__ = (
+        {
+            'mysql_charset': 'utf8',
+            'mysql_engine': 'InnoDB',
+            'mysql_row_format': 'DYNAMIC',
+        },
+    )
+
+    partition_id = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(BigInteger, nullable=False, default=0)
+
+    @classmethod
+    def query(cls, session):
+        return session.query(cls)
+
+    def __repr__(self):
+        return '<QueueCount:%d=%d>' % (self.partition_id, self.count)
+
+
 class DomainMetadataModel(DeclarativeBase):
     __tablename__ = 'domain_metadata'
     __table_args__ = (
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+import sqlite3
+from threading import RLock
+from time import time
+
+import six
+from msgpack import packb, unpackb
+from w3lib.util import to_bytes, to_native_str
+
+from frontera.contrib.backends.memory import MemoryStates
+from frontera.contrib.backends.partitioners import Crc32NamePartitioner
+from frontera.contrib.backends.revisiting import RevisitingQueue
+from frontera.core.components import DistributedBackend, Metadata, Queue, DomainMetadata
+from frontera.core.models import Request, Response
+from frontera.utils.misc import get_crc32, chunks, load_object
+from frontera.utils.url import parse_domain_from_url_fast
+
+
+# SQLite limits the number of host parameters in a statement to 999 by default
+MAX_VARIABLES = 500
+
+
+class Database(object):
+    """
+    A single SQLite connection shared by all components of the backend within a process. The database is switched to
+    WAL journal mode, so strategy worker and DB worker processes can read while the other one is writing. Statements
+    are kept constant, so the sqlite3 module compiles them once and reuses from its statement cache.
+
+    :param str path: database file path or ``:memory:``.
+    :param str synchronous: value of ``PRAGMA synchronous``, ``NORMAL`` is safe in WAL mode.
+    :param float timeout: seconds to wait for the lock held by another process.
+    """
+    def __init__(self, path, synchronous='NORMAL', timeout=30.0):
+        self.connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False, cached_statements=256)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=%s' % synchronous)
+        self.lock = RLock()
+        self.closed = False
+
+    def create_tables(self, tables, drop=False):
+        with self.lock, self.connection:
+            for name, ddl in tables:
+                if drop:
+                    self.connection.execute('DROP TABLE IF EXISTS %s' % name)
+                self.connection.executescript(ddl)
+
+    def close(self):
+        self.connection.close()
+        self.closed = True
+
+
+class SQLiteStates(MemoryStates):
+
+    TABLES = [('states', 'CREATE TABLE IF NOT EXISTS states (fingerprint BLOB PRIMARY KEY, state INTEGER NOT NULL) '
+                         'WITHOUT ROWID;')]
+
+    def __init__(self, db, cache_size_limit):
+        super(SQLiteStates, self).__init__(cache_size_limit)
+        self._db = db
+        self.logger = logging.getLogger("sqlite.states")
+
+    def frontier_stop(self):
+        self.flush()
+
+    def fetch(self, fingerprints):
+        to_fetch = [to_bytes(f) for f in fingerprints if f not in self._cache]
+        self.logger.debug("cache size %s", len(self._cache))
+        self.logger.debug("to fetch %d from %d", len(to_fetch), len(fingerprints))
+        with self._db.lock:
+            for chunk in chunks(to_fetch, MAX_VARIABLES):
+                query = 'SELECT fingerprint, state FROM states WHERE fingerprint IN (%s)' % ','.join('?' * len(chunk))
+                for fingerprint, state in self._db.connection.execute(query, [sqlite3.Binary(f) for f in chunk]):
+                    self._cache[bytes(fingerprint)] = state
+
+    def flush(self):
+        with self._db.lock, self._db.connection:
+            self._db.connection.executemany('INSERT OR REPLACE INTO states (fingerprint, state) VALUES (?, ?)',
+                                            [(sqlite3.Binary(to_bytes(fprint)), state)
+                                             for fprint, state in six.iteritems(self._cache)])
+        self.logger.debug("State cache has been flushed.")
+        super(SQLiteStates, self).flush()
+
+
+class SQLiteQueue(Queue):
+    """
+    Requests are stored encoded with the codec, and selected within a partition in ascending order of score, and in
+    order of scheduling for the same score, as in SQLAlchemy queue. Per host limit is applied with ``ROW_NUMBER()`` window function, which
+    requires SQLite 3.25+. Number of requests in every partition is kept in ``queue_counts`` table updated in the same
+    transaction with the queue.
+    """
+    TABLES = [('queue', 'CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY, partition_id INTEGER NOT NULL, '
+                        'score REAL NOT NULL, created_at INTEGER NOT NULL, host_crc32 INTEGER NOT NULL, '
+                        'fingerprint BLOB NOT NULL, request BLOB NOT NULL);'
+                        'CREATE INDEX IF NOT EXISTS ix_queue_partition_id_score ON queue (partition_id, score, id);'),
+              ('queue_counts', 'CREATE TABLE IF NOT EXISTS queue_counts (partition_id INTEGER PRIMARY KEY, '
+                               'count INTEGER NOT NULL);')]
+    UPDATE_COUNT = 'UPDATE queue_counts SET count = count + ? WHERE partition_id = ?'
+
+    SELECT = 'SELECT id, fingerprint, score, request FROM queue WHERE partition_id = ? ' \
+             'ORDER BY score, id LIMIT ?'
+    SELECT_HOST_LIMITED = 'SELECT id, fingerprint, score, request FROM ' \
+                          '(SELECT id, fingerprint, score, request, ROW_NUMBER() OVER ' \
+                          '(PARTITION BY host_crc32 ORDER BY score, id) AS host_rank ' \
+                          'FROM queue WHERE partition_id = ?) ' \
+                          'WHERE host_rank <= ? ORDER BY score, id LIMIT ?'
+
+    def __init__(self, db, partitions, codec, request_model=Request, response_model=Response):
+        self._db = db
+        self._encoder = load_object(codec + '.Encoder')(request_model)
+        self._decoder = load_object(codec + '.Decoder')(request_model, response_model)
+        self.partitions = [i for i in range(0, partitions)]
+        self.partitioner = Crc32NamePartitioner(self.partitions)
+        self.logger = logging.getLogger("sqlite.queue")
+        with self._db.lock, self._db.connection:
+            self._db.connection.executemany('INSERT OR IGNORE INTO queue_counts (partition_id, count) VALUES '
+                                            '(?, (SELECT COUNT(*) FROM queue WHERE partition_id = ?))',
+                                            [(partition_id, partition_id) for partition_id in self.partitions])
+
+    def get_next_requests(self, max_n_requests, partition_id, **kwargs):
+        """
+        Dequeues new batch of requests for crawling.
+
+        :param max_n_requests: maximum number of requests to return
+        :param partition_id: partition id
+        :param kwargs: max_requests_per_host
+        :return: list of :class:`Request <frontera.core.models.Request>` objects.
+        """
+        max_requests_per_host = kwargs.get('max_requests_per_host')
+        connection = self._db.connection
+        with self._db.lock, connection:
+            if max_requests_per_host is None:
+                rows = connection.execute(self.SELECT, (partition_id, max_n_requests)).fetchall()
+            else:
+                rows = connection.execute(self.SELECT_HOST_LIMITED,
+                                          (partition_id, max_requests_per_host, max_n_requests)).fetchall()
+            connection.executemany('DELETE FROM queue WHERE id = ?', [(row[0],) for row in rows])
+            connection.execute(self.UPDATE_COUNT, (-len(rows), partition_id))
+        results = []
+        for _, fingerprint, score, request in rows:
+            r = self._decoder.decode_request(bytes(request))
+            r.meta[b'fingerprint'] = bytes(fingerprint)
+            r.meta[b'score'] = score
+            results.append(r)
+        return results
+
+    def schedule(self, batch):
+        to_save = []
+        deltas = dict()
+        now = int(time() * 1E+6)
+        for fprint, score, request, schedule in batch:
+            if schedule:
+                _, hostname, _, _, _, _ = parse_domain_from_url_fast(request.url)
+                if not hostname:
+                    self.logger.error("Can't get hostname for URL %s, fingerprint %s", request.url, fprint)
+                    partition_id = self.partitions[0]
+                    host_crc32 = 0
+                else:
+                    partition_id = self.partitioner.partition(hostname, self.partitions)
+                    host_crc32 = get_crc32(hostname)
+                request.meta[b'state'] = SQLiteStates.QUEUED
+                to_save.append((partition_id, score, now, host_crc32, sqlite3.Binary(to_bytes(fprint)),
+                                sqlite3.Binary(self._encoder.encode_request(request))))
+                deltas[partition_id] = deltas.get(partition_id, 0) + 1
+        with self._db.lock, self._db.connection:
+            self._db.connection.executemany('INSERT INTO queue (partition_id, score, created_at, host_crc32, '
+                                            'fingerprint, request) VALUES (?, ?, ?, ?, ?, ?)', to_save)
+            self._db.connection.executemany(self.UPDATE_COUNT, [(delta, partition_id)
+                                                                for partition_id, delta in six.iteritems(deltas)])
+
+    def count(self):
+        with self._db.lock:
+            return self._db.connection.execute('SELECT SUM(count) FROM queue_counts').fetchone()[0] or 0
+
+    def partition_counts(self):
+        with self._db.lock:
+            return dict(self._db.connection.execute('SELECT partition_id, count FROM queue_counts'))
+
+    def evict(self, partition_id, capacity=None, ttl=None):
+        """
+        Evicts requests scheduled more than ``ttl`` seconds ago, then the lowest score requests above ``capacity``,
+        the most recent ones first among requests with the same score.
+
+        :return: list of fingerprints of evicted requests.
+        """
+        rows = []
+        connection = self._db.connection
+        with self._db.lock, connection:
+            if ttl is not None:
+                deadline = int((time() - ttl) * 1E+6)
+                rows.extend(connection.execute('SELECT id, fingerprint FROM queue WHERE partition_id = ? AND '
+                                               'created_at < ?', (partition_id, deadline)).fetchall())
+                connection.executemany('DELETE FROM queue WHERE id = ?', [(row[0],) for row in rows])
+            if capacity is not None:
+                excess = connection.execute('SELECT COUNT(*) FROM queue WHERE partition_id = ?',
+                                            (partition_id,)).fetchone()[0] - capacity
+                if excess > 0:
+                    lowest = connection.execute('SELECT id, fingerprint FROM queue WHERE partition_id = ? '
+                                                'ORDER BY score, id DESC LIMIT ?', (partition_id, excess)).fetchall()
+                    connection.executemany('DELETE FROM queue WHERE id = ?', [(row[0],) for row in lowest])
+                    rows.extend(lowest)
+            connection.execute(self.UPDATE_COUNT, (-len(rows), partition_id))
+        return [bytes(fingerprint) for _, fingerprint in rows]
+
+
+class SQLiteMetadata(Metadata):
+
+    TABLES = [('metadata', 'CREATE TABLE IF NOT EXISTS metadata (fingerprint BLOB PRIMARY KEY, url TEXT NOT NULL, '
+                           'depth INTEGER NOT NULL DEFAULT 0, created_at INTEGER NOT NULL, fetched_at INTEGER, '
+                           'status_code INTEGER, score REAL, error TEXT, request BLOB) WITHOUT ROWID;')]
+
+    INSERT = 'INSERT OR IGNORE INTO metadata (fingerprint, url, depth, created_at, request) VALUES (?, ?, ?, ?, ?)'
+    UPSERT_CRAWLED = 'INSERT INTO metadata (fingerprint, url, depth, created_at, fetched_at, status_code, request) ' \
+                     'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (fingerprint) DO UPDATE SET ' \
+                     'fetched_at = excluded.fetched_at, status_code = excluded.status_code, ' \
+                     'request = excluded.request'
+    UPSERT_ERROR = 'INSERT INTO metadata (fingerprint, url, depth, created_at, fetched_at, error, request) ' \
+                   'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (fingerprint) DO UPDATE SET ' \
+                   'fetched_at = excluded.fetched_at, error = excluded.error'
+    UPSERT_SCORE = 'INSERT INTO metadata (fingerprint, url, depth, created_at, score) VALUES (?, ?, ?, ?, ?) ' \
+                   'ON CONFLICT (fingerprint) DO UPDATE SET score = excluded.score'
+
+    def __init__(self, db, codec, request_model=Request):
+        self._db = db
+        self._encoder = load_object(codec + '.Encoder')(request_model)
+        self.logger = logging.getLogger("sqlite.metadata")
+
+    def _values(self, request, now):
+        return (sqlite3.Binary(to_bytes(request.meta[b'fingerprint'])), to_native_str(request.url),
+                request.meta.get(b'depth', 0), now)
+
+    def _executemany(self, statement, rows):
+        with self._db.lock, self._db.connection:
+            self._db.connection.executemany(statement, rows)
+
+    def add_seeds(self, seeds):
+        now = int(time())
+        self._executemany(self.INSERT, [self._values(seed, now) + (sqlite3.Binary(self._encoder.encode_request(seed)),)
+                                        for seed in seeds])
+
+    def links_extracted(self, request, links):
+        now = int(time())
+        self._executemany(self.INSERT, [self._values(link, now) + (sqlite3.Binary(self._encoder.encode_request(link)),)
+                                        for link in links])
+
+    def page_crawled(self, response):
+        now = int(time())
+        request = response.request
+        self._executemany(self.UPSERT_CRAWLED, [self._values(response, now) + (
+            now, int(response.status_code), sqlite3.Binary(self._encoder.encode_request(request)))])
+
+    def request_error(self, page, error):
+        now = int(time())
+        request = page.request if isinstance(page, Response) else page
+        self._executemany(self.UPSERT_ERROR, [self._values(page, now) + (
+            now, error, sqlite3.Binary(self._encoder.encode_request(request)))])
+
+    def update_score(self, batch):
+        now = int(time())
+        self._executemany(self.UPSERT_SCORE, [self._values(request, now) + (score,)
+                                              for fprint, score, request, schedule in batch])
+
+
+class SQLiteDomainMetadata(DomainMetadata):
+    """
+    Values are stored msgpack encoded, so they should consist of msgpack serializable types.
+    """
+    TABLES = [('domain_metadata', 'CREATE TABLE IF NOT EXISTS domain_metadata (key TEXT PRIMARY KEY, '
+                                  'value BLOB) WITHOUT ROWID;')]
+
+    def __init__(self, db):
+        self._db = db
+        self.logger = logging.getLogger("sqlite.domain_metadata")
+
+    def __setitem__(self, key, value):
+        with self._db.lock, self._db.connection:
+            self._db.connection.execute('INSERT OR REPLACE INTO domain_metadata (key, value) VALUES (?, ?)',
+                                        (to_native_str(key), sqlite3.Binary(packb(value, use_bin_type=True))))
+
+    def __getitem__(self, key):
+        with self._db.lock:
+            row = self._db.connection.execute('SELECT value FROM domain_metadata WHERE key = ?',
+                                              (to_native_str(key),)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return unpackb(bytes(row[0]), raw=False)
+
+    def __contains__(self, key):
+        with self._db.lock:
+            row = self._db.connection.execute('SELECT 1 FROM domain_metadata WHERE key = ?',
+                                              (to_native_str(key),)).fetchone()
+        return row is not None
+
+    def __delitem__(self, key):
+        with self._db.lock, self._db.connection:
+            self._db.connection.execute('DELETE FROM domain_metadata WHERE key = ?', (to_native_str(key),))
+
+
+class SQLiteBackend(DistributedBackend):
+    """
+    Single node backend on top of stdlib :mod:`sqlite3` without ORM. All components share one connection per process
+    and write in batches with ``executemany``. Strategy and DB workers could be run as separate processes on the same
+    database file.
+    """
+    component_name = 'SQLite Backend'
+
+    def __init__(self, manager):
+        self.manager = manager
+        settings = manager.settings
+        self.db = Database(settings.get('SQLITE_DATABASE'), synchronous=settings.get('SQLITE_SYNCHRONOUS'))
+        self.queue_partitions = settings.get('SPIDER_FEED_PARTITIONS')
+        self._min_hosts = settings.get('BC_MIN_HOSTS')
+        self._max_requests_per_host = settings.get('BC_MAX_REQUESTS_PER_HOST')
+        self._metadata = None
+        self._queue = None
+        self._states = None
+        self._domain_metadata = None
+
+    def _init_strategy_worker(self, manager):
+        settings = manager.settings
+        self.db.create_tables(SQLiteStates.TABLES + SQLiteDomainMetadata.TABLES, settings.get('SQLITE_DROP_ALL_TABLES'))
+        self._states = SQLiteStates(self.db, settings.get('STATE_CACHE_SIZE_LIMIT'))
+        self._domain_metadata = SQLiteDomainMetadata(self.db)
+
+    def _init_db_worker(self, manager):
+        settings = manager.settings
+        codec = settings.get('SQLITE_BACKEND_CODEC')
+        self.db.create_tables(SQLiteMetadata.TABLES + SQLiteQueue.TABLES, settings.get('SQLITE_DROP_ALL_TABLES'))
+        self._metadata = SQLiteMetadata(self.db, codec, manager.request_model)
+        if settings.get('POLITENESS_ENABLED'):
+            # domain metadata is owned by strategy worker and read by DB worker politeness layer
+            self.db.create_tables(SQLiteDomainMetadata.TABLES)
+            self._domain_metadata = SQLiteDomainMetadata(self.db)
+        self._queue = RevisitingQueue.from_settings(SQLiteQueue(self.db, self.queue_partitions, codec,
+                                                                manager.request_model, manager.response_model),
+                                                    settings)
+
+    @classmethod
+    def strategy_worker(cls, manager):
+        b = cls(manager)
+        b._init_strategy_worker(manager)
+        return b
+
+    @classmethod
+    def db_worker(cls, manager):
+        b = cls(manager)
+        b._init_db_worker(manager)
+        return b
+
+    @classmethod
+    def local(cls, manager):
+        b = cls(manager)
+        b._init_db_worker(manager)
+        b._init_strategy_worker(manager)
+        return b
+
+    @property
+    def queue(self):
+        return self._queue
+
+    @property
+    def metadata(self):
+        return self._metadata
+
+    @property
+    def states(self):
+        return self._states
+
+    @property
+    def domain_metadata(self):
+        return self._domain_metadata
+
+    def frontier_start(self):
+        for component in [self.metadata, self.queue, self.states, self.domain_metadata]:
+            if component:
+                component.frontier_start()
+
+    def frontier_stop(self):
+        # manager may stop the backend more than once
+        if self.db.closed:
+            return
+        for component in [self.metadata, self.queue, self.states, self.domain_metadata]:
+            if component:
+                component.frontier_stop()
+        self.db.close()
+
+    def add_seeds(self, seeds):
+        self.metadata.add_seeds(seeds)
+
+    def get_next_requests(self, max_next_requests, **kwargs):
+        partitions = kwargs.pop('partitions', [0])
+        kwargs.setdefault('min_hosts', self._min_hosts)
+        kwargs.setdefault('max_requests_per_host', self._max_requests_per_host)
+        batch = []
+        for partition_id in partitions:
+            batch.extend(self.queue.get_next_requests(max_next_requests, partition_id, **kwargs))
+        return batch
+
+    def page_crawled(self, response):
+        self.metadata.page_crawled(response)
+
+    def links_extracted(self, request, links):
+        self.metadata.links_extracted(request, links)
+
+    def request_error(self, request, error):
+        self.metadata.request_error(request, error)
+
+    def finished(self):
+        return self.queue.count() == 0
@@ -2,7 +2,8 @@
 from __future__ import absolute_import
 
 from logging import getLogger
-from time import sleep
+from threading import Event, Lock, Thread
+from time import sleep, time
 
 import six
 from kafka import KafkaConsumer, KafkaProducer, TopicPartition
@@ -36,17 +37,17 @@ def _prepare_kafka_ssl_kwargs(cert_path):
 class Consumer(BaseStreamConsumer):
     """
     Used in DB and SW worker. SW consumes per partition.
+
+    :param kwargs: fetch options of KafkaConsumer.
     """
-    def __init__(self, location, enable_ssl, cert_path, topic, group, partition_id):
+    def __init__(self, location, enable_ssl, cert_path, topic, group, partition_id, **kwargs):
         self._location = location
         self._group = group
         self._topic = topic
-        kwargs = _prepare_kafka_ssl_kwargs(cert_path) if enable_ssl else {}
+        kwargs.update(_prepare_kafka_ssl_kwargs(cert_path) if enable_ssl else {})
         self._consumer = KafkaConsumer(
             bootstrap_servers=self._location,
             group_id=self._group,
-            max_partition_fetch_bytes=10485760,
-            consumer_timeout_ms=100,
             client_id="%s-%s" % (self._topic, str(partition_id) if partition_id is not None else "all"),
             request_timeout_ms=120 * 1000,
             heartbeat_interval_ms=10000,
@@ -65,13 +66,17 @@ class Consumer(BaseStreamConsumer):
 
     def get_messages(self, timeout=0.1, count=1):
         result = []
+        deadline = time() + timeout
         while count > 0:
-            try:
-                m = next(self._consumer)
-                result.append(m.value)
-                count -= 1
-            except StopIteration:
+            remaining = deadline - time()
+            # once some records are received, only already fetched ones are added, without waiting for more
+            batches = self._consumer.poll(timeout_ms=0 if result else int(max(remaining, 0) * 1000),
+                                          max_records=count)
+            records = [record.value for partition_records in six.itervalues(batches) for record in partition_records]
+            if not records and (result or remaining <= 0):
                 break
+            result.extend(records)
+            count -= len(records)
         return result
 
     def get_offset(self, partition_id):
@@ -138,6 +143,22 @@ class KeyedProducer(BaseStreamProducer):
         pass
 
 
+class SpiderFeedProducer(KeyedProducer):
+    """
+    Adds counts of sent messages to lags kept by lag monitor of message bus, if it's started, so partitions filled since
+    the last snapshot of lags aren't reported available again.
+    """
+    def __init__(self, messagebus, *args, **kwargs):
+        super(SpiderFeedProducer, self).__init__(*args, **kwargs)
+        self._messagebus = messagebus
+
+    def send(self, key, *messages):
+        super(SpiderFeedProducer, self).send(key, *messages)
+        lag_monitor = self._messagebus.lag_monitor
+        if lag_monitor is not None:
+            lag_monitor.add(self._partitioner.partition(key), len(messages))
+
+
 class SpiderLogStream(BaseSpiderLogStream):
     def __init__(self, messagebus):
         self._location = messagebus.kafka_location
@@ -148,6 +169,7 @@ class SpiderLogStream(BaseSpiderLogStream):
         self._partitions = messagebus.spider_log_partitions
         self._enable_ssl = messagebus.enable_ssl
         self._cert_path = messagebus.cert_path
+        self._fetch_kwargs = messagebus.fetch_kwargs
 
     def producer(self):
         return KeyedProducer(self._location, self._enable_ssl, self._cert_path, self._topic,
@@ -163,13 +185,85 @@ class SpiderLogStream(BaseSpiderLogStream):
         :return:
         """
         group = self._sw_group if type == b'sw' else self._db_group
-        c = Consumer(self._location, self._enable_ssl, self._cert_path, self._topic, group, partition_id)
+        c = Consumer(self._location, self._enable_ssl, self._cert_path, self._topic, group, partition_id,
+                     **self._fetch_kwargs)
         assert len(c._consumer.partitions_for_topic(self._topic)) == self._partitions
         return c
 
 
+class PartitionLagMonitor(object):
+    """
+    Keeps the latest snapshot of spider feed partition lags, refreshed by a background thread every ``interval``
+    seconds, so getting lags doesn't wait for offset requests to the broker. The fetcher is used only by the thread.
+    Messages sent since the snapshot was requested are added to it, so the snapshot doesn't fall behind the producer.
+    With zero interval lags are fetched synchronously on every call.
+    """
+    def __init__(self, fetcher, interval):
+        self._fetcher = fetcher
+        self._interval = interval
+        self._lags = {}
+        self._sent = {}
+        self._lock = Lock()
+        self._ready = Event()
+        self._stop = Event()
+        self._thread = None
+        if interval:
+            self._thread = Thread(target=self._run, name='spider-feed-lags')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _refresh(self):
+        with self._lock:
+            self._sent = {}
+        try:
+            lags = self._fetcher.get()
+        except Exception:
+            logger.exception("Failed to fetch spider feed partition lags")
+            return
+        with self._lock:
+            # messages sent during the fetch may be missing in fetched offsets
+            for partition, count in six.iteritems(self._sent):
+                if partition in lags:
+                    lags[partition] += count
+            self._lags = lags
+        self._ready.set()
+
+    def _run(self):
+        self._refresh()
+        while not self._stop.wait(self._interval):
+            self._refresh()
+
+    def get(self, timeout=None):
+        """
+        Returns the latest snapshot of lags, waiting up to ``timeout`` seconds for the first one.
+        :return: dict of partition id -> lag
+        """
+        if self._thread is None:
+            return self._fetcher.get()
+        self._ready.wait(timeout)
+        with self._lock:
+            return dict(self._lags)
+
+    def add(self, partition, count):
+        """
+        Adds ``count`` messages sent to ``partition`` to its lag, until the next snapshot.
+        """
+        if self._thread is None:
+            return
+        with self._lock:
+            if partition in self._lags:
+                self._lags[partition] += count
+            self._sent[partition] = self._sent.get(partition, 0) + count
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
 class SpiderFeedStream(BaseSpiderFeedStream):
     def __init__(self, messagebus):
+        self._messagebus = messagebus
         self._location = messagebus.kafka_location
         self._general_group = messagebus.spider_feed_group
         self._topic = messagebus.topic_todo
@@ -177,37 +271,32 @@ class SpiderFeedStream(BaseSpiderFeedStream):
         self._hostname_partitioning = messagebus.hostname_partitioning
         self._enable_ssl = messagebus.enable_ssl
         self._cert_path = messagebus.cert_path
-        kwargs = {
-            'bootstrap_servers': self._location,
-            'topic': self._topic,
-            'group_id': self._general_group,
-        }
-        if self._enable_ssl:
-            kwargs.update(_prepare_kafka_ssl_kwargs(self._cert_path))
-        self._offset_fetcher = OffsetsFetcherAsync(**kwargs)
+        self._fetch_kwargs = messagebus.fetch_kwargs
+        self._get_timeout = messagebus.get_timeout
         self._codec = messagebus.codec
         self._partitions = messagebus.spider_feed_partitions
 
     def consumer(self, partition_id):
-        c = Consumer(self._location, self._enable_ssl, self._cert_path, self._topic, self._general_group, partition_id)
+        c = Consumer(self._location, self._enable_ssl, self._cert_path, self._topic, self._general_group, partition_id,
+                     **self._fetch_kwargs)
         assert len(c._consumer.partitions_for_topic(self._topic)) == self._partitions, \
             "Number of kafka topic partitions doesn't match value in config for spider feed"
         return c
 
     def available_partitions(self):
-        partitions = []
-        lags = self._offset_fetcher.get()
-        for partition, lag in six.iteritems(lags):
-            if lag < self._max_next_requests:
-                partitions.append(partition)
-        return partitions
+        lags = self._messagebus.get_lag_monitor().get(timeout=self._get_timeout)
+        partitions = [partition for partition, lag in six.iteritems(lags) if lag < self._max_next_requests]
+        # the emptiest partitions are filled first
+        return sorted(partitions, key=lambda partition: (lags[partition], partition))
 
     def producer(self):
-        partitioner = Crc32NamePartitioner(self._partitions) if self._hostname_partitioning \
-            else FingerprintPartitioner(self._partitions)
-        return KeyedProducer(self._location, self._enable_ssl, self._cert_path, self._topic, partitioner, self._codec,
-                             batch_size=DEFAULT_BATCH_SIZE,
-                             buffer_memory=DEFAULT_BUFFER_MEMORY)
+        partitions = list(range(self._partitions))
+        partitioner = Crc32NamePartitioner(partitions) if self._hostname_partitioning \
+            else FingerprintPartitioner(partitions)
+        return SpiderFeedProducer(self._messagebus, self._location, self._enable_ssl, self._cert_path, self._topic,
+                                  partitioner, self._codec,
+                                  batch_size=DEFAULT_BATCH_SIZE,
+                                  buffer_memory=DEFAULT_BUFFER_MEMORY)
 
 
 class ScoringLogStream(BaseScoringLogStream):
@@ -218,9 +307,11 @@ class ScoringLogStream(BaseScoringLogStream):
         self._codec = messagebus.codec
         self._cert_path = messagebus.cert_path
         self._enable_ssl = messagebus.enable_ssl
+        self._fetch_kwargs = messagebus.fetch_kwargs
 
     def consumer(self):
-        return Consumer(self._location, self._enable_ssl, self._cert_path, self._topic, self._group, partition_id=None)
+        return Consumer(self._location, self._enable_ssl, self._cert_path, self._topic, self._group, partition_id=None,
+                        **self._fetch_kwargs)
 
     def producer(self):
         return SimpleProducer(self._location, self._enable_ssl, self._cert_path, self._topic, self._codec,
@@ -261,6 +352,39 @@ class MessageBus(BaseMessageBus):
         self.cert_path = settings.get('KAFKA_CERT_PATH')
         self.spider_log_partitions = settings.get('SPIDER_LOG_PARTITIONS')
         self.spider_feed_partitions = settings.get('SPIDER_FEED_PARTITIONS')
+        self.lag_refresh_interval = settings.get('KAFKA_LAG_REFRESH_INTERVAL')
+        self.get_timeout = float(settings.get('KAFKA_GET_TIMEOUT'))
+        self.fetch_kwargs = {
+            'fetch_min_bytes': settings.get('KAFKA_FETCH_MIN_BYTES'),
+            'fetch_max_bytes': settings.get('KAFKA_FETCH_MAX_BYTES'),
+            'fetch_max_wait_ms': settings.get('KAFKA_FETCH_MAX_WAIT_MS'),
+            'max_partition_fetch_bytes': settings.get('KAFKA_MAX_PARTITION_FETCH_BYTES'),
+        }
+        self.lag_monitor = None
+        self._lag_monitor_lock = Lock()
+
+    def get_lag_monitor(self):
+        """
+        Returns spider feed lag monitor, shared by all spider feed streams and producers of the message bus. It's
+        started on the first call, so processes not generating batches, e.g. spiders, don't poll the broker.
+        """
+        with self._lag_monitor_lock:
+            if self.lag_monitor is None:
+                kwargs = {
+                    'bootstrap_servers': self.kafka_location,
+                    'topic': self.topic_todo,
+                    'group_id': self.spider_feed_group,
+                }
+                if self.enable_ssl:
+                    kwargs.update(_prepare_kafka_ssl_kwargs(self.cert_path))
+                self.lag_monitor = PartitionLagMonitor(OffsetsFetcherAsync(**kwargs), self.lag_refresh_interval)
+            return self.lag_monitor
+
+    def close(self):
+        with self._lag_monitor_lock:
+            if self.lag_monitor is not None:
+                self.lag_monitor.close()
+                self.lag_monitor = None
 
     def spider_log(self):
         return SpiderLogStream(self)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+In-process message bus. Streams are partitioned logs of messages kept in memory and shared by all message bus
+instances of the process, so spiders, strategy and DB worker components running as threads of one process communicate
+without a broker. Messages are passed as is, and aren't copied.
+"""
+from __future__ import absolute_import
+
+from collections import deque
+from logging import getLogger
+from threading import Condition, Lock
+from time import time
+
+from frontera.contrib.backends.partitioners import FingerprintPartitioner, Crc32NamePartitioner
+from frontera.core.messagebus import BaseMessageBus, BaseSpiderLogStream, BaseSpiderFeedStream, \
+    BaseStreamConsumer, BaseScoringLogStream, BaseStreamProducer, BaseStatsLogStream
+
+logger = getLogger("messagebus.memory")
+
+
+class Partition(object):
+    """
+    Log of messages. Every consumer group has own offset in the log, and messages are dropped when all groups have
+    consumed them. Expected groups are registered up front, so messages are kept for groups whose consumers aren't
+    created yet. Other groups start reading from the oldest message kept. If the log grows over ``max_messages``, the
+    oldest messages are dropped, even if some groups haven't consumed them.
+    """
+    def __init__(self, groups=(), max_messages=None):
+        self.messages = deque()
+        self.base_offset = 0
+        self.groups = dict((group, 0) for group in groups)
+        self.max_messages = max_messages
+
+    @property
+    def end_offset(self):
+        return self.base_offset + len(self.messages)
+
+    def register(self, group):
+        if group not in self.groups:
+            self.groups[group] = self.base_offset
+
+    def append(self, messages):
+        self.messages.extend(messages)
+        if self.max_messages is None or len(self.messages) <= self.max_messages:
+            return
+        dropped = len(self.messages) - self.max_messages
+        for _ in range(dropped):
+            self.messages.popleft()
+        self.base_offset += dropped
+        for group, offset in self.groups.items():
+            if offset < self.base_offset:
+                logger.warning("Partition is full, %d messages dropped for group %s", self.base_offset - offset, group)
+                self.groups[group] = self.base_offset
+
+    def read(self, group, count):
+        offset = self.groups[group]
+        start = offset - self.base_offset
+        messages = [self.messages[i] for i in range(start, min(start + count, len(self.messages)))]
+        self.groups[group] = offset + len(messages)
+        self._trim()
+        return messages
+
+    def _trim(self):
+        consumed = min(self.groups.values()) - self.base_offset
+        for _ in range(consumed):
+            self.messages.popleft()
+        self.base_offset += consumed
+
+
+class Topic(object):
+    """
+    Partitions of a stream, with a condition notified when messages are sent.
+    """
+    def __init__(self, partitions, groups=(), max_messages=None):
+        self.partitions = [Partition(groups, max_messages) for _ in range(partitions)]
+        self.condition = Condition(Lock())
+        self.ready_partitions = set(range(partitions))
+
+
+class Consumer(BaseStreamConsumer):
+    def __init__(self, topic, group, partition_id):
+        self.topic = topic
+        self.group = group
+        self.partition_ids = list(range(len(topic.partitions))) if partition_id is None else [partition_id]
+        with topic.condition:
+            for pid in self.partition_ids:
+                topic.partitions[pid].register(group)
+
+    def _read(self, count):
+        messages = []
+        for pid in self.partition_ids:
+            messages.extend(self.topic.partitions[pid].read(self.group, count - len(messages)))
+            if len(messages) == count:
+                break
+        # next read starts from other partition, so partitions are read evenly
+        self.partition_ids.append(self.partition_ids.pop(0))
+        return messages
+
+    def get_messages(self, timeout=0.1, count=1):
+        deadline = time() + timeout
+        with self.topic.condition:
+            messages = self._read(count)
+            while not messages:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+                self.topic.condition.wait(remaining)
+                messages = self._read(count)
+        return messages
+
+    def get_offset(self, partition_id):
+        if partition_id not in self.partition_ids:
+            raise KeyError("Can't find partition %d" % partition_id)
+        with self.topic.condition:
+            return self.topic.partitions[partition_id].groups[self.group]
+
+
+class Producer(BaseStreamProducer):
+    def __init__(self, topic, partitioner=None):
+        self.topic = topic
+        self.partitioner = partitioner
+
+    def send(self, key, *messages):
+        partition_id = self.partitioner.partition(key) if self.partitioner is not None else 0
+        partition = self.topic.partitions[partition_id]
+        with self.topic.condition:
+            partition.append(messages)
+            self.topic.condition.notify_all()
+
+    def flush(self):
+        pass
+
+    def get_offset(self, partition_id):
+        with self.topic.condition:
+            return self.topic.partitions[partition_id].end_offset
+
+
+class SpiderLogStream(BaseSpiderLogStream):
+    def __init__(self, messagebus):
+        self.topic = messagebus.get_topic(messagebus.topic_done, messagebus.spider_log_partitions, (b'db', b'sw'))
+
+    def producer(self):
+        return Producer(self.topic, FingerprintPartitioner(list(range(len(self.topic.partitions)))))
+
+    def consumer(self, partition_id, type):
+        return Consumer(self.topic, type, partition_id)
+
+
+class ScoringLogStream(BaseScoringLogStream):
+    def __init__(self, messagebus):
+        self.topic = messagebus.get_topic(messagebus.topic_scoring, 1, (b'db',))
+
+    def producer(self):
+        return Producer(self.topic)
+
+    def consumer(self):
+        return Consumer(self.topic, b'db', None)
+
+
+class SpiderFeedStream(BaseSpiderFeedStream):
+    def __init__(self, messagebus):
+        self.topic = messagebus.get_topic(messagebus.topic_todo, messagebus.spider_feed_partitions, (b'spider',))
+        self.hostname_partitioning = messagebus.hostname_partitioning
+
+    def producer(self):
+        partitions = list(range(len(self.topic.partitions)))
+        partitioner = Crc32NamePartitioner(partitions) if self.hostname_partitioning else \
+            FingerprintPartitioner(partitions)
+        return Producer(self.topic, partitioner)
+
+    def consumer(self, partition_id):
+        return Consumer(self.topic, b'spider', partition_id)
+
+    def available_partitions(self):
+        with self.topic.condition:
+            return list(self.topic.ready_partitions)
+
+    def mark_ready(self, partition_id):
+        with self.topic.condition:
+            self.topic.ready_partitions.add(partition_id)
+
+    def mark_busy(self, partition_id):
+        with self.topic.condition:
+            self.topic.ready_partitions.discard(partition_id)
+
+
+class StatsLogStream(BaseStatsLogStream):
+    def __init__(self, messagebus):
+        self.topic = messagebus.get_topic(messagebus.topic_stats, 1)
+
+    def producer(self):
+        return Producer(self.topic)
+
+    def consumer(self):
+        return Consumer(self.topic, b'stats', None)
+
+
+class MessageBus(BaseMessageBus):
+    """
+    Streams are identified by topic names from :setting:`SPIDER_LOG_TOPIC`, :setting:`SPIDER_FEED_TOPIC`,
+    :setting:`SCORING_LOG_TOPIC` and :setting:`STATS_LOG_TOPIC` settings, so several crawlers can run in one process
+    using different topics. Every stream declares consumer groups it's read by, so components can be started in any
+    order. Stats log isn't read by any of components, so its messages are kept only up to
+    :setting:`MEMORY_BUS_MAX_MESSAGES`, the limit of every partition.
+    """
+    topics = {}
+    lock = Lock()
+
+    def __init__(self, settings):
+        self.topic_todo = settings.get('SPIDER_FEED_TOPIC')
+        self.topic_done = settings.get('SPIDER_LOG_TOPIC')
+        self.topic_scoring = settings.get('SCORING_LOG_TOPIC')
+        self.topic_stats = settings.get('STATS_LOG_TOPIC')
+        self.spider_log_partitions = settings.get('SPIDER_LOG_PARTITIONS')
+        self.spider_feed_partitions = settings.get('SPIDER_FEED_PARTITIONS')
+        self.hostname_partitioning = settings.get('QUEUE_HOSTNAME_PARTITIONING')
+        self.max_messages = settings.get('MEMORY_BUS_MAX_MESSAGES')
+
+    def get_topic(self, name, partitions, groups=()):
+        with self.lock:
+            topic = self.topics.get(name)
+            if topic is None:
+                topic = self.topics[name] = Topic(partitions, groups, self.max_messages)
+            elif len(topic.partitions) != partitions:
+                raise ValueError("Topic %s has %d partitions, %d requested" % (name, len(topic.partitions), partitions))
+            return topic
+
+    def spider_log(self):
+        return SpiderLogStream(self)
+
+    def scoring_log(self):
+        return ScoringLogStream(self)
+
+    def spider_feed(self):
+        return SpiderFeedStream(self)
+
+    def stats_log(self):
+        return StatsLogStream(self)
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
-from time import time, sleep
+from time import time
 from struct import pack, unpack
 from logging import getLogger
 
@@ -10,6 +10,7 @@ import six
 from frontera.core.messagebus import BaseMessageBus, BaseSpiderLogStream, BaseStreamConsumer, \
     BaseSpiderFeedStream, BaseScoringLogStream, BaseStatsLogStream, BaseStreamProducer
 from frontera.contrib.backends.partitioners import FingerprintPartitioner, Crc32NamePartitioner
+from frontera.contrib.messagebus.zeromq.compression import FrameCompression
 from frontera.contrib.messagebus.zeromq.socket_config import SocketConfig
 from six.moves import range
 
@@ -22,6 +23,8 @@ class Consumer(BaseStreamConsumer):
 
         filter = identity + pack('>B', partition_id) if partition_id is not None else identity
         self.subscriber.setsockopt(zmq.SUBSCRIBE, filter)
+        self.poller = zmq.Poller()
+        self.poller.register(self.subscriber, zmq.POLLIN)
         self.counter = 0
         self.count_global = partition_id is None
         self.logger = getLogger("distributed_frontera.messagebus.zeromq.Consumer(%s-%s)" % (identity, partition_id))
@@ -30,17 +33,18 @@ class Consumer(BaseStreamConsumer):
         self.stats = context.stats
         self.stat_key = "consumer-%s" % identity
         self.stats[self.stat_key] = 0
+        self.compression = context.compression
 
     def get_messages(self, timeout=0.1, count=1):
-        started = time()
-        sleep_time = timeout / 10.0
+        deadline = time() + timeout
         while count:
             try:
                 msg = self.subscriber.recv_multipart(copy=True, flags=zmq.NOBLOCK)
             except zmq.Again:
-                if time() - started > timeout:
+                # all available messages are drained, waiting for next ones
+                remaining = deadline - time()
+                if remaining <= 0 or not self.poller.poll(remaining * 1000):
                     break
-                sleep(sleep_time)
             else:
                 partition_seqno, global_seqno = unpack(">II", msg[2])
                 seqno = global_seqno if self.count_global else partition_seqno
@@ -51,8 +55,16 @@ class Consumer(BaseStreamConsumer):
                         self.logger.warning("Sequence counter mismatch: expected %d, got %d. Check if system "
                                             "isn't missing messages." % (self.counter, seqno))
                     self.counter = None
-                yield msg[1]
-                count -= 1
+                payload = msg[1]
+                if len(msg) > 3:
+                    try:
+                        payload = self.compression.decompress(payload, msg[3], self.stats, self.stat_key)
+                    except Exception:
+                        self.logger.exception("Decompression error")
+                        payload = None
+                if payload is not None:
+                    yield payload
+                    count -= 1
                 if self.counter:
                     self.counter += 1
                 self.stats[self.stat_key] += 1
@@ -71,6 +83,7 @@ class Producer(BaseStreamProducer):
         self.stats = context.stats
         self.stat_key = "producer-%s" % identity
         self.stats[self.stat_key] = 0
+        self.compression = context.compression
 
     def send(self, key, *messages):
         # Guarantee that msg is actually a list or tuple (should always be true)
@@ -83,8 +96,9 @@ class Producer(BaseStreamProducer):
         partition = self.partitioner.partition(key)
         counter = self.counters.get(partition, 0)
         for msg in messages:
+            msg, extra = self.compression.compress(msg, self.stats, self.stat_key)
             self.sender.send_multipart([self.identity + pack(">B", partition), msg,
-                                        pack(">II", counter, self.global_counter)])
+                                        pack(">II", counter, self.global_counter)] + extra)
             counter += 1
             self.global_counter += 1
             if counter == 4294967296:
@@ -137,7 +151,8 @@ class NonPartitionedProducer(Producer):
             raise TypeError("all produce message payloads must be type bytes")
         counter = self.counters.get(0, 0)
         for msg in messages:
-            self.sender.send_multipart([self.identity, msg, pack(">II", counter, counter)])
+            msg, extra = self.compression.compress(msg, self.stats, self.stat_key)
+            self.sender.send_multipart([self.identity, msg, pack(">II", counter, counter)] + extra)
             counter += 1
             if counter == 4294967296:
                 counter = 0
@@ -221,11 +236,13 @@ class Context(object):
 
     zeromq = zmq.Context()
     stats = {}
+    compression = FrameCompression()
 
 
 class MessageBus(BaseMessageBus):
     def __init__(self, settings):
         self.context = Context()
+        self.context.compression = FrameCompression.from_settings(settings)
         self.socket_config = SocketConfig(settings.get('ZMQ_ADDRESS'),
                                           settings.get('ZMQ_BASE_PORT'))
         self.spider_log_partitions = [i for i in range(settings.get('SPIDER_LOG_PARTITIONS'))]
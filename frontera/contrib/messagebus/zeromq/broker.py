@@ -1,17 +1,19 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import absolute_import
-from time import time
+from time import time, sleep
 from datetime import timedelta
 import logging
 from argparse import ArgumentParser
 from struct import unpack
+from threading import Thread
 
 import zmq
 from zmq.eventloop.ioloop import IOLoop
 from zmq.eventloop.zmqstream import ZMQStream
 
 from frontera.settings import Settings
+from .metrics import BrokerMetrics, MetricsExporter, get_sequenced_channels
 from .socket_config import SocketConfig
 
 
@@ -27,7 +29,7 @@ class Server(object):
     db_in = None
     db_out = None
 
-    def __init__(self, address, base_port):
+    def __init__(self, address, base_port, settings=None):
         self.ctx = zmq.Context()
         self.loop = IOLoop.instance()
         self.stats = {
@@ -39,6 +41,7 @@ class Server(object):
             'sw_in_recvd': 0,
             'sw_out_recvd': 0
         }
+        self.metrics = BrokerMetrics(get_sequenced_channels(settings))
 
         socket_config = SocketConfig(address, base_port)
 
@@ -52,6 +55,11 @@ class Server(object):
         db_in_s = self.ctx.socket(zmq.XPUB)
         db_out_s = self.ctx.socket(zmq.XSUB)
 
+        if hasattr(zmq, 'XPUB_VERBOSER'):
+            # every subscription and unsubscription is passed, to count subscribers
+            for socket in (spiders_in_s, sw_in_s, db_in_s):
+                socket.setsockopt(zmq.XPUB_VERBOSER, 1)
+
         spiders_in_s.bind(socket_config.spiders_in())
         spiders_out_s.bind(socket_config.spiders_out())
         sw_in_s.bind(socket_config.sw_in())
@@ -79,6 +87,7 @@ class Server(object):
                                         ".zeromq.broker.Server")
         self.logger.info("Using socket: {}:{}".format(socket_config.ip_addr,
                                                       socket_config.base_port))
+        self.exporter = MetricsExporter(self.metrics, settings) if settings is not None else None
 
     def start(self):
         self.logger.info("Distributed Frontera ZeroMQ broker is started.")
@@ -87,44 +96,55 @@ class Server(object):
             self.loop.start()
         except KeyboardInterrupt:
             pass
+        finally:
+            if self.exporter is not None:
+                self.exporter.close()
 
     def log_stats(self):
         self.logger.info(self.stats)
+        if self.exporter is not None:
+            self.logger.debug(self.exporter.export())
         self.loop.add_timeout(timedelta(seconds=10), self.log_stats)
 
     def handle_spiders_out_recv(self, msg):
         self.sw_in.send_multipart(msg)
         self.db_in.send_multipart(msg)
         self.stats['spiders_out_recvd'] += 1
+        self.metrics.message(msg)
 
     def handle_sw_out_recv(self, msg):
         self.db_in.send_multipart(msg)
         self.stats['sw_out_recvd'] += 1
+        self.metrics.message(msg)
 
     def handle_db_out_recv(self, msg):
         self.spiders_in.send_multipart(msg)
         self.stats['db_out_recvd'] += 1
+        self.metrics.message(msg)
 
     def handle_db_in_recv(self, msg):
         self.stats['db_in_recvd'] += 1
         if b'\x01' in msg[0] or b'\x00' in msg[0]:
             action, identity, partition_id = self.decode_subscription(msg[0])
             if identity == b'sl':
-                self.spiders_out.send_multipart(msg)
-                return
-            if identity == b'us':
-                self.sw_out.send_multipart(msg)
-                return
-            raise AttributeError('Unknown identity in channel subscription.')
+                producers = self.spiders_out
+            elif identity == b'us':
+                producers = self.sw_out
+            else:
+                raise AttributeError('Unknown identity in channel subscription.')
+            if self.metrics.subscription('db_in', msg):
+                producers.send_multipart(msg)
 
     def handle_sw_in_recv(self, msg):
         if b'\x01' in msg[0] or b'\x00' in msg[0]:
-            self.spiders_out.send_multipart(msg)
+            if self.metrics.subscription('sw_in', msg):
+                self.spiders_out.send_multipart(msg)
         self.stats['sw_in_recvd'] += 1
 
     def handle_spiders_in_recv(self, msg):
         if b'\x01' in msg[0] or b'\x00' in msg[0]:
-            self.db_out.send_multipart(msg)
+            if self.metrics.subscription('spiders_in', msg):
+                self.db_out.send_multipart(msg)
         self.stats['spiders_in_recvd'] += 1
 
     def decode_subscription(self, msg):
@@ -145,6 +165,123 @@ class Server(object):
         raise ValueError("Can't decode subscription correctly.")
 
 
+class ThreadedServer(object):
+    """
+    Broker running every channel as native ZeroMQ steerable proxy in own thread, so messages are relayed without
+    passing through Python code, and channels don't compete for one thread.
+
+    Spider log proxy publishes to strategy workers socket and inproc endpoint, scoring log proxy subscribes to both
+    strategy workers and this endpoint, so DB workers socket gets both spider log and scoring log. Subscriptions are
+    forwarded upstream by proxies, through the inproc endpoint too.
+
+    Proxies count message frames of every channel only, so metrics of this broker don't have partitions, subscribers
+    and dropped messages.
+    """
+
+    SPIDER_LOG_INPROC = 'inproc://spider-log'
+
+    # proxy name, stats keys of frontend (publishers) and backend (subscribers) sockets
+    channels = [
+        ('spider_log', 'spiders_out_recvd', 'sw_in_recvd'),
+        ('scoring_log', 'sw_out_recvd', 'db_in_recvd'),
+        ('spider_feed', 'db_out_recvd', 'spiders_in_recvd'),
+    ]
+
+    def __init__(self, address, base_port, settings=None):
+        self.ctx = zmq.Context()
+        self.stats = {'started': time()}
+        self.metrics = BrokerMetrics(get_sequenced_channels(settings))
+
+        socket_config = SocketConfig(address, base_port)
+
+        if socket_config.is_ipv6:
+            self.ctx.setsockopt(zmq.IPV6, True)
+
+        spider_log_in = self._bind(zmq.XSUB, socket_config.spiders_out())
+        spider_log_out = self._bind(zmq.XPUB, socket_config.sw_in(), self.SPIDER_LOG_INPROC)
+        scoring_log_in = self._bind(zmq.XSUB, socket_config.sw_out())
+        scoring_log_in.connect(self.SPIDER_LOG_INPROC)
+        scoring_log_out = self._bind(zmq.XPUB, socket_config.db_in())
+        spider_feed_in = self._bind(zmq.XSUB, socket_config.db_out())
+        spider_feed_out = self._bind(zmq.XPUB, socket_config.spiders_in())
+
+        self.controls = []
+        self.threads = []
+        for (name, _, _), frontend, backend in zip(self.channels,
+                                                   [spider_log_in, scoring_log_in, spider_feed_in],
+                                                   [spider_log_out, scoring_log_out, spider_feed_out]):
+            endpoint = 'inproc://control-%s' % name
+            self.controls.append(self._bind(zmq.PAIR, endpoint))
+            self.threads.append(Thread(target=self._run_proxy, args=(frontend, backend, endpoint), name=name))
+
+        logging.basicConfig(format="%(asctime)s %(message)s",
+                            datefmt="%Y-%m-%d %H:%M:%S", level=logging.INFO)
+        self.logger = logging.getLogger("distributed_frontera.messagebus"
+                                        ".zeromq.broker.ThreadedServer")
+        self.logger.info("Using socket: {}:{}".format(socket_config.ip_addr,
+                                                      socket_config.base_port))
+        self.exporter = MetricsExporter(self.metrics, settings) if settings is not None else None
+
+    def _bind(self, socket_type, *endpoints):
+        socket = self.ctx.socket(socket_type)
+        for endpoint in endpoints:
+            socket.bind(endpoint)
+        return socket
+
+    def _run_proxy(self, frontend, backend, control_endpoint):
+        control = self.ctx.socket(zmq.PAIR)
+        control.connect(control_endpoint)
+        zmq.proxy_steerable(frontend, backend, None, control)
+        for socket in (frontend, backend, control):
+            socket.close(linger=0)
+
+    def start_proxies(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        for control, thread in zip(self.controls, self.threads):
+            control.send(b'TERMINATE')
+            thread.join()
+            control.close()
+        self.ctx.term()
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def start(self):
+        self.start_proxies()
+        self.logger.info("Distributed Frontera ZeroMQ broker is started in threaded mode.")
+        try:
+            while True:
+                self.log_stats()
+                sleep(10)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def get_stats(self):
+        """
+        Updates stats and channel metrics with counters of messages received by proxies.
+
+        :return: stats dict, with the same keys as of :class:`Server`, but counting message frames, rather than
+            multipart messages.
+        """
+        for (channel, frontend_key, backend_key), control in zip(self.channels, self.controls):
+            control.send(b'STATISTICS')
+            # messages and bytes, received and sent by frontend, then by backend
+            counters = [unpack('=Q', frame)[0] for frame in control.recv_multipart()]
+            self.stats[frontend_key] = counters[0]
+            self.stats[backend_key] = counters[4]
+            self.metrics.set_channel(channel, counters[0], counters[1])
+        return self.stats
+
+    def log_stats(self):
+        self.logger.info(self.get_stats())
+        if self.exporter is not None:
+            self.logger.debug(self.exporter.export())
+
+
 def main():
     """
     Parse arguments, set configuration values, then start the broker
@@ -165,12 +302,23 @@ def main():
         '--port', type=int,
         help='Base port number, server will bind to 6 ports starting from base'
         '. Default is 5550')
+    parser.add_argument(
+        '--threaded', action='store_true',
+        help='Run every channel as native ZeroMQ proxy in own thread, instead'
+        ' of relaying all messages in a single event loop.')
+    parser.add_argument(
+        '--metrics-port', type=int,
+        help='Port of HTTP endpoint serving broker metrics as JSON. Default'
+        ' is ZMQ_BROKER_METRICS_PORT setting, endpoint is disabled if not'
+        ' set.')
     args = parser.parse_args()
 
     settings = Settings(module=args.config)
     address = args.address if args.address else settings.get("ZMQ_ADDRESS")
     port = args.port if args.port else settings.get("ZMQ_BASE_PORT")
-    server = Server(address, port)
+    if args.metrics_port:
+        settings.set("ZMQ_BROKER_METRICS_PORT", args.metrics_port)
+    server = (ThreadedServer if args.threaded else Server)(address, port, settings)
     server.logger.setLevel(args.log_level)
     server.start()
 
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Compression of ZeroMQ message bus frames. Compressed message is sent with additional frame, holding id of compression
+codec and CRC32 of dictionary (0 if dictionary isn't used), so consumers decode compressed and plain messages, and
+messages compressed with dictionary other than their own are refused instead of being decoded into garbage.
+
+zlib is available everywhere, lz4 and zstd require `lz4`_ and `zstandard`_ packages. Dictionary is supported by zlib
+(Python 3 only) and zstd codecs, it can be trained on a sample of messages with ``zstd --train`` or the built-in
+dictionary of URL and message fragments can be used.
+
+.. _lz4: https://pypi.org/project/lz4/
+.. _zstandard: https://pypi.org/project/zstandard/
+"""
+from __future__ import absolute_import
+
+import zlib
+from struct import pack, unpack
+
+try:
+    from time import process_time
+except ImportError:
+    from time import clock as process_time
+
+from frontera.utils.misc import get_crc32
+
+
+BUILTIN_DICTIONARY = b''.join([
+    b'Mozilla/5.0 (compatible)', b'User-Agent', b'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    b'Accept', b'Content-Type', b'text/html; charset=utf-8', b'en-US,en', b'Accept-Language', b'Referer',
+    b'download_timeout', b'download_slot', b'redirect_urls', b'redirect_times', b'link_text', b'depth',
+    b'origin_is_frontier', b'scrapy_meta', b'subdomain', b'netloc', b'scheme', b'sld', b'tld', b'name',
+    b'domain', b'score', b'state', b'jid', b'fingerprint', b'GET', b'index.html', b'.php?id=', b'.htm',
+    b'.html', b'.org/', b'.net/', b'.com/', b'https://www.', b'http://www.',
+])
+
+
+class ZlibCodec(object):
+    ID = 1
+
+    def __init__(self, level=None, dictionary=None):
+        self.level = zlib.Z_DEFAULT_COMPRESSION if level is None else level
+        self.dictionary = dictionary
+
+    def compress(self, data):
+        if self.dictionary is None:
+            return zlib.compress(data, self.level)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL,
+                                      zlib.Z_DEFAULT_STRATEGY, self.dictionary)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data):
+        if self.dictionary is None:
+            return zlib.decompress(data)
+        decompressor = zlib.decompressobj(zdict=self.dictionary)
+        return decompressor.decompress(data) + decompressor.flush()
+
+
+class LZ4Codec(object):
+    ID = 2
+
+    def __init__(self, level=None, dictionary=None):
+        import lz4.block
+        self.block = lz4.block
+        self.kwargs = {'mode': 'high_compression', 'compression': level} if level is not None else {}
+        if dictionary is not None:
+            raise ValueError("Dictionary isn't supported by lz4 codec")
+
+    def compress(self, data):
+        return self.block.compress(data, **self.kwargs)
+
+    def decompress(self, data):
+        return self.block.decompress(data)
+
+
+class ZstdCodec(object):
+    ID = 3
+
+    def __init__(self, level=None, dictionary=None):
+        import zstandard
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary is not None else None
+        self.compressor = zstandard.ZstdCompressor(level=3 if level is None else level, dict_data=dict_data)
+        self.decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def decompress(self, data):
+        return self.decompressor.decompress(data)
+
+
+CODECS = {
+    'zlib': ZlibCodec,
+    'lz4': LZ4Codec,
+    'zstd': ZstdCodec,
+}
+
+
+class FrameCompression(object):
+    """
+    Compresses frames with chosen codec and decompresses frames compressed with any codec.
+
+    :param str codec: name of codec used for compression: zlib, lz4 or zstd, or None to send frames uncompressed.
+    :param int level: compression level, codec default if None.
+    :param bytes dictionary: compression dictionary or None.
+    :param int min_size: frames smaller than this are sent uncompressed.
+    """
+    def __init__(self, codec=None, level=None, dictionary=None, min_size=0):
+        if codec is not None and codec not in CODECS:
+            raise ValueError("Unknown compression codec %s, expected one of: %s" % (codec, ', '.join(sorted(CODECS))))
+        self.level = level
+        self.dictionary = dictionary
+        self.min_size = min_size
+        self.dictionary_id = get_crc32(dictionary) if dictionary is not None else 0
+        self.codecs = {}
+        self.codec = None
+        if codec is not None:
+            self.codec = CODECS[codec](level, dictionary)
+            self.codecs[self.codec.ID] = self.codec
+            self.header = pack('>Bi', self.codec.ID, self.dictionary_id)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Frames are compressed if compression is enabled with :setting:`ZMQ_COMPRESSION` setting.
+        """
+        dictionary = settings.get('ZMQ_COMPRESSION_DICTIONARY')
+        if dictionary == 'builtin':
+            dictionary = BUILTIN_DICTIONARY
+        elif dictionary:
+            with open(dictionary, 'rb') as f:
+                dictionary = f.read()
+        return cls(settings.get('ZMQ_COMPRESSION') or None, settings.get('ZMQ_COMPRESSION_LEVEL'), dictionary or None,
+                   settings.get('ZMQ_COMPRESSION_MIN_SIZE'))
+
+    def compress(self, frame, stats, stat_key):
+        """
+        Compresses the frame, and updates compression ratio and CPU time in stats.
+
+        :return: tuple of frame to be sent and list of frames to be sent after it, empty if frame is sent
+            uncompressed.
+        """
+        if self.codec is None or len(frame) < self.min_size:
+            return frame, []
+        started = process_time()
+        compressed = self.codec.compress(frame)
+        raw_bytes = stats.get(stat_key + '-raw-bytes', 0) + len(frame)
+        compressed_bytes = stats.get(stat_key + '-compressed-bytes', 0) + len(compressed)
+        stats[stat_key + '-compression-time'] = stats.get(stat_key + '-compression-time', 0) + process_time() - started
+        stats[stat_key + '-raw-bytes'] = raw_bytes
+        stats[stat_key + '-compressed-bytes'] = compressed_bytes
+        stats[stat_key + '-compression-ratio'] = float(raw_bytes) / compressed_bytes
+        return compressed, [self.header]
+
+    def decompress(self, frame, header, stats, stat_key):
+        codec_id, dictionary_id = unpack('>Bi', header)
+        if dictionary_id != self.dictionary_id:
+            raise ValueError("Frame is compressed with other dictionary, check ZMQ_COMPRESSION_DICTIONARY setting")
+        codec = self.codecs.get(codec_id)
+        if codec is None:
+            codec_classes = [cls for cls in CODECS.values() if cls.ID == codec_id]
+            if not codec_classes:
+                raise ValueError("Unknown compression codec id %d" % codec_id)
+            codec = self.codecs[codec_id] = codec_classes[0](self.level, self.dictionary)
+        started = process_time()
+        frame = codec.decompress(frame)
+        stats[stat_key + '-decompression-time'] = (stats.get(stat_key + '-decompression-time', 0) +
+                                                   process_time() - started)
+        return frame
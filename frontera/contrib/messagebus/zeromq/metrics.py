@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput and backlog metrics of ZeroMQ broker: message and byte rates per channel and partition, subscriber counts
+and messages dropped before reaching the broker, detected with sequence numbers of messages.
+"""
+from __future__ import absolute_import
+
+import json
+from logging import getLogger
+from struct import unpack
+from threading import Thread
+from time import time
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from frontera.utils.misc import load_object, utc_timestamp
+
+
+CHANNELS = {
+    b'sl': 'spider_log',
+    b'us': 'scoring_log',
+    b'sf': 'spider_feed',
+}
+
+# every spider feed partition is written by a single DB worker, so a gap in sequence numbers means messages dropped on
+# high water mark, while in other channels sequence numbers of several producers are interleaved
+SEQUENCED_CHANNELS = frozenset(['spider_feed'])
+
+COUNTERS = ['messages', 'bytes', 'dropped', 'subscribers']
+
+
+def get_sequenced_channels(settings):
+    """
+    :return: channels where gaps in sequence numbers are counted as dropped messages. Express lane of DB worker writes to
+        spider feed partitions with its own producer, interleaving sequence numbers, so drops can't be detected then.
+    """
+    if settings is not None and settings.get('EXPRESS_LANE_ENABLED'):
+        return frozenset()
+    return SEQUENCED_CHANNELS
+
+
+def parse_topic(topic):
+    """
+    :return: tuple of channel name and partition id, None if topic isn't partitioned.
+    """
+    identity = topic[:2]
+    channel = CHANNELS.get(identity, identity.decode('latin-1'))
+    partition_id = unpack('>B', topic[2:3])[0] if len(topic) > 2 else None
+    return channel, partition_id
+
+
+class _Counters(object):
+    __slots__ = COUNTERS + ['seqno', 'last_messages', 'last_bytes']
+
+    def __init__(self):
+        self.messages = self.bytes = self.dropped = self.subscribers = 0
+        self.seqno = None
+        self.last_messages = self.last_bytes = 0
+
+    def snapshot(self, interval):
+        result = {name: getattr(self, name) for name in COUNTERS}
+        result['messages_per_second'] = (self.messages - self.last_messages) / interval if interval else 0.0
+        result['bytes_per_second'] = (self.bytes - self.last_bytes) / interval if interval else 0.0
+        self.last_messages, self.last_bytes = self.messages, self.bytes
+        return result
+
+
+class BrokerMetrics(object):
+    """
+    Counts messages relayed by broker. Rates are calculated over the time passed since previous snapshot.
+    """
+    def __init__(self, sequenced_channels=SEQUENCED_CHANNELS):
+        self.sequenced_channels = sequenced_channels
+        self.started = self.snapshot_time = time()
+        self.channels = {}
+        self.partitions = {}
+        self.subscriptions = {}
+        self.last_snapshot = self.snapshot()
+
+    def _get_counters(self, channel, partition_id):
+        counters = self.channels.get(channel)
+        if counters is None:
+            counters = self.channels[channel] = _Counters()
+        if partition_id is None:
+            return counters, None
+        key = (channel, partition_id)
+        partition_counters = self.partitions.get(key)
+        if partition_counters is None:
+            partition_counters = self.partitions[key] = _Counters()
+        return counters, partition_counters
+
+    def message(self, msg):
+        """
+        Counts multipart message received from producer.
+        """
+        channel, partition_id = parse_topic(msg[0])
+        counters, partition_counters = self._get_counters(channel, partition_id)
+        size = sum(len(frame) for frame in msg)
+        counters.messages += 1
+        counters.bytes += size
+        if partition_counters is None:
+            return
+        partition_counters.messages += 1
+        partition_counters.bytes += size
+        if channel in self.sequenced_channels:
+            seqno = unpack('>I', msg[2][:4])[0]
+            expected = partition_counters.seqno
+            # lower sequence number means producer is restarted
+            if expected is not None and seqno > expected:
+                counters.dropped += seqno - expected
+                partition_counters.dropped += seqno - expected
+            partition_counters.seqno = (seqno + 1) % 4294967296
+
+    def set_channel(self, channel, messages, bytes):
+        """
+        Sets counters of channel, for brokers counting messages outside of Python code.
+        """
+        counters = self._get_counters(channel, None)[0]
+        counters.messages = messages
+        counters.bytes = bytes
+
+    def subscription(self, socket, msg):
+        """
+        Counts subscription or unsubscription message received from subscriber socket.
+
+        :param str socket: name of socket, the message is received from.
+        :return: True if message has to be forwarded to producers, i.e. it's the first subscription to the topic or
+            the last unsubscription from it, False otherwise.
+        """
+        action, topic = msg[0][:1], msg[0][1:]
+        key = (socket, topic)
+        count = self.subscriptions.get(key, 0)
+        if action == b'\x01':
+            delta = 1
+        elif count:
+            delta = -1
+        else:
+            return False
+        self.subscriptions[key] = count + delta
+        for counters in self._get_counters(*parse_topic(topic)):
+            if counters is not None:
+                counters.subscribers += delta
+        return count + delta == (1 if delta > 0 else 0)
+
+    def snapshot(self):
+        """
+        :return: dict of metrics, with channels and partitions of channels.
+        """
+        now = time()
+        interval = now - self.snapshot_time
+        self.snapshot_time = now
+        channels = {}
+        for channel, counters in self.channels.items():
+            channels[channel] = counters.snapshot(interval)
+            channels[channel]['partitions'] = {}
+        for (channel, partition_id), counters in self.partitions.items():
+            channels[channel]['partitions'][str(partition_id)] = counters.snapshot(interval)
+        self.last_snapshot = {
+            'timestamp': now,
+            'uptime': now - self.started,
+            'interval': interval,
+            'channels': channels,
+        }
+        return self.last_snapshot
+
+
+def flatten(snapshot):
+    """
+    Converts metrics snapshot to flat dict of stats log message.
+    """
+    stats = {}
+    for channel, metrics in snapshot['channels'].items():
+        for name, value in metrics.items():
+            if name != 'partitions':
+                stats['%s_%s' % (channel, name)] = value
+        for partition_id, partition_metrics in metrics['partitions'].items():
+            for name, value in partition_metrics.items():
+                stats['%s_%s_%s' % (channel, partition_id, name)] = value
+    stats['uptime'] = snapshot['uptime']
+    return stats
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+        body = json.dumps(self.server.metrics.last_snapshot, sort_keys=True).encode('utf-8') + b'\n'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter(object):
+    """
+    Takes metrics snapshots and sends them to stats log, serves the latest one as JSON over HTTP on
+    :setting:`ZMQ_BROKER_METRICS_PORT`, if set.
+    """
+    def __init__(self, metrics, settings):
+        self.metrics = metrics
+        self.logger = getLogger("distributed_frontera.messagebus.zeromq.metrics")
+        stats_log = load_object(settings.get('MESSAGE_BUS'))(settings).stats_log()
+        self.stats_producer = stats_log.producer() if stats_log else None
+        self.encoder = load_object(settings.get('MESSAGE_BUS_CODEC') + '.Encoder')(request_model=None)
+        self.http_server = None
+        port = settings.get('ZMQ_BROKER_METRICS_PORT')
+        if port:
+            self.http_server = HTTPServer((settings.get('ZMQ_BROKER_METRICS_HOST'), port), MetricsRequestHandler)
+            self.http_server.metrics = metrics
+            thread = Thread(target=self.http_server.serve_forever, name='metrics-http')
+            thread.daemon = True
+            thread.start()
+            self.logger.info("Serving broker metrics on http://%s:%d/metrics" % self.http_server.server_address[:2])
+
+    def export(self):
+        snapshot = self.metrics.snapshot()
+        if self.stats_producer is None:
+            return snapshot
+        stats = flatten(snapshot)
+        stats['_timestamp'] = utc_timestamp()
+        stats['_tags'] = {'source': 'broker'}
+        self.stats_producer.send('broker-{}'.format(stats['_timestamp']), self.encoder.encode_stats(stats))
+        return snapshot
+
+    def close(self):
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
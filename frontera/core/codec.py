@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 from abc import ABCMeta, abstractmethod
+from logging import getLogger
 import six
 
 
+# errors raised by decoders for messages of unknown type or structure
+DECODE_ERRORS = (KeyError, TypeError, ValueError, IndexError)
+
+logger = getLogger("codec")
+
+
 @six.add_metaclass(ABCMeta)
 class BaseDecoder(object):
 
@@ -27,6 +34,29 @@ class BaseDecoder(object):
         """
         pass
 
+    def decode_messages(self, buffer):
+        """
+        Decodes all messages packed in the buffer, which can be a single message or a batch made with
+        :meth:`BaseEncoder.encode_batch`.
+
+        :param bytes buffer: encoded message or batch
+        :return: generator of tuples of message type and related objects
+        """
+        yield self.decode(buffer)
+
+    def _decode_batch(self, items, decode):
+        """
+        Decodes messages of a batch one by one with ``decode`` function. Messages which can't be decoded are logged and
+        skipped, so the rest of the batch is still decoded.
+        """
+        for item in items:
+            try:
+                message = decode(item)
+            except DECODE_ERRORS:
+                logger.exception("Decoding error, skipping message of the batch")
+                continue
+            yield message
+
 
 @six.add_metaclass(ABCMeta)
 class BaseEncoder(object):
@@ -117,4 +147,22 @@ class BaseEncoder(object):
         :param stats: a dictionary with stats
         :return: bytes encoded message
         """
-        pass
\ No newline at end of file
+        pass
+
+    def encode_requests_evicted(self, fingerprints):
+        """
+        Encodes fingerprints of requests evicted from the queue by DB worker, sent to strategy worker in spider log.
+
+        :param list fingerprints: fingerprints of requests
+        :return: bytes encoded message
+        """
+        raise NotImplementedError
+
+    def encode_batch(self, messages):
+        """
+        Packs many encoded messages in a single one, which is sent as one message bus message.
+
+        :param list messages: encoded messages
+        :return: bytes encoded batch
+        """
+        raise NotImplementedError
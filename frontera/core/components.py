@@ -88,6 +88,27 @@ class Queue(StartStopMixin):
         """
         raise NotImplementedError
 
+    def partition_counts(self):
+        """
+        Returns count of documents in every partition of the queue. Implementing this method is optional, it's
+        expected to be cheap enough to be called on every status request.
+
+        :return: dict of partition id -> int
+        """
+        raise NotImplementedError
+
+    def evict(self, partition_id, capacity=None, ttl=None):
+        """
+        Removes the lowest score requests from the partition to keep at most ``capacity`` of them, and requests
+        scheduled more than ``ttl`` seconds ago. Implementing this method is optional.
+
+        :param int partition_id: partition id
+        :param int capacity: maximum number of requests to keep in the partition, None for no limit.
+        :param float ttl: maximum time in seconds the request can stay in the queue, None for no limit.
+        :return: list of fingerprints of evicted requests.
+        """
+        raise NotImplementedError
+
 
 @six.add_metaclass(ABCMeta)
 class States(StartStopMixin):
@@ -8,6 +8,7 @@ import six
 
 from frontera.core import models
 from frontera.core.components import Backend, DistributedBackend, Middleware, CanonicalSolver
+from frontera.core.messagebus import BatchProducer
 from frontera.exceptions import NotConfigured
 from frontera.settings import Settings
 from frontera.utils.misc import load_object
@@ -789,6 +790,11 @@ class MessageBusUpdateScoreStream(UpdateScoreStream):
         )
         self._producer.send(None, encoded)
 
+    def flush(self):
+        # only batched messages are sent, flushing the transport producer would wait for delivery
+        if isinstance(self._producer, BatchProducer):
+            self._producer.send_pending()
+
 
 class LocalUpdateScoreStream(UpdateScoreStream):
     def __init__(self, queue):
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 from abc import ABCMeta, abstractmethod
+from time import time
 import six
 
 
@@ -75,6 +76,81 @@ class BaseStreamProducer(object):
         pass
 
 
+class BatchProducer(BaseStreamProducer):
+    """
+    Wraps a producer and accumulates encoded messages per key, sending them as batches made with encoder
+    :meth:`encode_batch <frontera.core.codec.BaseEncoder.encode_batch>`. A batch is sent when it has ``max_messages``
+    messages or ``max_bytes`` bytes, and all pending batches are sent on :meth:`send`, if the oldest pending message
+    waits longer than ``max_delay`` seconds, and on :meth:`flush` and :meth:`close`.
+
+    :param producer: wrapped producer.
+    :param encoder: message bus codec encoder.
+    :param int max_messages: maximum number of messages in a batch.
+    :param int max_bytes: maximum size of a batch in bytes.
+    :param float max_delay: maximum time in seconds a message waits for a batch to be sent.
+    """
+    def __init__(self, producer, encoder, max_messages, max_bytes, max_delay):
+        self.producer = producer
+        self.encoder = encoder
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.pending = {}
+        self.oldest = None
+
+    @classmethod
+    def from_settings(cls, producer, encoder, settings):
+        """
+        Wraps the producer if batching is enabled with :setting:`MESSAGE_BUS_BATCH_SIZE` setting.
+
+        :return: BatchProducer or producer itself.
+        """
+        if settings.get('MESSAGE_BUS_BATCH_SIZE') <= 1:
+            return producer
+        return cls(producer, encoder,
+                   max_messages=settings.get('MESSAGE_BUS_BATCH_SIZE'),
+                   max_bytes=settings.get('MESSAGE_BUS_BATCH_BYTES'),
+                   max_delay=settings.get('MESSAGE_BUS_BATCH_DELAY'))
+
+    def send(self, key, *messages):
+        now = time()
+        for message in messages:
+            batch = self.pending.setdefault(key, [[], 0])
+            batch[0].append(message)
+            batch[1] += len(message)
+            if len(batch[0]) >= self.max_messages or batch[1] >= self.max_bytes:
+                self._send_batch(key)
+            elif self.oldest is None:
+                self.oldest = now
+        if self.oldest is not None and now - self.oldest >= self.max_delay:
+            self.send_pending()
+
+    def _send_batch(self, key):
+        batch = self.pending.pop(key)[0]
+        self.producer.send(key, batch[0] if len(batch) == 1 else self.encoder.encode_batch(batch))
+        if not self.pending:
+            self.oldest = None
+
+    def send_pending(self):
+        """
+        Sends all pending batches to the wrapped producer, without flushing it.
+        """
+        for key in list(self.pending):
+            self._send_batch(key)
+        self.oldest = None
+
+    def flush(self):
+        self.send_pending()
+        self.producer.flush()
+
+    def get_offset(self, partition_id):
+        return self.producer.get_offset(partition_id)
+
+    def close(self):
+        self.send_pending()
+        self.producer.close()
+
+
 @six.add_metaclass(ABCMeta)
 class BaseSpiderLogStream(object):
     """
@@ -174,7 +250,8 @@ class BaseSpiderFeedStream(object):
     @abstractmethod
     def available_partitions(self):
         """
-        Returns the iterable of available (ready for processing new batches) partitions.
+        Returns the iterable of available (ready for processing new batches) partitions. Partitions are filled with
+        new batches in the returned order, so stream can put the emptiest partitions first.
         :return: iterable of ints
         """
         raise NotImplementedError
@@ -232,4 +309,11 @@ class BaseMessageBus(object):
         Create or return stats log stream.
         :return: instance of StatsLogStream
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def close(self):
+        """
+        Releases resources shared by streams, e.g. background threads. Called when the process is stopping.
+        :return: nothing
+        """
+        pass
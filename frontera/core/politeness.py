@@ -0,0 +1,246 @@
+from __future__ import absolute_import
+
+import codecs
+from collections import defaultdict, deque, OrderedDict
+from logging import getLogger
+from math import ceil
+from time import time
+
+import six
+from cachetools import LRUCache
+
+from frontera.utils.url import parse_domain_from_url_fast
+
+try:
+    from publicsuffix import PublicSuffixList
+except ImportError:
+    PublicSuffixList = None
+
+
+def load_public_suffix_list(path='public_suffix_list.dat'):
+    """
+    Loads public suffix list from the same file :class:`Discovery <frontera.strategy.discovery.Discovery>` strategy
+    uses, so domain metadata is looked up under the same keys as it's stored.
+
+    :return: :class:`publicsuffix.PublicSuffixList` or None, if publicsuffix package or the file is missing.
+    """
+    if PublicSuffixList is None:
+        return None
+    try:
+        with codecs.open(path, encoding='utf8') as psl_file:
+            return PublicSuffixList(psl_file)
+    except IOError:
+        return None
+
+
+def parse_crawl_delay(body, user_agent='*'):
+    """
+    Extracts Crawl-delay directive from robots.txt content.
+
+    :param str body: robots.txt content.
+    :param str user_agent: user agent to look for, the group for ``*`` is used if there is no specific one.
+    :return: delay in seconds or None.
+    """
+    user_agent = user_agent.lower()
+    delays = {}
+    agents, in_rules = [], False
+    for line in body.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if ':' not in line:
+            continue
+        field, _, value = line.partition(':')
+        field, value = field.strip().lower(), value.strip()
+        if field == 'user-agent':
+            if in_rules:
+                agents, in_rules = [], False
+            agents.append(value.lower())
+            continue
+        in_rules = True
+        if field == 'crawl-delay':
+            try:
+                delay = float(value)
+            except ValueError:
+                continue
+            for agent in agents:
+                delays.setdefault(agent, delay)
+    return delays.get(user_agent, delays.get('*'))
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled with ``rate`` tokens per second up to ``capacity`` tokens, starts full.
+    """
+    __slots__ = ('rate', 'capacity', 'tokens', 'timestamp')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.timestamp = now
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def set_rate(self, rate, capacity, now):
+        """
+        Changes the rate and capacity, keeping tokens refilled so far.
+        """
+        self._refill(now)
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = min(self.tokens, capacity)
+
+    def consume(self, now):
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class PolitenessBuffer(object):
+    """
+    A buffer between the backend and spider feed, letting through only requests for domains which have spare fetch
+    budget. Every domain has a token bucket refilled at the rate of one request per crawl delay. Crawl delay is taken
+    from domain metadata: ``crawl_delay`` field or ``Crawl-delay`` directive of robots.txt in ``rp_body`` field of
+    the domain dict (see :class:`Discovery <frontera.strategy.discovery.Discovery>` strategy), or defaults to
+    ``default_delay``, and is read again after ``delay_ttl`` seconds. The bucket holds as many tokens as could be
+    spent within ``horizon`` seconds, so a batch contains only requests spiders can fetch soon. Domains are keyed as
+    in Discovery strategy: by the registered domain from ``suffix_list``, or by host name without it.
+
+    The rest is kept here per domain, up to ``max_per_key`` requests and up to ``max_pending`` requests in total, and
+    sent in the next batches. Requests above the limits are passed to ``_reschedule_func`` to put them back to the
+    queue, with ``crawl_at`` set to the time the domain budget is expected to allow them, so queues with delayed
+    requests support don't return them before.
+    """
+    def __init__(self, _get_func, _reschedule_func, domain_metadata, default_delay, horizon, max_per_key,
+                 cache_size=100000, delay_ttl=300.0, max_pending=None, suffix_list=None):
+        """
+        :param _get_func: reference to get_next_requests() method of the backend
+        :param _reschedule_func: function accepting a list of requests to return to the queue
+        """
+        self._get = _get_func
+        self._reschedule = _reschedule_func
+        self._domain_metadata = domain_metadata
+        self._default_delay = default_delay
+        self._horizon = horizon
+        self._max_per_key = max_per_key
+        self._max_pending = max_pending
+        self._delay_ttl = delay_ttl
+        self._suffix_list = suffix_list
+        self._buckets = LRUCache(cache_size)
+        self._pending = defaultdict(OrderedDict)
+        self._pending_count = 0
+        self._log = getLogger("politeness")
+
+    def _get_key(self, request):
+        domain = request.meta.get(b'domain')
+        if domain and b'name' in domain:
+            hostname = domain[b'name']
+        else:
+            _, hostname, _, _, _, _ = parse_domain_from_url_fast(request.url)
+        if self._suffix_list is None or not hostname:
+            return hostname
+        hostname = hostname.decode('utf-8') if isinstance(hostname, six.binary_type) else hostname
+        return self._suffix_list.get_public_suffix(hostname.partition(':')[0])
+
+    def get_delay(self, key):
+        """
+        Returns crawl delay in seconds for the host.
+        """
+        if self._domain_metadata is None or not key:
+            return self._default_delay
+        key = key.decode('utf-8') if isinstance(key, six.binary_type) else key
+        try:
+            value = self._domain_metadata[key]
+        except KeyError:
+            return self._default_delay
+        except Exception:
+            self._log.exception("Error reading domain metadata for %s", key)
+            return self._default_delay
+        delay = None
+        if isinstance(value, dict):
+            delay = value.get('crawl_delay')
+            if delay is None and value.get('rp_body'):
+                delay = parse_crawl_delay(value['rp_body'])
+        return delay if delay is not None else self._default_delay
+
+    def _get_bucket(self, key, now):
+        bucket, expires = self._buckets.get(key, (None, None))
+        if bucket is not None and now < expires:
+            return bucket
+        delay = self.get_delay(key)
+        rate = 1.0 / delay if delay > 0 else float('inf')
+        capacity = max(1.0, self._horizon * rate)
+        if bucket is None:
+            bucket = TokenBucket(rate, capacity, now)
+        else:
+            # delay could change since the last lookup, spent budget is kept
+            bucket.set_rate(rate, capacity, now)
+        self._buckets[key] = (bucket, now + self._delay_ttl)
+        return bucket
+
+    def _get_due(self, key, position, now):
+        """
+        Returns the time request at ``position`` after the held requests of the domain is expected to be allowed, in
+        whole seconds, as some queues use it in row keys.
+        """
+        return int(ceil(now + position / self._get_bucket(key, now).rate))
+
+    def get_pending_count(self):
+        return self._pending_count
+
+    def flush(self):
+        """
+        Passes all held requests to ``_reschedule_func``, e.g. on DB worker stop, as they are already removed from
+        the queue.
+        """
+        requests = [request for pending in six.itervalues(self._pending) for queue in six.itervalues(pending)
+                    for request in queue]
+        self._pending.clear()
+        self._pending_count = 0
+        if requests:
+            self._log.info("Returning %d held requests to the queue", len(requests))
+            self._reschedule(requests)
+
+    def get_next_requests(self, max_n_requests, partition_id, **kwargs):
+        """
+        Returns up to ``max_n_requests`` requests for the partition, taking held requests first.
+
+        :return: list of :class:`Request <frontera.core.models.Request>` objects.
+        """
+        now = time()
+        pending = self._pending[partition_id]
+        requests = []
+        for key in list(pending):
+            queue = pending[key]
+            bucket = self._get_bucket(key, now)
+            while queue and len(requests) < max_n_requests and bucket.consume(now):
+                requests.append(queue.popleft())
+                self._pending_count -= 1
+            if not queue:
+                del pending[key]
+        if len(requests) >= max_n_requests:
+            return requests
+
+        to_reschedule = []
+        for request in self._get(max_n_requests - len(requests), partitions=[partition_id], **kwargs):
+            key = self._get_key(request)
+            if key not in pending and self._get_bucket(key, now).consume(now):
+                requests.append(request)
+                continue
+            queue = pending.setdefault(key, deque())
+            if (self._max_per_key is not None and len(queue) >= self._max_per_key) or \
+                    (self._max_pending is not None and self._pending_count >= self._max_pending):
+                request.meta[b'crawl_at'] = self._get_due(key, len(queue) + 1, now)
+                to_reschedule.append(request)
+            else:
+                queue.append(request)
+                self._pending_count += 1
+            if not queue:
+                del pending[key]
+        if to_reschedule:
+            self._log.debug("Returning %d requests to the queue", len(to_reschedule))
+            self._reschedule(to_reschedule)
+        return requests
@@ -12,6 +12,9 @@ DELAY_ON_EMPTY = 5.0
 DISCOVERY_MAX_PAGES = 100
 DOMAIN_FINGERPRINT_FUNCTION = 'frontera.utils.fingerprint.sha1'
 DOMAIN_STATS_LOG_INTERVAL = 300
+EXPRESS_LANE_BURST = 100
+EXPRESS_LANE_ENABLED = False
+EXPRESS_LANE_RATE = 1.0
 
 HBASE_THRIFT_HOST = 'localhost'
 HBASE_THRIFT_PORT = 9090
@@ -28,11 +31,18 @@ HBASE_BATCH_SIZE = 9216
 HBASE_STATE_CACHE_SIZE_LIMIT = 3000000
 HBASE_STATE_WRITE_LOG_SIZE = 15000
 HBASE_QUEUE_TABLE = 'queue'
+HBASE_QUEUE_BINARY_KEYS = False
+HBASE_QUEUE_DEDUP = False
+HBASE_PRESPLIT_REGIONS = 16
 KAFKA_GET_TIMEOUT = 5.0
 LOCAL_MODE = True
 MAX_NEXT_REQUESTS = 64
 MAX_REQUESTS = 0
+MEMORY_BUS_MAX_MESSAGES = 100000
 MESSAGE_BUS = 'frontera.contrib.messagebus.zeromq.MessageBus'
+MESSAGE_BUS_BATCH_BYTES = 262144
+MESSAGE_BUS_BATCH_DELAY = 1.0
+MESSAGE_BUS_BATCH_SIZE = 1
 MESSAGE_BUS_CODEC = 'frontera.contrib.backends.remote.codecs.msgpack'
 MIDDLEWARES = [
     'frontera.contrib.middlewares.domain.DomainMiddleware',
@@ -45,12 +55,27 @@ OVERUSED_MAX_PER_KEY = None
 OVERUSED_KEEP_PER_KEY = 1000
 OVERUSED_MAX_KEYS = None
 OVERUSED_KEEP_KEYS = 100
+POLITENESS_DEFAULT_DELAY = 1.0
+POLITENESS_DELAY_TTL = 300.0
+POLITENESS_ENABLED = False
+POLITENESS_HORIZON = 30.0
+POLITENESS_HOSTS_CACHE_SIZE = 100000
+POLITENESS_MAX_PENDING = 100000
+POLITENESS_MAX_PENDING_PER_HOST = 100
+QUEUE_ENTRY_TTL = None
+QUEUE_EVICTION_INTERVAL = 60.0
 QUEUE_HOSTNAME_PARTITIONING = False
+QUEUE_PARTITION_CAPACITY = None
 REDIS_BACKEND_CODEC = 'frontera.contrib.backends.remote.codecs.msgpack'
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_STATE_CACHE_SIZE_LIMIT = 0
 REQUEST_MODEL = 'frontera.core.models.Request'
+REVISITING_DEFAULT_INTERVAL = None
+REVISITING_ENABLED = False
+REVISITING_WHEEL_LEVELS = 4
+REVISITING_WHEEL_RESOLUTION = 1.0
+REVISITING_WHEEL_SLOTS = 64
 RESPONSE_MODEL = 'frontera.core.models.Response'
 
 SCORING_PARTITION_ID = 0
@@ -59,6 +84,10 @@ SPIDER_LOG_CONSUMER_BATCH_SIZE = 512
 SPIDER_LOG_PARTITIONS = 1
 SPIDER_FEED_PARTITIONS = 1
 SPIDER_PARTITION_ID = 0
+SQLITE_BACKEND_CODEC = 'frontera.contrib.backends.remote.codecs.msgpack'
+SQLITE_DATABASE = ':memory:'
+SQLITE_DROP_ALL_TABLES = False
+SQLITE_SYNCHRONOUS = 'NORMAL'
 SQLALCHEMYBACKEND_CACHE_SIZE = 10000
 SQLALCHEMYBACKEND_CLEAR_CONTENT = False
 SQLALCHEMYBACKEND_DROP_ALL_TABLES = False
@@ -68,6 +97,7 @@ SQLALCHEMYBACKEND_MODELS = {
     'MetadataModel': 'frontera.contrib.backends.sqlalchemy.models.MetadataModel',
     'StateModel': 'frontera.contrib.backends.sqlalchemy.models.StateModel',
     'QueueModel': 'frontera.contrib.backends.sqlalchemy.models.QueueModel',
+    'QueueCountModel': 'frontera.contrib.backends.sqlalchemy.models.QueueCountModel',
     'DomainMetadataModel': 'frontera.contrib.backends.sqlalchemy.models.DomainMetadataModel'
 }
 SQLALCHEMYBACKEND_REVISIT_INTERVAL = timedelta(days=1)
@@ -84,6 +114,12 @@ USER_AGENT = 'FronteraDiscoveryBot'
 
 ZMQ_ADDRESS = '127.0.0.1'
 ZMQ_BASE_PORT = 5550
+ZMQ_BROKER_METRICS_HOST = '127.0.0.1'
+ZMQ_BROKER_METRICS_PORT = None
+ZMQ_COMPRESSION = None
+ZMQ_COMPRESSION_DICTIONARY = None
+ZMQ_COMPRESSION_LEVEL = None
+ZMQ_COMPRESSION_MIN_SIZE = 256
 
 LOGGING_CONFIG = 'logging.conf'
 
@@ -105,3 +141,8 @@ STATS_LOG_READER_GROUP = 'stats-reader-log'
 KAFKA_CODEC = None
 KAFKA_CERT_PATH = '/mnt/mesos/sandbox'
 KAFKA_ENABLE_SSL = False
+KAFKA_FETCH_MAX_BYTES = 52428800
+KAFKA_FETCH_MAX_WAIT_MS = 500
+KAFKA_FETCH_MIN_BYTES = 1
+KAFKA_LAG_REFRESH_INTERVAL = 1.0
+KAFKA_MAX_PARTITION_FETCH_BYTES = 10485760
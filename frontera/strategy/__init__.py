@@ -111,14 +111,18 @@ class BaseCrawlingStrategy(object):
         self._scheduled_stream.flush()
         self._states_context.release()
 
-    def schedule(self, request, score=1.0, dont_queue=False):
+    def schedule(self, request, score=1.0, dont_queue=False, express=False):
         """
         Schedule document for crawling with specified score.
 
         :param request: A :class:`Request <frontera.core.models.Request>` object.
         :param score: float from 0.0 to 1.0
         :param dont_queue: bool, True - if no need to schedule, only update the score
+        :param express: bool, True - send the request to spider feed bypassing the queue, if express lane is enabled
+            with :setting:`EXPRESS_LANE_ENABLED` setting
         """
+        if express:
+            request.meta[b'express'] = True
         self._scheduled_stream.send(request, score, dont_queue)
 
     def create_request(self, url, method=b'GET', headers=None, cookies=None, meta=None, body=b''):
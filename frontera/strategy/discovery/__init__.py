@@ -469,7 +469,9 @@ class Discovery(BaseCrawlingStrategy):
             self.logger.warning("Can't parse hostname for '%s'", repr(request.url))
             return False
         final_score = justify_request_score_by_hostname(hostname, score)
-        self.schedule(request, final_score)
+        # robots.txt and sitemaps are needed to discover the domain, so skip the queue for them
+        express = b'robots' in request.meta or b'sitemap' in request.meta
+        self.schedule(request, final_score, express=express)
         request.meta[b'state'] = States.QUEUED
         return True
 
@@ -19,4 +19,16 @@ def restruct_for_pack(obj):
     elif hasattr(obj, '__dict__'):
         return restruct_for_pack(obj.__dict__)
     else:
-        return None
\ No newline at end of file
+        return None
+
+
+def pack_default(obj):
+    """
+    Converts objects msgpack can't serialize natively, meant to be used as ``default`` hook of msgpack packer. Unlike
+    :func:`restruct_for_pack` it's called only for such objects, so the rest of hierarchy isn't copied.
+    """
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, '__dict__'):
+        return obj.__dict__
+    return None
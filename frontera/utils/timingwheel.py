@@ -0,0 +1,111 @@
+from __future__ import absolute_import
+from math import ceil
+
+from six.moves import range
+
+
+class TimingWheel(object):
+    """
+    Hierarchical timing wheel holding (key, due time) entries. Adding, removing and releasing of a key is O(1),
+    entries are moved to the lower levels of the wheel when their time comes closer, so each entry is touched at
+    most ``levels`` times.
+
+    Level ``l`` has ``slots`` buckets, each covering ``slots ** l`` ticks of ``resolution`` seconds. Entries due
+    later than ``slots ** levels`` ticks are kept in the farthest bucket of the top level and re-placed on every
+    turn of it.
+
+    Only the last due time of a key is kept, superseded and removed entries are dropped lazily.
+
+    :param float resolution: duration of the tick in seconds.
+    :param int slots: number of buckets on every level.
+    :param int levels: number of levels.
+    :param float start: time of the tick 0, in seconds since the epoch.
+    """
+    def __init__(self, resolution=1.0, slots=64, levels=4, start=0.0):
+        self.resolution = float(resolution)
+        self.slots = slots
+        self.levels = levels
+        self.start = start
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._due = {}
+        self._ready = []
+        self._tick = 0
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, key):
+        return key in self._due
+
+    def _to_tick(self, timestamp):
+        return int(ceil((timestamp - self.start) / self.resolution))
+
+    def _place(self, key, due_tick):
+        delta = due_tick - self._tick
+        if delta <= 0:
+            self._ready.append((key, due_tick))
+            return
+        for level in range(self.levels):
+            if delta < self._spans[level + 1]:
+                self._wheels[level][(due_tick // self._spans[level]) % self.slots].append((key, due_tick))
+                return
+        top = self.levels - 1
+        self._wheels[top][(self._tick // self._spans[top] - 1) % self.slots].append((key, due_tick))
+
+    def add(self, key, due):
+        """
+        Adds the key or moves it to the new due time.
+
+        :param key: hashable key, e.g. fingerprint.
+        :param float due: due time in seconds since the epoch.
+        """
+        due_tick = self._to_tick(due)
+        self._due[key] = due_tick
+        self._place(key, due_tick)
+
+    def remove(self, key):
+        """
+        Removes the key from the wheel, if it's present.
+        """
+        self._due.pop(key, None)
+
+    def _release(self, entries):
+        for key, due_tick in entries:
+            if self._due.get(key) == due_tick:
+                del self._due[key]
+                yield key
+
+    def advance(self, now):
+        """
+        Turns the wheel up to the ``now`` time and returns the keys, which are due.
+
+        :param float now: current time in seconds since the epoch.
+        :return: list of keys.
+        """
+        released = list(self._release(self._ready))
+        self._ready = []
+        target = int((now - self.start) // self.resolution)
+        if not self._due:
+            self._tick = max(self._tick, target)
+            return released
+        while self._tick < target:
+            self._tick += 1
+            for level in range(1, self.levels):
+                if self._tick % self._spans[level]:
+                    break
+                bucket = self._wheels[level]
+                slot = (self._tick // self._spans[level]) % self.slots
+                entries, bucket[slot] = bucket[slot], []
+                for key, due_tick in entries:
+                    if self._due.get(key) == due_tick:
+                        self._place(key, due_tick)
+            bucket = self._wheels[0]
+            slot = self._tick % self.slots
+            entries, bucket[slot] = bucket[slot], []
+            released.extend(self._release(entries))
+            released.extend(self._release(self._ready))
+            self._ready = []
+            if not self._due:
+                self._tick = target
+        return released
@@ -32,10 +32,21 @@ class DBWorkerBaseComponent(object):
         """Optional cleanup logic when component loop is stopped."""
 
 
+class SpiderFeedKeyMixin(object):
+    """Helpers to get keys of requests sent to spider feed, shared by components producing to it."""
+
+    def get_fingerprint(self, request):
+        return request.meta[b'fingerprint']
+
+    def get_hostname(self, request):
+        return request.meta[b'domain'][b'name']
+
+
 class DBWorkerPeriodicComponent(DBWorkerBaseComponent):
 
     def __init__(self, worker, settings, stop_event, *args, **kwargs):
         super(DBWorkerPeriodicComponent, self).__init__(worker, settings, stop_event)
+        self.run_interval = 0  # replace it with a proper value in subclass
         self.periodic_task = CallLaterOnce(self.run_and_reschedule)
         self.periodic_task.setErrback(self.run_errback)
 
@@ -45,12 +56,12 @@ class DBWorkerPeriodicComponent(DBWorkerBaseComponent):
     def run_and_reschedule(self):
         if not self.stopped:
             self.run()
-            self.periodic_task.schedule()
+            self.periodic_task.schedule(self.run_interval)
 
     def run_errback(self, failure):
         self.logger.error(failure.getTraceback())
         if not self.stopped:
-            self.periodic_task.schedule()
+            self.periodic_task.schedule(self.run_interval)
 
     @property
     def stopped(self):
@@ -6,12 +6,13 @@ from time import asctime, time
 from collections import defaultdict
 from logging import DEBUG
 
+from frontera.core.politeness import PolitenessBuffer, load_public_suffix_list
 from frontera.exceptions import NotConfigured
 from frontera.utils.url import parse_domain_from_url_fast
-from . import DBWorkerThreadComponent
+from . import DBWorkerThreadComponent, SpiderFeedKeyMixin
 
 
-class BatchGenerator(DBWorkerThreadComponent):
+class BatchGenerator(SpiderFeedKeyMixin, DBWorkerThreadComponent):
     """Component to get data from backend and send it to spider feed log."""
 
     NAME = 'batchgen'
@@ -34,6 +35,17 @@ class BatchGenerator(DBWorkerThreadComponent):
         self.domains_blacklist = settings.get('DOMAINS_BLACKLIST')
         self.max_next_requests = settings.MAX_NEXT_REQUESTS
         self.partitions = partitions
+        self.politeness = None
+        if settings.get('POLITENESS_ENABLED'):
+            self.politeness = PolitenessBuffer(self.backend.get_next_requests, self._reschedule,
+                                               self._get_domain_metadata(),
+                                               settings.get('POLITENESS_DEFAULT_DELAY'),
+                                               settings.get('POLITENESS_HORIZON'),
+                                               settings.get('POLITENESS_MAX_PENDING_PER_HOST'),
+                                               settings.get('POLITENESS_HOSTS_CACHE_SIZE'),
+                                               settings.get('POLITENESS_DELAY_TTL'),
+                                               settings.get('POLITENESS_MAX_PENDING'),
+                                               load_public_suffix_list())
         # create an event to disable/enable batches generation via RPC
         self.disabled_event = threading.Event()
 
@@ -46,7 +58,8 @@ class BatchGenerator(DBWorkerThreadComponent):
         pending_partitions = self.spider_feed.available_partitions()
         if not self.partitions:
             return pending_partitions
-        return list(set(pending_partitions) & set(self.partitions))
+        # keep the order of partitions given by spider feed
+        return [partition_id for partition_id in pending_partitions if partition_id in self.partitions]
 
     def run(self):
         if self.disabled_event.is_set():
@@ -69,8 +82,7 @@ class BatchGenerator(DBWorkerThreadComponent):
     def _handle_partition(self, partition_id):
         self.logger.info("Getting new batches for partition %d", partition_id)
         count = 0
-        for request in self.backend.get_next_requests(self.max_next_requests,
-                                                      partitions=[partition_id]):
+        for request in self._get_next_requests(partition_id):
             if self._is_domain_blacklisted(request):
                 continue
             try:
@@ -94,6 +106,27 @@ class BatchGenerator(DBWorkerThreadComponent):
         self.update_stats(increments={'pushed_since_start': count})
         return count
 
+    def _get_next_requests(self, partition_id):
+        if self.politeness is None:
+            return self.backend.get_next_requests(self.max_next_requests, partitions=[partition_id])
+        requests = self.politeness.get_next_requests(self.max_next_requests, partition_id)
+        self.update_stats(replacements={'politeness_pending': self.politeness.get_pending_count()})
+        return requests
+
+    def _get_domain_metadata(self):
+        try:
+            domain_metadata = self.backend.domain_metadata
+        except NotImplementedError:
+            domain_metadata = None
+        if domain_metadata is None:
+            self.logger.warning("Backend doesn't provide domain metadata, using default crawl delay for all hosts")
+        return domain_metadata
+
+    def _reschedule(self, requests):
+        self.backend.queue.schedule([(request.meta[b'fingerprint'], request.meta.get(b'score', 1.0), request, True)
+                                     for request in requests])
+        self.update_stats(increments={'politeness_rescheduled': len(requests)})
+
     def _is_domain_blacklisted(self, request):
         if not self.domains_blacklist:
             return
@@ -109,6 +142,8 @@ class BatchGenerator(DBWorkerThreadComponent):
         return False
 
     def close(self):
+        if self.politeness is not None:
+            self.politeness.flush()
         self.spider_feed_producer.close()
 
     def rotate_and_log_domain_stats(self):
@@ -120,11 +155,3 @@ class BatchGenerator(DBWorkerThreadComponent):
 
             self.domain_stats[partition_id] = defaultdict(int)
         self.rotate_time = time() + self.domain_stats_interval
-
-    # --------------------------- Auxiliary tools --------------------------------
-
-    def get_fingerprint(self, request):
-        return request.meta[b'fingerprint']
-
-    def get_hostname(self, request):
-        return request.meta[b'domain'][b'name']
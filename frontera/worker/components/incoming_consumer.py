@@ -36,12 +36,13 @@ class IncomingConsumer(DBWorkerPeriodicComponent):
         for m in self.spider_log_consumer.get_messages(
                 timeout=1.0, count=self.spider_log_consumer_batch_size):
             try:
-                msg = self.worker._decoder.decode(m)
+                msgs = list(self.worker._decoder.decode_messages(m))
             except (KeyError, TypeError) as e:
                 self.logger.error("Decoding error: %s", e)
-            else:
+                consumed += 1
+                continue
+            for msg in msgs:
                 self._handle_message(msg, stats)
-            finally:
                 consumed += 1
         """
         # TODO: Think how it should be implemented in DB-worker only mode.
@@ -113,6 +114,10 @@ class IncomingConsumer(DBWorkerPeriodicComponent):
                     self.spider_feed.mark_busy(partition_id)
             stats['consumed_offset'] += 1
 
+        elif msg_type == 'requests_evicted':
+            # states of evicted requests are reset by strategy worker
+            pass
+
         else:
             self.logger.debug('Unknown message type %s', msg[0])
 
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from time import asctime
+
+from frontera.contrib.backends.partitioners import FingerprintPartitioner
+from frontera.exceptions import NotConfigured
+from frontera.utils.misc import chunks
+from . import DBWorkerPeriodicComponent
+
+
+class QueueEvictor(DBWorkerPeriodicComponent):
+    """Component to evict the lowest score and expired requests from backend queue partitions.
+
+    Fingerprints of evicted requests are sent to strategy workers in spider log, partitioned as spider log messages
+    of spiders, so strategy worker owning the fingerprint resets its state to NOT_CRAWLED, and the request could be
+    discovered and scheduled again.
+    """
+
+    FINGERPRINTS_PER_MESSAGE = 1000
+
+    NAME = 'evictor'
+
+    def __init__(self, worker, settings, stop_event, no_batches=False, partitions=None, **kwargs):
+        super(QueueEvictor, self).__init__(worker, settings, stop_event, **kwargs)
+        if no_batches:
+            raise NotConfigured('QueueEvictor is disabled with --no-batches')
+        self.capacity = settings.get('QUEUE_PARTITION_CAPACITY')
+        self.ttl = settings.get('QUEUE_ENTRY_TTL')
+        if self.capacity is None and self.ttl is None:
+            raise NotConfigured('QueueEvictor is disabled, neither QUEUE_PARTITION_CAPACITY nor QUEUE_ENTRY_TTL '
+                                'is set')
+
+        self.run_interval = settings.get('QUEUE_EVICTION_INTERVAL')
+        self.backend = worker.backend
+        self.partitions = partitions or list(range(settings.get('SPIDER_FEED_PARTITIONS')))
+        self.disabled = False
+        self.spider_log_producer = worker.message_bus.spider_log().producer()
+        self.spider_log_partitioner = FingerprintPartitioner(list(range(settings.get('SPIDER_LOG_PARTITIONS'))))
+
+    def run(self):
+        if self.disabled:
+            return
+        evicted = 0
+        for partition_id in self.partitions:
+            try:
+                fingerprints = self.backend.queue.evict(partition_id, self.capacity, self.ttl)
+            except NotImplementedError:
+                self.logger.error("%s doesn't support eviction, stopping", type(self.backend.queue).__name__)
+                self.disabled = True
+                return
+            if fingerprints:
+                self.logger.debug("Evicted %d requests from partition %d", len(fingerprints), partition_id)
+                self._send_evicted(fingerprints)
+                evicted += len(fingerprints)
+        self.worker.update_stats(increments={'evicted_since_start': evicted},
+                                 replacements={'last_evicted': evicted,
+                                               'last_eviction_run': asctime()})
+
+    def _send_evicted(self, fingerprints):
+        by_partition = {}
+        for fprint in fingerprints:
+            by_partition.setdefault(self.spider_log_partitioner.partition(fprint), []).append(fprint)
+        for partition_fingerprints in by_partition.values():
+            for chunk in chunks(partition_fingerprints, self.FINGERPRINTS_PER_MESSAGE):
+                # any fingerprint of the chunk is routed to the same partition
+                self.spider_log_producer.send(chunk[0], self.worker._encoder.encode_requests_evicted(chunk))
+        self.spider_log_producer.flush()
+
+    def close(self):
+        self.spider_log_producer.close()
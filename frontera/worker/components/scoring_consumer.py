@@ -1,15 +1,20 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
-from time import asctime
+from time import asctime, time
 
+from frontera.contrib.backends.partitioners import FingerprintPartitioner, Crc32NamePartitioner
+from frontera.core.politeness import TokenBucket
 from frontera.exceptions import NotConfigured
 from frontera.core.components import DistributedBackend
-from . import DBWorkerPeriodicComponent
+from . import DBWorkerPeriodicComponent, SpiderFeedKeyMixin
 
 
-class ScoringConsumer(DBWorkerPeriodicComponent):
-    """Component to get data from scoring log and send it to backend queue."""
+class ScoringConsumer(SpiderFeedKeyMixin, DBWorkerPeriodicComponent):
+    """Component to get data from scoring log and send it to backend queue.
+
+    If express lane is enabled, requests scheduled with ``express`` meta are sent straight to spider feed, up to
+    :setting:`EXPRESS_LANE_RATE` requests per second for every partition, the rest goes to the queue."""
 
     NAME = 'scoring'
 
@@ -25,30 +30,76 @@ class ScoringConsumer(DBWorkerPeriodicComponent):
         self.scoring_log_consumer_batch_size = settings.get('SCORING_LOG_CONSUMER_BATCH_SIZE')
         self.backend_queue = worker.backend.queue
 
+        self.express_buckets = None
+        if settings.get('EXPRESS_LANE_ENABLED'):
+            self.express_buckets = {}
+            self.express_rate = settings.get('EXPRESS_LANE_RATE')
+            self.express_burst = settings.get('EXPRESS_LANE_BURST')
+            self.spider_feed_producer = worker.message_bus.spider_feed().producer()
+            # partitions are computed here the same way as in spider feed producer to cap the rate per partition
+            partitions = list(range(settings.get('SPIDER_FEED_PARTITIONS')))
+            if settings.get('QUEUE_HOSTNAME_PARTITIONING'):
+                self.partitioner = Crc32NamePartitioner(partitions)
+                self.get_key_function = self.get_hostname
+            else:
+                self.partitioner = FingerprintPartitioner(partitions)
+                self.get_key_function = self.get_fingerprint
+
     def run(self):
-        consumed, seen, batch = 0, set(), []
+        consumed, express, seen, batch = 0, 0, set(), []
         for m in self.scoring_log_consumer.get_messages(
                 count=self.scoring_log_consumer_batch_size):
             try:
-                msg = self.worker._decoder.decode(m)
+                msgs = list(self.worker._decoder.decode_messages(m))
             except (KeyError, TypeError):
                 self.logger.exception("Decoding error")
+                consumed += 1
                 continue
-            else:
+            for msg in msgs:
+                consumed += 1
                 if msg[0] == 'update_score':
                     _, request, score, schedule = msg
                     if request.meta[b'fingerprint'] not in seen:
-                        batch.append((request.meta[b'fingerprint'],
-                                      score, request, schedule))
                         seen.add(request.meta[b'fingerprint'])
+                        if schedule and self._send_express(request):
+                            express += 1
+                        else:
+                            batch.append((request.meta[b'fingerprint'],
+                                          score, request, schedule))
                 elif msg[0] == 'new_job_id':
                     self.worker.job_id = msg[1]
-            finally:
-                consumed += 1
         self.backend_queue.schedule(batch)
-        self.worker.update_stats(increments={'consumed_scoring_since_start': consumed},
+        self.worker.update_stats(increments={'consumed_scoring_since_start': consumed,
+                                             'express_pushed_since_start': express},
                                  replacements={'last_consumed_scoring': consumed,
                                                'last_consumption_run_scoring': asctime()})
 
+    def _send_express(self, request):
+        if self.express_buckets is None or not request.meta.get(b'express'):
+            return False
+        try:
+            key = self.get_key_function(request)
+            partition_id = self.partitioner.partition(key)
+        except Exception:
+            self.logger.exception("Partitioning express request error, url: %s", request.url)
+            return False
+        now = time()
+        bucket = self.express_buckets.get(partition_id)
+        if bucket is None:
+            bucket = self.express_buckets[partition_id] = TokenBucket(self.express_rate, self.express_burst, now)
+        if not bucket.consume(now):
+            return False
+        try:
+            request.meta[b'jid'] = self.worker.job_id
+            eo = self.worker._encoder.encode_request(request)
+            self.spider_feed_producer.send(key, eo)
+        except Exception:
+            self.logger.exception("Sending express request error, fingerprint: %s, url: %s",
+                                  self.get_fingerprint(request), request.url)
+            return False
+        return True
+
     def close(self):
         self.scoring_log_consumer.close()
+        if self.express_buckets is not None:
+            self.spider_feed_producer.close()
@@ -26,9 +26,10 @@ from frontera.worker.stats import StatsExportMixin
 from .components.incoming_consumer import IncomingConsumer
 from .components.scoring_consumer import ScoringConsumer
 from .components.batch_generator import BatchGenerator
+from .components.queue_evictor import QueueEvictor
 
 
-ALL_COMPONENTS = [ScoringConsumer, IncomingConsumer, BatchGenerator]
+ALL_COMPONENTS = [ScoringConsumer, IncomingConsumer, BatchGenerator, QueueEvictor]
 LOGGING_TASK_INTERVAL = 30
 
 logger = logging.getLogger("db-worker")
@@ -139,6 +140,15 @@ class BaseDBWorker(object):
             for key, value in increments.items():
                 self.stats[key] += value
 
+    def get_queue_counts(self):
+        """Returns number of requests in the backend queue and in every its partition, or None if the queue doesn't
+        count requests per partition."""
+        try:
+            partitions = self.backend.queue.partition_counts()
+        except NotImplementedError:
+            return None
+        return {'count': sum(partitions.values()), 'partitions': partitions}
+
     def set_process_info(self, process_info):
         self.process_info = process_info
 
@@ -174,6 +184,7 @@ class BaseDBWorker(object):
     def _close_slot(self, _=None):
         logger.info('Closing DB worker slot resources.')
         self.slot.close()
+        self.message_bus.close()
 
     def _perform_shutdown(self, _=None):
         logger.info("Stopping frontier manager.")
@@ -84,7 +84,8 @@ class StatusResource(JsonResource):
         return {
             'is_finishing': self.worker.slot.stop_event.is_set(),
             'disable_new_batches': disable_new_batches,
-            'stats': self.worker.stats
+            'stats': self.worker.stats,
+            'queue': self.worker.get_queue_counts()
         }
 
 
@@ -18,7 +18,10 @@ from twisted.internet import reactor, task
 from twisted.internet.defer import Deferred
 from twisted.internet.task import LoopingCall
 
+from frontera.core.components import States
 from frontera.core.manager import WorkerFrontierManager, MessageBusUpdateScoreStream
+from frontera.core.messagebus import BatchProducer
+from frontera.core.models import Request
 from frontera.logger.handlers import CONSOLE
 from frontera.settings import Settings
 from frontera.utils.misc import load_object
@@ -69,6 +72,11 @@ class BatchedWorkflow(object):
                     self._on_request_error(request, error)
                     self.stats['consumed_request_error'] += 1
                     continue
+                if typ == 'requests_evicted':
+                    _, requests = event
+                    self._on_requests_evicted(requests)
+                    self.stats['consumed_requests_evicted'] += 1
+                    continue
                 self.on_unknown_event(event)
             except Exception:
                 logger.exception("Exception during processing")
@@ -103,6 +111,12 @@ class BatchedWorkflow(object):
                 return
             if typ == 'offset':
                 return
+            if typ == 'requests_evicted':
+                _, fingerprints = event
+                requests = [Request('', meta={b'fingerprint': fprint}) for fprint in fingerprints]
+                self._batch[-1] = (typ, requests)
+                self.states_context.to_fetch(requests)
+                return
             self.collect_unknown_event(event)
         except Exception:
             logger.exception("Error during event collection")
@@ -134,6 +148,16 @@ class BatchedWorkflow(object):
         self.strategy.request_error(request, error)
         self.states_context.states.update_cache(request)
 
+    def _on_requests_evicted(self, requests):
+        # requests evicted from the queue by DB worker could be discovered and scheduled again
+        logger.debug("Requests evicted (%d)", len(requests))
+        states = self.states_context.states
+        states.set_states(requests)
+        evicted = [request for request in requests if request.meta[b'state'] == States.QUEUED]
+        for request in evicted:
+            request.meta[b'state'] = States.NOT_CRAWLED
+        states.update_cache(evicted)
+
 
 class BaseStrategyWorker(object):
     """Base strategy worker class."""
@@ -151,7 +175,6 @@ class BaseStrategyWorker(object):
             spider_log = mb.spider_log()
             self.consumer = spider_log.consumer(partition_id=partition_id, type=b'sw')
             self.consumer_batch_size = settings.get('SPIDER_LOG_CONSUMER_BATCH_SIZE')
-        self.scoring_log_producer = scoring_log.producer()
 
         codec_path = settings.get('MESSAGE_BUS_CODEC')
         encoder_cls = load_object(codec_path + ".Encoder")
@@ -161,6 +184,7 @@ class BaseStrategyWorker(object):
         response_model = load_object(settings.get('RESPONSE_MODEL'))
         self._decoder = decoder_cls(request_model, response_model)
         self._encoder = encoder_cls(request_model)
+        self.scoring_log_producer = BatchProducer.from_settings(scoring_log.producer(), self._encoder, settings)
 
         self.update_score = MessageBusUpdateScoreStream(self.scoring_log_producer, self._encoder)
         manager = WorkerFrontierManager.from_settings(settings, strategy_worker=True, scoring_stream=self.update_score)
@@ -180,14 +204,14 @@ class BaseStrategyWorker(object):
         self.workflow.collection_start()
         for m in self.consumer.get_messages(count=self.consumer_batch_size, timeout=1.0):
             try:
-                event = self._decoder.decode(m)
+                events = list(self._decoder.decode_messages(m))
             except (KeyError, TypeError):
                 logger.exception("Decoding error")
                 logger.debug("Message %s", hexlify(m))
+                consumed += 1
                 continue
-            else:
+            for event in events:
                 self.workflow.collect(event)
-            finally:
                 consumed += 1
         self.workflow.process()
 
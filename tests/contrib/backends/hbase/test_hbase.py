@@ -5,7 +5,8 @@ from binascii import unhexlify
 from time import time
 
 import pytest
-from frontera.contrib.backends.hbase import HBaseState, HBaseMetadata, HBaseQueue
+from frontera.contrib.backends import hbase
+from frontera.contrib.backends.hbase import HBaseState, HBaseMetadata, HBaseQueue, get_buckets
 from frontera.core.components import States
 from frontera.core.models import Request, Response
 from happybase import Connection
@@ -60,6 +61,17 @@ class TestHBaseBackend(object):
             assert set([r.url for r in queue.get_next_requests(10, 0, min_requests=3, min_hosts=1,
                        max_requests_per_host=10)]) == set([r5.url])
 
+    def test_queue_dedup(self):
+        connection = Connection(host='hbase-docker', port=9090)
+        queue = HBaseQueue(connection, 1, b'queue_dedup', drop=True, dedup=True)
+        queue.schedule([(b'10', 0.5, r1, True), (b'11', 0.5, r2, True)])
+        queue.schedule([(b'10', 0.9, r1, True)])
+        assert queue.count() == 2
+        requests = queue.get_next_requests(10, 0, min_requests=1, min_hosts=1, max_requests_per_host=10)
+        assert [(r.url, r.meta[b'score']) for r in requests] == [(r1.url, 0.9)]
+        queue.schedule([(b'10', 0.9, r1, True)])
+        assert queue.count() == 2
+
     def test_drop_all_tables_when_table_name_is_str(self):
         connection = Connection(host='hbase-docker', port=9090)
         for table in connection.tables():
@@ -82,3 +94,12 @@ class TestHBaseBackend(object):
         except AlreadyExists:
             assert False, "failed to drop hbase tables"
 
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_get_buckets(use_numpy, monkeypatch):
+    if not use_numpy:
+        monkeypatch.setattr(hbase, 'np', None)
+    assert get_buckets([0.0, 0.005, 0.1, 0.3, 0.999, 1.0], 100) == [0, 0, 10, 30, 99, 99]
+    assert get_buckets([], 100) == []
+    with pytest.raises(OverflowError):
+        get_buckets([0.5, 1.5], 100)
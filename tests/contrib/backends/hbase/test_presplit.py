@@ -0,0 +1,36 @@
+from __future__ import absolute_import
+
+from struct import pack
+
+from frontera.contrib.backends.hbase.presplit import queue_split_keys, fingerprint_split_keys, domain_split_keys, \
+    get_tables, create_statement
+from frontera.settings import Settings
+
+
+def test_queue_split_keys():
+    assert queue_split_keys(12, 4) == [b'1_', b'4_', b'7_']
+    assert queue_split_keys(4, 16, binary_keys=True) == [pack('>I', 1), pack('>I', 2), pack('>I', 3)]
+    assert queue_split_keys(1, 16) == []
+
+
+def test_fingerprint_split_keys():
+    assert fingerprint_split_keys(4) == [b'\x40\x00', b'\x80\x00', b'\xc0\x00']
+    assert fingerprint_split_keys(1) == []
+
+
+def test_domain_split_keys():
+    assert domain_split_keys(4) == [b'9', b'i', b'r']
+    assert len(domain_split_keys(100)) == 35
+
+
+def test_create_statements():
+    settings = Settings(attributes={'SPIDER_FEED_PARTITIONS': 2, 'HBASE_PRESPLIT_REGIONS': 2})
+    statements = [create_statement('crawler', *table) for table in get_tables(settings)]
+    assert statements == [
+        "create 'crawler:queue', {NAME => 'f', VERSIONS => 1}, SPLITS => [\"1_\"]",
+        "create 'crawler:states', {NAME => 's', BLOCKCACHE => true, BLOOMFILTER => 'ROW', IN_MEMORY => true, "
+        "VERSIONS => 1}, SPLITS => [\"\\x80\\x00\"]",
+        "create 'crawler:metadata', {NAME => 'c', VERSIONS => 1}, {NAME => 'm', VERSIONS => 1}, "
+        "SPLITS => [\"\\x80\\x00\"]",
+        "create 'crawler:domain_metadata', {NAME => 'm', VERSIONS => 1}, SPLITS => [\"i\"]",
+    ]
@@ -201,6 +201,25 @@ class RedisQueueTest(TestCase):
         requests = subject.get_next_requests(5, 0, min_hosts=1, min_requests=1, max_requests_per_host=5)
         self.assertEqual(0, len(requests))
 
+    def test_scheduling_future_delayed(self):
+        subject = self.setup_subject(1)
+        now = int(time())
+        batch = [
+            ("1", 1, Request("1", now + 100, 'https://www.knuthellan.com/', domain='knuthellan.com'), True),
+            ("2", 0.1, Request("2", now + 200, 'https://www.khellan.com/', domain='khellan.com'), True),
+            ("3", 0.5, Request("3", now - 10, 'https://www.hellan.me/', domain='hellan.me'), True),
+        ]
+        subject.schedule(batch)
+        self.assertEqual(1, subject._redis.zcard(0))
+        self.assertEqual(2, subject._redis.zcard('0:delayed'))
+        subject._release_delayed(0, now + 150)
+        self.assertEqual(2, subject._redis.zcard(0))
+        self.assertEqual(1, subject._redis.zcard('0:delayed'))
+        subject._release_delayed(0, now + 200)
+        self.assertEqual(3, subject._redis.zcard(0))
+        self.assertEqual(0, subject._redis.zcard('0:delayed'))
+        self.assertEqual(3, subject.count())
+
     def test_scheduling_mix(self):
         subject = self.setup_subject(1)
         batch = [
@@ -314,6 +333,53 @@ class RedisQueueTest(TestCase):
         self.assertTrue('https://www.knuthellan.com/' in urls)
         self.assertEqual(0, subject.count())
 
+    def test_evict_capacity(self):
+        subject = self.setup_subject(1)
+        batch = [
+            ("1", 1, Request("1", int(time()) - 10, 'https://www.knuthellan.com/', domain='knuthellan.com'), True),
+            ("2", 0.1, Request("2", int(time()) - 10, 'https://www.khellan.com/', domain='khellan.com'), True),
+            ("3", 0.5, Request("3", int(time()) - 10, 'https://www.hellan.me/', domain='hellan.me'), True),
+        ]
+        subject.schedule(batch)
+        self.assertEqual([], subject.evict(0, capacity=3))
+        self.assertEqual(1, len(subject.evict(0, capacity=2)))
+        self.assertEqual(2, subject.count())
+        requests = subject.get_next_requests(5, 0, min_hosts=1, min_requests=1, max_requests_per_host=5)
+        urls = [request.url for request in requests]
+        self.assertEqual(set(['https://www.knuthellan.com/', 'https://www.hellan.me/']), set(urls))
+
+    def test_evict_ttl(self):
+        subject = self.setup_subject(1)
+        batch = [
+            ("1", 1, Request("1", int(time()) - 100, 'https://www.knuthellan.com/', domain='knuthellan.com'), True),
+            ("2", 0.1, Request("2", int(time()) - 10, 'https://www.khellan.com/', domain='khellan.com'), True),
+            ("3", 0.5, Request("3", int(time()) - 100, 'https://www.hellan.me/', domain='hellan.me'), True),
+        ]
+        subject.schedule(batch)
+        self.assertEqual(2, len(subject.evict(0, capacity=2, ttl=50)))
+        requests = subject.get_next_requests(5, 0, min_hosts=1, min_requests=1, max_requests_per_host=5)
+        self.assertEqual(['https://www.khellan.com/'], [request.url for request in requests])
+
+    def test_partition_counts(self):
+        subject = self.setup_subject(2)
+        now = int(time())
+        batch = [
+            ("1", 1, Request("1", now - 10, 'https://www.knuthellan.com/', domain='knuthellan.com'), True),
+            ("2", 0.1, Request("2", now + 100, 'https://www.khellan.com/', domain='khellan.com'), True),
+            ("3", 0.5, Request("3", now - 10, 'https://www.hellan.me/', domain='hellan.me'), True),
+        ]
+        subject.schedule(batch)
+        subject.schedule(batch)
+        self.assertEqual(3, subject.count())
+        counts = subject.partition_counts()
+        self.assertEqual(3, sum(counts.values()))
+        for partition_id, count in counts.items():
+            self.assertEqual(subject._redis.zcard(partition_id) +
+                             subject._redis.zcard('{}:delayed'.format(partition_id)), count)
+        for partition_id in range(2):
+            subject.get_next_requests(5, partition_id, min_hosts=1, min_requests=1, max_requests_per_host=5)
+        self.assertEqual(1, subject.count())
+        self.assertEqual(1, sum(subject._redis.zcard('{}:delayed'.format(partition_id)) for partition_id in range(2)))
 
 
 class RedisStateTest(TestCase):
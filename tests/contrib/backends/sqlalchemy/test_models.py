@@ -0,0 +1,56 @@
+from frontera.contrib.backends.sqlalchemy.components import Metadata
+from frontera.contrib.backends.sqlalchemy.migrate import migrate
+from frontera.contrib.backends.sqlalchemy.models import MetadataModel, QueueModel, PackedMetadataModel, \
+    PackedQueueModel, PackedRequest
+from frontera.core.models import Request, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from unittest import TestCase
+
+
+class TestPackedModels(TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.session_cls = sessionmaker()
+        self.session_cls.configure(bind=self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_metadata(self):
+        PackedMetadataModel.__table__.create(bind=self.engine)
+        metadata = Metadata(self.session_cls, PackedMetadataModel, 10)
+        assert metadata.table.name == 'packed_metadata'
+        request = Request('http://example.com/', headers={b'Accept': b'text/html'},
+                          meta={b'fingerprint': b'01', b'depth': 1})
+        metadata.add_seeds([request])
+        metadata.page_crawled(Response('http://example.com/', status_code=200, request=request))
+
+        session = self.session_cls()
+        page = session.query(PackedMetadataModel).one()
+        assert isinstance(page.request, PackedRequest)
+        assert page.status_code == '200'
+        assert page.request.request.url == 'http://example.com/'
+        assert page.request.request.headers == {b'Accept': b'text/html'}
+        assert page.request.request.meta[b'depth'] == 1
+        session.close()
+
+    def test_migrate(self):
+        MetadataModel.__table__.create(bind=self.engine)
+        QueueModel.__table__.create(bind=self.engine)
+        session = self.session_cls()
+        for i in range(5):
+            session.add(QueueModel(partition_id=0, score=0.1 * i, url='http://example.com/%d' % i,
+                                   fingerprint='%02d' % i, host_crc32=1, meta={b'fingerprint': b'%02d' % i},
+                                   headers={}, cookies={}, method='GET', created_at=i))
+        session.commit()
+        session.close()
+
+        migrate(self.engine, batch_size=2, drop_source=True)
+        assert set(self.engine.table_names()) == {'packed_metadata', 'packed_queue'}
+        session = self.session_cls()
+        rows = session.query(PackedQueueModel).order_by(PackedQueueModel.id).all()
+        assert [r.request.request.url for r in rows] == ['http://example.com/%d' % i for i in range(5)]
+        assert [r.fingerprint for r in rows] == ['%02d' % i for i in range(5)]
+        assert rows[3].request.request.meta == {b'fingerprint': b'03'}
+        session.close()
@@ -0,0 +1,69 @@
+from frontera.contrib.backends.sqlalchemy.components import Queue, BroadCrawlingQueue
+from frontera.contrib.backends.sqlalchemy.models import QueueModel, PackedQueueModel
+from frontera.core.components import States
+from frontera.core.models import Request
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from unittest import TestCase
+
+
+def make_batch(hosts, per_host):
+    batch = []
+    for h in range(hosts):
+        for i in range(per_host):
+            r = Request('http://host%d.com/page%d' % (h, i), meta={b'fingerprint': b'%02d%02d' % (h, i)})
+            batch.append((r.meta[b'fingerprint'], (i + 1) / 100.0, r, True))
+    return batch
+
+
+class TestSqlAlchemyQueue(TestCase):
+    model = QueueModel
+
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        self.session_cls = sessionmaker()
+        self.session_cls.configure(bind=self.engine)
+        self.model.__table__.create(bind=self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_get_next_requests(self):
+        queue = Queue(self.session_cls, self.model, 1)
+        queue.schedule(make_batch(2, 5))
+        requests = queue.get_next_requests(4, 0)
+        assert [r.url for r in requests] == ['http://host0.com/page0', 'http://host1.com/page0',
+                                             'http://host0.com/page1', 'http://host1.com/page1']
+        assert requests[0].meta[b'fingerprint'] == b'0000'
+        assert requests[0].meta[b'score'] == 0.01
+        assert queue.count() == 6
+
+    def test_max_requests_per_host(self):
+        queue = BroadCrawlingQueue(self.session_cls, self.model, 1)
+        queue.schedule(make_batch(5, 10))
+        requests = queue.get_next_requests(100, 0, min_requests=1, min_hosts=1, max_requests_per_host=3)
+        assert len(requests) == 15
+        urls = set(r.url for r in requests)
+        assert urls == set('http://host%d.com/page%d' % (h, i) for h in range(5) for i in range(3))
+        assert queue.count() == 35
+
+        requests = queue.get_next_requests(4, 0, min_requests=1, min_hosts=1, max_requests_per_host=3)
+        assert len(requests) == 4
+        assert queue.count() == 31
+
+
+class TestSqlAlchemyPackedQueue(TestSqlAlchemyQueue):
+    model = PackedQueueModel
+
+    def test_request_fields(self):
+        queue = Queue(self.session_cls, self.model, 1)
+        r = Request('http://example.com/', method=b'POST', headers={b'X-Test': b'1'}, cookies={b'session': b'abc'},
+                    meta={b'fingerprint': b'01', b'domain': {b'name': b'example.com'}})
+        queue.schedule([(b'01', 0.5, r, True)])
+        request, = queue.get_next_requests(10, 0)
+        assert request.url == 'http://example.com/'
+        assert request.method == b'POST'
+        assert request.headers == {b'X-Test': b'1'}
+        assert request.cookies == {b'session': b'abc'}
+        assert request.meta[b'domain'] == {b'name': b'example.com'}
+        assert request.meta[b'state'] == States.QUEUED
@@ -0,0 +1,99 @@
+from frontera.contrib.backends.sqlite import Database, SQLiteQueue, SQLiteMetadata, SQLiteDomainMetadata, \
+    SQLiteBackend
+from frontera.core.models import Request, Response
+from frontera.core.manager import LocalFrontierManager
+from frontera.settings import Settings
+from unittest import TestCase
+
+
+CODEC = 'frontera.contrib.backends.remote.codecs.msgpack'
+
+
+def make_batch(hosts, per_host):
+    batch = []
+    for h in range(hosts):
+        for i in range(per_host):
+            r = Request('http://host%d.com/page%d' % (h, i), meta={b'fingerprint': b'%02d%02d' % (h, i)})
+            batch.append((r.meta[b'fingerprint'], 1.0 - i / 100.0, r, True))
+    return batch
+
+
+class TestSQLiteQueue(TestCase):
+    def setUp(self):
+        self.db = Database(':memory:')
+        self.db.create_tables(SQLiteQueue.TABLES)
+        self.queue = SQLiteQueue(self.db, 1, CODEC)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_get_next_requests(self):
+        self.queue.schedule(make_batch(2, 5))
+        requests = self.queue.get_next_requests(4, 0)
+        assert [r.url for r in requests] == ['http://host0.com/page4', 'http://host1.com/page4',
+                                             'http://host0.com/page3', 'http://host1.com/page3']
+        assert requests[0].meta[b'fingerprint'] == b'0004'
+        assert requests[0].meta[b'score'] == 0.96
+        assert self.queue.count() == 6
+
+    def test_max_requests_per_host(self):
+        self.queue.schedule(make_batch(5, 10))
+        requests = self.queue.get_next_requests(100, 0, max_requests_per_host=3)
+        assert set(r.url for r in requests) == set('http://host%d.com/page%d' % (h, i)
+                                                   for h in range(5) for i in range(7, 10))
+        assert self.queue.count() == 35
+
+
+class TestSQLiteMetadata(TestCase):
+    def setUp(self):
+        self.db = Database(':memory:')
+        self.db.create_tables(SQLiteMetadata.TABLES + SQLiteDomainMetadata.TABLES)
+
+    def tearDown(self):
+        self.db.close()
+
+    def _rows(self):
+        return self.db.connection.execute('SELECT fingerprint, url, status_code, error, score FROM metadata '
+                                          'ORDER BY fingerprint').fetchall()
+
+    def test_metadata(self):
+        metadata = SQLiteMetadata(self.db, CODEC)
+        r1 = Request('http://example.com/1', meta={b'fingerprint': b'01'})
+        r2 = Request('http://example.com/2', meta={b'fingerprint': b'02'})
+        r3 = Request('http://example.com/3', meta={b'fingerprint': b'03'})
+        metadata.add_seeds([r1])
+        metadata.links_extracted(r1, [r1, r2])
+        metadata.page_crawled(Response(r1.url, status_code=200, request=r1))
+        metadata.request_error(r3, 'DNS_ERROR')
+        metadata.update_score([(b'02', 0.5, r2, False)])
+        assert self._rows() == [(b'01', 'http://example.com/1', 200, None, None),
+                                (b'02', 'http://example.com/2', None, None, 0.5),
+                                (b'03', 'http://example.com/3', None, 'DNS_ERROR', None)]
+
+    def test_domain_metadata(self):
+        dm = SQLiteDomainMetadata(self.db)
+        value = {"someint": 1, "somefloat": 1.5, "someblob": b"bytes"}
+        dm["test"] = value
+        assert "test" in dm
+        assert dm["test"] == value
+        del dm["test"]
+        assert "test" not in dm
+        with self.assertRaises(KeyError):
+            dm["test"]
+
+
+class TestSQLiteBackend(TestCase):
+    def test_local(self):
+        settings = Settings()
+        settings.BACKEND = 'frontera.contrib.backends.sqlite.SQLiteBackend'
+        manager = LocalFrontierManager.from_settings(settings)
+        backend = manager.backend
+        assert isinstance(backend, SQLiteBackend)
+        r = Request('http://example.com/', meta={b'fingerprint': b'01'})
+        backend.queue.schedule([(b'01', 1.0, r, True)])
+        assert [x.url for x in backend.get_next_requests(10, partitions=[0])] == ['http://example.com/']
+        backend.queue.schedule(make_batch(1, 3))
+        assert len(backend.get_next_requests(10, partitions=[0], max_requests_per_host=1)) == 1
+        backend.domain_metadata['example.com'] = {'crawled': 1}
+        assert backend.domain_metadata['example.com'] == {'crawled': 1}
+        manager.stop()
@@ -1,11 +1,13 @@
 import pytest
+from time import time
 from frontera.core.components import States
 from frontera.core.models import Request
 from happybase import Connection
 from frontera.contrib.backends.hbase import HBaseState, HBaseQueue
 from frontera.contrib.backends.sqlalchemy import States as SQLAlchemyStates, Queue as SQLAlchemyQueue
-from frontera.contrib.backends.sqlalchemy.models import StateModel, QueueModel
+from frontera.contrib.backends.sqlalchemy.models import StateModel, QueueModel, QueueCountModel
 from frontera.contrib.backends.memory import MemoryStates, MemoryQueue
+from frontera.contrib.backends.sqlite import Database, SQLiteStates, SQLiteQueue
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
@@ -29,7 +31,7 @@ def get_hbase_connection():
     return hbase_connection
 
 
-@pytest.fixture(scope="module", params=["memory", "sqlalchemy", "hbase"])
+@pytest.fixture(scope="module", params=["memory", "sqlalchemy", "sqlite", "hbase"])
 def states(request):
     if request.param == "memory":
         ms = MemoryStates(100)
@@ -47,6 +49,15 @@ def states(request):
         engine.dispose()
         return
 
+    if request.param == "sqlite":
+        db = Database(':memory:')
+        db.create_tables(SQLiteStates.TABLES)
+        sqlite_states = SQLiteStates(db, 100)
+        yield sqlite_states
+        sqlite_states.frontier_stop()
+        db.close()
+        return
+
     if request.param == "hbase":
         conn = get_hbase_connection()
         states = HBaseState(conn, b'states', cache_size_limit=300000,
@@ -80,7 +91,7 @@ def test_states(states):
     assert r2.meta[b'state'] == States.ERROR
 
 
-@pytest.fixture(scope="module", params=["memory", "sqlalchemy", "hbase"])
+@pytest.fixture(scope="module", params=["memory", "sqlalchemy", "sqlite", "hbase", "hbase_binary"])
 def queue(request):
     if request.param == "memory":
         mq = MemoryQueue(2)
@@ -92,18 +103,35 @@ def queue(request):
         session_cls = sessionmaker()
         session_cls.configure(bind=engine)
         QueueModel.__table__.create(bind=engine)
-        sqla_queue = SQLAlchemyQueue(session_cls, QueueModel, 2)
+        QueueCountModel.__table__.create(bind=engine)
+        sqla_queue = SQLAlchemyQueue(session_cls, QueueModel, 2, counts_cls=QueueCountModel)
         yield sqla_queue
         sqla_queue.frontier_stop()
         engine.dispose()
         return
 
+    if request.param == "sqlite":
+        db = Database(':memory:')
+        db.create_tables(SQLiteQueue.TABLES)
+        sqlite_queue = SQLiteQueue(db, 2, 'frontera.contrib.backends.remote.codecs.msgpack')
+        yield sqlite_queue
+        sqlite_queue.frontier_stop()
+        db.close()
+        return
+
     if request.param == "hbase":
         conn = get_hbase_connection()
         hq = HBaseQueue(conn, 2, b'queue')
         yield hq
         hq.frontier_stop()
         return
+
+    if request.param == "hbase_binary":
+        conn = get_hbase_connection()
+        hq = HBaseQueue(conn, 2, b'queue_binary', drop=True, binary_keys=True)
+        yield hq
+        hq.frontier_stop()
+        return
     raise KeyError("Unknown backend param")
 
 
@@ -114,4 +142,41 @@ def test_queue(queue):
     assert set([r.url for r in queue.get_next_requests(10, 0, min_requests=3, min_hosts=1,
                                                        max_requests_per_host=10)]) == set([r3.url])
     assert set([r.url for r in queue.get_next_requests(10, 1, min_requests=3, min_hosts=1,
-                                                       max_requests_per_host=10)]) == set([r1.url, r2.url])
\ No newline at end of file
+                                                       max_requests_per_host=10)]) == set([r1.url, r2.url])
+
+
+def test_queue_evict(queue):
+    batch = [('10', 0.5, r1, True), ('11', 0.6, r2, True)]
+    queue.schedule(batch)
+    assert queue.evict(1, capacity=2) == []
+    assert queue.evict(1, capacity=1) == [b'10']
+    assert queue.evict(1, ttl=0) == [b'11']
+    assert queue.get_next_requests(10, 1, min_requests=3, min_hosts=1, max_requests_per_host=10) == []
+
+
+def test_queue_counts(queue):
+    batch = [('10', 0.5, r1, True), ('11', 0.6, r2, True),
+             ('12', 0.7, r3, True)]
+    queue.schedule(batch)
+    assert queue.partition_counts() == {0: 1, 1: 2}
+    assert queue.count() == 3
+    queue.get_next_requests(10, 0, min_requests=3, min_hosts=1, max_requests_per_host=10)
+    queue.evict(1, capacity=1)
+    assert queue.partition_counts() == {0: 0, 1: 1}
+    queue.get_next_requests(10, 1, min_requests=3, min_hosts=1, max_requests_per_host=10)
+    assert queue.count() == 0
+
+
+def test_memory_queue_delayed():
+    mq = MemoryQueue(1)
+    now = time()
+    delayed, due = r1.copy(), r2.copy()
+    delayed.meta[b'crawl_at'] = now + 100
+    due.meta[b'crawl_at'] = now - 10
+    mq.schedule([(b'10', 0.5, delayed, True), (b'11', 0.6, due, True)])
+    assert mq.count() == 2
+    assert [r.url for r in mq.get_next_requests(10, 0)] == [r2.url]
+    assert mq.get_next_requests(10, 0) == []
+    mq._release_delayed(0, now + 100)
+    assert [r.url for r in mq.get_next_requests(10, 0)] == [r1.url]
+    assert mq.count() == 0
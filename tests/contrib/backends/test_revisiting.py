@@ -0,0 +1,68 @@
+from frontera.contrib.backends.memory import MemoryQueue
+from frontera.contrib.backends.revisiting import RevisitingQueue
+from frontera.core.models import Request
+from frontera.settings import Settings
+from unittest import TestCase
+
+
+def make_request(url, fingerprint, interval=None):
+    meta = {b'fingerprint': fingerprint}
+    if interval is not None:
+        meta[b'revisit_interval'] = interval
+    return Request(url, meta=meta)
+
+
+class TestRevisitingQueue(TestCase):
+    def setUp(self):
+        self.queue = RevisitingQueue(MemoryQueue(1), default_interval=None, resolution=1.0, slots=4, levels=2)
+
+    def test_from_settings(self):
+        settings = Settings()
+        queue = MemoryQueue(1)
+        assert RevisitingQueue.from_settings(queue, settings) is queue
+        settings.set('REVISITING_ENABLED', True)
+        settings.set('REVISITING_DEFAULT_INTERVAL', 60)
+        revisiting = RevisitingQueue.from_settings(queue, settings)
+        assert revisiting.queue is queue
+        assert revisiting.default_interval == 60
+
+    def test_revisit(self):
+        r1 = make_request('http://example.com/1', b'01', interval=10)
+        r2 = make_request('http://example.com/2', b'02')
+        self.queue.schedule([(b'01', 0.5, r1, True), (b'02', 0.6, r2, True)])
+        assert len(self.queue.get_next_requests(10, 0)) == 2
+        assert self.queue.count() == 1
+        start = self.queue.wheel.start
+        assert self.queue.release(start + 5) == 0
+        assert self.queue.release(start + 12) == 1
+        requests = self.queue.get_next_requests(10, 0)
+        assert [r.url for r in requests] == ['http://example.com/1']
+        assert requests[0].meta[b'score'] == 0.5
+        assert self.queue.count() == 1
+
+    def test_stop_revisiting(self):
+        r1 = make_request('http://example.com/1', b'01', interval=10)
+        self.queue.schedule([(b'01', 0.5, r1, True)])
+        self.queue.get_next_requests(10, 0)
+        assert self.queue.count() == 1
+        r1 = make_request('http://example.com/1', b'01', interval=0)
+        self.queue.schedule([(b'01', 0.5, r1, True)])
+        self.queue.get_next_requests(10, 0)
+        assert self.queue.count() == 0
+        assert self.queue.release(self.queue.wheel.start + 100) == 0
+
+    def test_reschedule_pending(self):
+        r1 = make_request('http://example.com/1', b'01', interval=10)
+        self.queue.schedule([(b'01', 0.5, r1, True)])
+        self.queue.get_next_requests(10, 0)
+        assert isinstance(self.queue.pending[b'01'][1], bytes)
+        # scheduled again before revisit, the request is returned only once
+        r1 = make_request('http://example.com/1', b'01', interval=10)
+        self.queue.schedule([(b'01', 0.7, r1, True)])
+        assert b'01' not in self.queue.wheel
+        assert self.queue.release(self.queue.wheel.start + 100) == 0
+        assert len(self.queue.get_next_requests(10, 0)) == 1
+        assert self.queue.release(self.queue.wheel.start + 200) == 1
+        requests = self.queue.get_next_requests(10, 0)
+        assert [r.meta[b'score'] for r in requests] == [0.7]
+        assert self.queue.count() == 1
@@ -67,11 +67,18 @@ class FakeQueue(Queue):
     def count(self):
         return len(self.requests)
 
+    def partition_counts(self):
+        return {0: len(self.requests)}
+
     def schedule(self, batch):
         for fingerprint, score, request, is_schedule in batch:
             if is_schedule:
                 self.requests.append(request)
 
+    def evict(self, partition_id, capacity=None, ttl=None):
+        evicted, self.requests = self.requests[capacity:], self.requests[:capacity]
+        return [request.meta[b'fingerprint'] for request in evicted]
+
 
 class FakeBackend(FakeMiddleware, Backend):
 
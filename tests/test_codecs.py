@@ -6,7 +6,12 @@ import unittest
 from frontera.contrib.backends.remote.codecs.json import (Encoder as JsonEncoder, Decoder as JsonDecoder,
                                                           _convert_and_save_type, _convert_from_saved_type)
 from frontera.contrib.backends.remote.codecs.msgpack import Encoder as MsgPackEncoder, Decoder as MsgPackDecoder
+from frontera.contrib.backends.remote.codecs.compact import Encoder as CompactEncoder, Decoder as CompactDecoder
+from frontera.contrib.backends.remote.codecs.fastjson import Encoder as FastJsonEncoder, Decoder as FastJsonDecoder
+from frontera.contrib.backends.remote.codecs.passthrough import (Encoder as PassthroughEncoder,
+                                                                 Decoder as PassthroughDecoder)
 from frontera.core.models import Request, Response
+from msgpack import packb
 import pytest
 
 
@@ -43,6 +48,9 @@ def _compare_dicts(dict1, dict2):
 @pytest.mark.parametrize(
     ('encoder', 'decoder', 'invalid_value'), [
         (MsgPackEncoder, MsgPackDecoder, b'\x91\xc4\x04test'),
+        (CompactEncoder, CompactDecoder, b'\x91\xc4\x04test'),
+        (FastJsonEncoder, FastJsonDecoder, b'["test"]'),
+        (PassthroughEncoder, PassthroughDecoder, b'["test"]'),
         (JsonEncoder, JsonDecoder, b'["dict", [[["bytes", "type"], ["bytes", "test"]]]]')
     ]
 )
@@ -68,6 +76,7 @@ def test_codec(encoder, decoder, send_body, invalid_value):
         enc.encode_offset(0, 28796),
         enc.encode_request(req),
         enc.encode_stats(stats),
+        enc.encode_requests_evicted([b'0' * 40, b'1' * 40]),
         invalid_value,
     ]
 
@@ -118,10 +127,131 @@ def test_codec(encoder, decoder, send_body, invalid_value):
     assert o_type == 'stats'
     assert stats == stats
 
+    o_type, fingerprints = dec.decode(next(it))
+    assert o_type == 'requests_evicted'
+    assert list(fingerprints) == [b'0' * 40, b'1' * 40]
+
     with pytest.raises(TypeError):
         dec.decode(next(it))
 
 
+def test_msgpack_codec_default_hook():
+    class Slot(object):
+        def __init__(self):
+            self.name = b'example.com'
+
+    enc = MsgPackEncoder(Request)
+    dec = MsgPackDecoder(Request, Response)
+    req = Request(url="http://www.example.com", meta={b'tags': set([b'a']), b'slot': Slot(), b'func': len})
+    o = dec.decode_request(enc.encode_request(req))
+    assert o.meta == {b'tags': [b'a'], b'slot': {'name': b'example.com'}, b'func': None}
+    o = dec.decode(enc.encode_page_crawled(Response(url=req.url, request=req)))[1]
+    assert o.meta[b'tags'] == [b'a']
+
+
+@pytest.mark.parametrize(('encoder', 'decoder'), [
+    (MsgPackEncoder, MsgPackDecoder),
+    (JsonEncoder, JsonDecoder),
+    (CompactEncoder, CompactDecoder),
+    (FastJsonEncoder, FastJsonDecoder),
+    (PassthroughEncoder, PassthroughDecoder)
+])
+def test_codec_batch(encoder, decoder):
+    enc = encoder(Request)
+    dec = decoder(Request, Response)
+    reqs = [Request(url="http://www.example.com/%d" % i, meta={b'fingerprint': b'%d' % i}) for i in range(3)]
+    msgs = [enc.encode_update_score(r, 0.5, True) for r in reqs] + [enc.encode_new_job_id(2)]
+
+    events = list(dec.decode_messages(enc.encode_batch(msgs)))
+    assert [e[0] for e in events] == ['update_score'] * 3 + ['new_job_id']
+    assert [e[1].url for e in events[:3]] == [r.url for r in reqs]
+    assert events[0][1].meta == reqs[0].meta and events[0][2] == 0.5 and events[0][3] is True
+    assert events[3][1] == 2
+
+    # single messages are decoded as well
+    events = list(dec.decode_messages(msgs[0]))
+    assert len(events) == 1 and events[0][0] == 'update_score' and events[0][1].url == reqs[0].url
+
+
+@pytest.mark.parametrize(('encoder', 'decoder', 'corrupt'), [
+    (MsgPackEncoder, MsgPackDecoder, packb([b'xx'])),
+    (JsonEncoder, JsonDecoder, '["dict", ['),
+    (CompactEncoder, CompactDecoder, packb([b'xx'])),
+    (FastJsonEncoder, FastJsonDecoder, b'["us", {}'),
+    (PassthroughEncoder, PassthroughDecoder, 'xx')
+])
+def test_codec_batch_corrupt_message(encoder, decoder, corrupt):
+    enc = encoder(Request)
+    dec = decoder(Request, Response)
+    msgs = [enc.encode_new_job_id(1), corrupt, enc.encode_new_job_id(2)]
+
+    # the rest of the batch is decoded
+    events = list(dec.decode_messages(enc.encode_batch(msgs)))
+    assert events == [('new_job_id', 1), ('new_job_id', 2)]
+
+    # corrupt single message raises, to be handled by consumer
+    with pytest.raises(Exception):
+        list(dec.decode_messages(corrupt))
+
+
+def test_compact_codec():
+    enc = CompactEncoder(Request)
+    dec = CompactDecoder(Request, Response)
+    fprint = b'60d846bc2969e9706829d5f1690f11dafb70ed18'
+    domain = {b'name': b'example.com', b'fingerprint': b'5bab61eb53176449e25c2c82f172b82cb13ffb9d',
+              b'netloc': b'www.example.com', b'scheme': b'http', b'sld': b'', b'tld': b'', b'subdomain': b''}
+    req = Request(url="http://www.example.com/", method=b'POST', headers={b'Referer': b'http://example.com/',
+                  b'X-Custom': b'1'}, meta={b'fingerprint': fprint, b'domain': domain, b'score': 0.5})
+    encoded = enc.encode_update_score(req, 0.5, True)
+    assert len(encoded) < len(MsgPackEncoder(Request).encode_update_score(req, 0.5, True))
+    assert fprint not in encoded and b'Referer' not in encoded and b'netloc' not in encoded
+
+    _, o, score, schedule = dec.decode(encoded)
+    assert (o.url, o.method, o.headers) == (req.url, req.method, req.headers)
+    assert o.meta == {b'fingerprint': fprint, b'score': 0.5,
+                      b'domain': {b'name': b'example.com', b'fingerprint': domain[b'fingerprint']}}
+    assert req.meta[b'domain'] is domain and len(domain) == 7
+
+    # fingerprints which aren't lower case hex strings and custom domain fields are kept as is
+    req = Request(url="http://www.example.com/", meta={b'fingerprint': fprint.upper(),
+                                                       b'domain': {b'name': b'example.com', b'custom': 1}})
+    o = dec.decode_request(enc.encode_request(req))
+    assert o.meta == req.meta
+
+
+def test_compact_codec_profiles():
+    enc = CompactEncoder(Request)
+    dec = CompactDecoder(Request, Response)
+    headers = {b'Accept-Language': b'en-US,en', b'X-Profile': b'common'}
+    links = [Request(url="http://www.example.com/%d" % i, headers=dict(headers), cookies={b'session': b'abc'})
+             for i in range(10)]
+    links.append(Request(url="http://www.example.com/other", headers={b'X-Profile': b'other'}))
+    encoded = enc.encode_links_extracted(Request(url="http://www.example.com/", headers=headers), links)
+    assert encoded.count(b'common') == 2 and encoded.count(b'abc') == 1
+
+    _, request, decoded = dec.decode(encoded)
+    assert request.headers == headers
+    assert [(o.url, o.headers, o.cookies) for o in decoded] == [(r.url, r.headers, r.cookies) for r in links]
+    assert decoded[0].headers is not decoded[1].headers and decoded[0].cookies is not decoded[1].cookies
+
+
+def test_fastjson_codec_types():
+    enc = FastJsonEncoder(Request, send_body=True)
+    dec = FastJsonDecoder(Request, Response)
+    meta = {b'bytes': b'value', 'text': u'value', b'binary': b'\xff\xfe', b'tagged': b'\x00value', 1: None,
+            b'nested': {b'list': [b'a', u'b', 1, 0.5, True, None], 'empty': b''}}
+    req = Request(url="http://www.example.com/", meta={b'scrapy_meta': meta})
+    o = dec.decode_request(enc.encode_request(req))
+    assert o.meta == req.meta
+
+    body = b'<html>\xd0\xbf\xd1\x80\xd0\xb8\xd0\xb2\xd0\xb5\xd1\x82</html>'
+    encoded = enc.encode_page_crawled(Response(url=req.url, body=body, request=req))
+    assert b'<html>' in encoded
+    assert dec.decode(encoded)[1].body == body
+    assert dec.decode(enc.encode_page_crawled(Response(url=req.url, body=b'\x89PNG', request=req)))[1].body == \
+        b'\x89PNG'
+
+
 class TestEncodeDecodeJson(unittest.TestCase):
     """
     Test for testing methods `_encode_recursively` and `_decode_recursively` used in json codec
@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+from frontera.core.politeness import PolitenessBuffer, TokenBucket, parse_crawl_delay
+from frontera.core.models import Request
+from time import time
+
+
+ROBOTS = """
+User-agent: somebot
+Crawl-delay: 20
+Disallow: /private
+
+User-agent: *
+Crawl-delay: 5 # be nice
+Disallow: /tmp
+"""
+
+
+class SuffixList(object):
+    def get_public_suffix(self, hostname):
+        return '.'.join(hostname.split('.')[-3:])
+
+
+def make_queue(queue):
+    def get(max_n_requests, **kwargs):
+        batch = queue[:max_n_requests]
+        del queue[:max_n_requests]
+        return batch
+    return get
+
+
+def make_request(host, i):
+    return Request('http://%s/%d' % (host, i), meta={b'fingerprint': b'%s-%d' % (host.encode(), i),
+                                                     b'domain': {b'name': host}})
+
+
+class TestPoliteness(object):
+
+    def test_parse_crawl_delay(self):
+        assert parse_crawl_delay(ROBOTS) == 5.0
+        assert parse_crawl_delay(ROBOTS, 'SomeBot') == 20.0
+        assert parse_crawl_delay("User-agent: *\nDisallow: /") is None
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(0.5, 2.0, 0.0)
+        assert bucket.consume(0.0)
+        assert bucket.consume(0.0)
+        assert not bucket.consume(1.0)
+        assert bucket.consume(2.0)
+
+    def test_buffer(self):
+        queue = [make_request('a.com', i) for i in range(5)] + [make_request('b.com', i) for i in range(5)] + \
+            [make_request('c.com', i) for i in range(5)]
+        rescheduled = []
+
+        def get(max_n_requests, **kwargs):
+            assert kwargs['partitions'] == [0]
+            batch = queue[:max_n_requests]
+            del queue[:max_n_requests]
+            return batch
+
+        domain_metadata = {'a.com': {'crawl_delay': 1.0}, 'b.com': {'rp_body': ROBOTS}}
+        buffer = PolitenessBuffer(get, rescheduled.extend, domain_metadata, default_delay=100.0, horizon=10.0,
+                                  max_per_key=2)
+        requests = buffer.get_next_requests(15, 0)
+        # 10 requests per 10 seconds for a.com, 2 for b.com and 1 for c.com
+        assert [r.url for r in requests] == ['http://a.com/%d' % i for i in range(5)] + \
+            ['http://b.com/0', 'http://b.com/1', 'http://c.com/0']
+        assert buffer.get_pending_count() == 4
+        assert [r.url for r in rescheduled] == ['http://b.com/4', 'http://c.com/3', 'http://c.com/4']
+        assert buffer.get_next_requests(15, 0) == []
+
+    def test_rescheduled_delay(self):
+        rescheduled = []
+        buffer = PolitenessBuffer(make_queue([make_request('a.com', i) for i in range(4)]), rescheduled.extend, {},
+                                  default_delay=10.0, horizon=10.0, max_per_key=2)
+        now = time()
+        assert len(buffer.get_next_requests(10, 0)) == 1
+        # the only rescheduled request is due after two held ones
+        assert [r.url for r in rescheduled] == ['http://a.com/3']
+        assert now + 29 <= rescheduled[0].meta[b'crawl_at'] <= now + 32
+
+    def test_max_pending(self):
+        rescheduled = []
+        queue = [make_request('%s.com' % host, i) for host in 'abc' for i in range(3)]
+        buffer = PolitenessBuffer(make_queue(queue), rescheduled.extend, {}, default_delay=10.0, horizon=10.0,
+                                  max_per_key=None, max_pending=3)
+        assert len(buffer.get_next_requests(10, 0)) == 3
+        assert buffer.get_pending_count() == 3
+        assert [r.url for r in rescheduled] == ['http://b.com/2', 'http://c.com/1', 'http://c.com/2']
+
+    def test_flush(self):
+        rescheduled = []
+        buffer = PolitenessBuffer(make_queue([make_request('a.com', i) for i in range(3)]), rescheduled.extend, {},
+                                  default_delay=10.0, horizon=10.0, max_per_key=None)
+        buffer.get_next_requests(10, 0)
+        buffer.flush()
+        assert [r.url for r in rescheduled] == ['http://a.com/1', 'http://a.com/2']
+        assert buffer.get_pending_count() == 0
+        assert buffer.get_next_requests(10, 0) == []
+
+    def test_delay_ttl(self):
+        domain_metadata = {}
+        buffer = PolitenessBuffer(make_queue([]), [].extend, domain_metadata, default_delay=1.0, horizon=10.0,
+                                  max_per_key=None, delay_ttl=60.0)
+        assert buffer._get_bucket('a.com', 0.0).rate == 1.0
+        domain_metadata['a.com'] = {'crawl_delay': 5.0}
+        assert buffer._get_bucket('a.com', 30.0).rate == 1.0
+        bucket = buffer._get_bucket('a.com', 61.0)
+        assert bucket.rate == 0.2 and bucket.capacity == 2.0
+
+    def test_domain_key(self):
+        suffix_list = SuffixList()
+        domain_metadata = {'example.co.uk': {'crawl_delay': 5.0}}
+        buffer = PolitenessBuffer(make_queue([]), [].extend, domain_metadata, default_delay=1.0, horizon=10.0,
+                                  max_per_key=None, suffix_list=suffix_list)
+        request = make_request('www.example.co.uk', 0)
+        assert buffer._get_key(request) == 'example.co.uk'
+        assert buffer.get_delay(buffer._get_key(request)) == 5.0
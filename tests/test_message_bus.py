@@ -2,10 +2,14 @@
 from __future__ import absolute_import
 from frontera.settings import Settings
 from frontera.contrib.messagebus.zeromq import MessageBus as ZeroMQMessageBus
-from frontera.contrib.messagebus.kafkabus import MessageBus as KafkaMessageBus
+from frontera.contrib.messagebus.kafkabus import MessageBus as KafkaMessageBus, Consumer as KafkaConsumer, \
+    PartitionLagMonitor, SpiderFeedStream as KafkaSpiderFeedStream, SpiderFeedProducer as KafkaSpiderFeedProducer
+from frontera.contrib.messagebus.memory import MessageBus as MemoryMessageBus
+from frontera.contrib.backends.partitioners import Crc32NamePartitioner
 from frontera.utils.fingerprint import sha1
 from flaky import flaky
-from kafka import KafkaClient
+from kafka import KafkaClient, TopicPartition
+from collections import namedtuple
 from random import randint
 from time import sleep
 from six.moves import range
@@ -117,6 +121,139 @@ class KafkaConsumerPolling(object):
 
 
 
+class FakeKafkaConsumer(object):
+    """
+    Returns fetched batches of records by poll, empty batch means nothing is fetched before timeout.
+    """
+    Record = namedtuple('Record', 'value')
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.polls = []
+
+    def poll(self, timeout_ms=0, max_records=None):
+        self.polls.append((timeout_ms, max_records))
+        if not self.batches or not self.batches[0]:
+            self.batches = self.batches[1:]
+            return {}
+        records, self.batches[0] = self.batches[0][:max_records], self.batches[0][max_records:]
+        if not self.batches[0]:
+            self.batches.pop(0)
+        return {TopicPartition('topic', 0): [self.Record(value) for value in records]}
+
+
+def test_kafka_consumer_poll():
+    consumer = KafkaConsumer.__new__(KafkaConsumer)
+    consumer._consumer = FakeKafkaConsumer([[b'a', b'b'], [b'c'], [b'd']])
+    assert consumer.get_messages(timeout=1.0, count=10) == [b'a', b'b', b'c', b'd']
+    # the first poll waits for records up to timeout, others take already fetched ones
+    assert 900 < consumer._consumer.polls[0][0] <= 1000
+    assert consumer._consumer.polls[1:] == [(0, 8), (0, 7), (0, 6)]
+
+    consumer._consumer = FakeKafkaConsumer([[b'a', b'b', b'c']])
+    assert consumer.get_messages(timeout=1.0, count=2) == [b'a', b'b']
+    assert consumer.get_messages(timeout=1.0, count=2) == [b'c']
+
+    consumer._consumer = FakeKafkaConsumer([[], [], [b'a']])
+    assert consumer.get_messages(timeout=1.0, count=2) == [b'a']
+    consumer._consumer = FakeKafkaConsumer([])
+    assert consumer.get_messages(timeout=0.01, count=2) == []
+
+
+class FakeKafkaProducer(object):
+    def __init__(self):
+        self.sent = []
+
+    def send(self, topic, key=None, value=None):
+        self.sent.append((topic, key, value))
+
+
+class FakeOffsetsFetcher(object):
+    def __init__(self, lags):
+        self.lags = lags
+        self.calls = 0
+
+    def get(self):
+        self.calls += 1
+        return dict(self.lags)
+
+
+def test_kafka_partition_lag_monitor():
+    fetcher = FakeOffsetsFetcher({0: 10, 1: 0})
+    monitor = PartitionLagMonitor(fetcher, 0.05)
+    try:
+        # the first snapshot is awaited, later ones are served from cache
+        assert monitor.get(timeout=1.0) == {0: 10, 1: 0}
+        calls = fetcher.calls
+        assert monitor.get(timeout=1.0) == {0: 10, 1: 0}
+        fetcher.lags = {0: 5, 1: 20}
+        sleep(0.2)
+        assert fetcher.calls > calls
+        assert monitor.get(timeout=1.0) == {0: 5, 1: 20}
+    finally:
+        monitor.close()
+
+    # sent messages are added to the snapshot, until the next one
+    fetcher = FakeOffsetsFetcher({0: 0, 1: 0})
+    monitor = PartitionLagMonitor(fetcher, 10.0)
+    try:
+        assert monitor.get(timeout=1.0) == {0: 0, 1: 0}
+        monitor.add(0, 64)
+        monitor.add(0, 64)
+        assert monitor.get(timeout=1.0) == {0: 128, 1: 0}
+        fetcher.lags = {0: 100, 1: 0}
+        monitor._refresh()
+        assert monitor.get(timeout=1.0) == {0: 100, 1: 0}
+
+        # messages sent while offsets are fetched are kept too
+        fetcher.get = lambda: monitor.add(1, 10) or {0: 100, 1: 0}
+        monitor._refresh()
+        assert monitor.get(timeout=1.0) == {0: 100, 1: 10}
+    finally:
+        monitor.close()
+
+    # without interval lags are fetched on every call
+    fetcher = FakeOffsetsFetcher({0: 1})
+    monitor = PartitionLagMonitor(fetcher, 0)
+    assert monitor.get() == {0: 1} and monitor.get() == {0: 1}
+    assert fetcher.calls == 2
+
+
+def test_kafka_spider_feed_producer_lags():
+    messagebus = KafkaMessageBus(Settings())
+    producer = KafkaSpiderFeedProducer.__new__(KafkaSpiderFeedProducer)
+    producer._producer = FakeKafkaProducer()
+    producer._topic_done = 'frontier-todo'
+    producer._partitioner = Crc32NamePartitioner([0, 1])
+    producer._messagebus = messagebus
+    # lags aren't tracked until lag monitor is started
+    producer.send(b'example.com', b'1')
+    messagebus.lag_monitor = PartitionLagMonitor(FakeOffsetsFetcher({0: 0, 1: 0}), 10.0)
+    try:
+        messagebus.lag_monitor.get(timeout=1.0)
+        partition = producer._partitioner.partition(b'example.com')
+        producer.send(b'example.com', b'1', b'2')
+        assert len(producer._producer.sent) == 3
+        assert messagebus.lag_monitor.get()[partition] == 2
+    finally:
+        messagebus.close()
+    assert messagebus.lag_monitor is None
+
+
+def test_kafka_spider_feed_available_partitions():
+    settings = Settings()
+    settings.set('MAX_NEXT_REQUESTS', 256)
+    messagebus = KafkaMessageBus(settings)
+    # streams don't start lag monitor until lags are needed
+    spider_feed = messagebus.spider_feed()
+    assert messagebus.lag_monitor is None
+    messagebus.lag_monitor = PartitionLagMonitor(FakeOffsetsFetcher({0: 30, 1: 256, 2: 0, 3: 30, 4: 5}), 0)
+    assert spider_feed.available_partitions() == [2, 4, 0, 3]
+    # monitor is shared by all streams of message bus
+    assert messagebus.spider_feed().available_partitions() == [2, 4, 0, 3]
+    assert messagebus.get_lag_monitor() is messagebus.lag_monitor
+
+
 class KafkaMessageBusTest(unittest.TestCase):
     def setUp(self):
         logging.basicConfig()
@@ -245,3 +382,116 @@ def test_zmq_message_bus():
     assert tester.sw_activity() == 64
     assert tester.db_activity(128) == (64, 32)
     assert tester.spider_feed_activity() == 128
+
+
+@flaky
+def test_zmq_message_bus_compression():
+    settings = Settings()
+    settings.set('ZMQ_COMPRESSION', 'zlib')
+    settings.set('ZMQ_COMPRESSION_MIN_SIZE', 0)
+    tester = MessageBusTester(ZeroMQMessageBus, settings)
+    tester.spider_log_activity(64)
+    assert tester.sw_activity() == 64
+    assert tester.db_activity(128) == (64, 32)
+    assert tester.spider_feed_activity() == 128
+    stats = tester.messagebus.context.stats
+    producer_key, consumer_key = tester.sp_sl_p.stat_key, tester.sw_sl_c.stat_key
+    assert stats[producer_key + '-compression-ratio'] > 0 and stats[producer_key + '-raw-bytes'] > 0
+    assert stats[consumer_key + '-decompression-time'] >= 0
+
+
+@flaky
+def test_zmq_message_bus_threaded_broker():
+    # broker depends on tornado, which isn't required by other tests
+    from frontera.contrib.messagebus.zeromq.broker import ThreadedServer
+    server = ThreadedServer('127.0.0.1', 5600)
+    server.start_proxies()
+    try:
+        settings = Settings()
+        settings.set('ZMQ_BASE_PORT', 5600)
+        # proxies relay every message as soon as it arrives, so bursts of spider feed shouldn't hit high water mark
+        # while producer is waiting for CPU
+        settings.set('MAX_NEXT_REQUESTS', 256)
+        tester = MessageBusTester(ZeroMQMessageBus, settings)
+        tester.spider_log_activity(64)
+        assert tester.sw_activity() == 64
+        assert tester.db_activity(128) == (64, 32)
+        assert tester.spider_feed_activity() == 128
+        stats = server.get_stats()
+        assert stats['spiders_out_recvd'] > 0 and stats['sw_out_recvd'] > 0 and stats['db_out_recvd'] > 0
+    finally:
+        server.stop()
+
+
+def test_memory_message_bus():
+    settings = Settings()
+    for topic in ['SPIDER_LOG_TOPIC', 'SPIDER_FEED_TOPIC', 'SCORING_LOG_TOPIC', 'STATS_LOG_TOPIC']:
+        settings.set(topic, 'test-memory-%s' % topic)
+    tester = MessageBusTester(MemoryMessageBus, settings)
+    tester.spider_log_activity(64)
+    assert tester.sw_activity() == 64
+    assert tester.db_activity(128) == (64, 32)
+    assert tester.db_sf_p.get_offset(0) == 128
+    assert tester.spider_feed_activity() == 128
+    assert tester.sp_sf_c.get_offset(0) == 128
+
+    spider_feed = tester.messagebus.spider_feed()
+    spider_feed.mark_busy(0)
+    assert list(spider_feed.available_partitions()) == []
+    spider_feed.mark_ready(0)
+    assert list(tester.messagebus.spider_feed().available_partitions()) == [0]
+
+
+def test_memory_message_bus_groups():
+    settings = Settings()
+    settings.set('SPIDER_LOG_TOPIC', 'test-memory-groups')
+    settings.set('SPIDER_LOG_PARTITIONS', 2)
+    spider_log = MemoryMessageBus(settings).spider_log()
+    producer = spider_log.producer()
+    # messages sent before consumers are created aren't lost
+    producer.send(sha1('1'), b'first')
+    sw_consumers = [spider_log.consumer(partition_id=i, type=b'sw') for i in range(2)]
+    db_consumer = spider_log.consumer(partition_id=None, type=b'db')
+    for i in range(10):
+        producer.send(sha1(str(i)), b'message')
+
+    # every group gets all messages, split by partitions in group
+    sw_messages = [list(c.get_messages(timeout=0.1, count=100)) for c in sw_consumers]
+    assert sum(len(messages) for messages in sw_messages) == 11 and all(sw_messages)
+    assert len(db_consumer.get_messages(timeout=0.1, count=5)) == 5
+    assert len(db_consumer.get_messages(timeout=0.1, count=100)) == 6
+    assert db_consumer.get_messages(timeout=0.1, count=100) == []
+    assert producer.get_offset(0) + producer.get_offset(1) == 11
+    # consumed messages aren't kept
+    topic = spider_log.topic
+    assert all(len(partition.messages) == 0 for partition in topic.partitions)
+
+
+def test_memory_message_bus_late_group():
+    settings = Settings()
+    settings.set('SPIDER_LOG_TOPIC', 'test-memory-late-group')
+    spider_log = MemoryMessageBus(settings).spider_log()
+    producer = spider_log.producer()
+    sw_consumer = spider_log.consumer(partition_id=0, type=b'sw')
+    for i in range(5):
+        producer.send(sha1(str(i)), b'message')
+    assert len(sw_consumer.get_messages(timeout=0.1, count=100)) == 5
+    # messages are kept for expected group, which consumer is created later
+    db_consumer = spider_log.consumer(partition_id=None, type=b'db')
+    assert len(db_consumer.get_messages(timeout=0.1, count=100)) == 5
+    assert len(spider_log.topic.partitions[0].messages) == 0
+
+
+def test_memory_message_bus_max_messages():
+    settings = Settings()
+    settings.set('STATS_LOG_TOPIC', 'test-memory-max-messages')
+    settings.set('MEMORY_BUS_MAX_MESSAGES', 10)
+    stats_log = MemoryMessageBus(settings).stats_log()
+    producer = stats_log.producer()
+    for i in range(25):
+        producer.send(None, i)
+    # stream nobody reads is bounded
+    assert len(stats_log.topic.partitions[0].messages) == 10
+    assert producer.get_offset(0) == 25
+    consumer = stats_log.consumer()
+    assert consumer.get_messages(timeout=0.1, count=100) == list(range(15, 25))
@@ -59,6 +59,33 @@ class TestMessageBusBackend(unittest.TestCase):
         _, error_request, error_message = mbb._decoder.decode(mbb.spider_log_producer.messages[0])
         self.assertEqual((error_request.url, error_message), (r1.url, 'error'))
 
+    def test_batched_spider_log(self):
+        settings = Settings()
+        settings.MESSAGE_BUS_BATCH_SIZE = 3
+        settings.MESSAGE_BUS_BATCH_DELAY = 60.0
+        mbb = self.mbb_setup(settings)
+        producer = mbb.spider_log_producer.producer
+        for _ in range(4):
+            mbb.request_error(r1, 'error')
+        mbb.request_error(r2, 'error')
+        self.assertEqual(len(producer.messages), 1)
+        events = list(mbb._decoder.decode_messages(producer.messages[0]))
+        self.assertEqual([(e[0], e[1].url) for e in events], [('request_error', r1.url)] * 3)
+        mbb.frontier_stop()
+        events = [e for m in producer.messages[1:] for e in mbb._decoder.decode_messages(m)]
+        self.assertEqual(sorted(e[1].url for e in events), sorted([r1.url, r2.url]))
+
+    def test_batched_spider_log_delay(self):
+        settings = Settings()
+        settings.MESSAGE_BUS_BATCH_SIZE = 100
+        settings.MESSAGE_BUS_BATCH_DELAY = 0.0
+        mbb = self.mbb_setup(settings)
+        producer = mbb.spider_log_producer.producer
+        mbb.request_error(r1, 'error')
+        mbb.request_error(r1, 'error')
+        self.assertEqual(len(producer.messages), 2)
+        self.assertEqual(mbb.spider_log_producer.pending, {})
+
     def test_get_next_requests(self):
         mbb = self.mbb_setup()
         encoded_requests = [mbb._encoder.encode_request(r) for r in [r1, r2, r3]]
@@ -0,0 +1,51 @@
+from __future__ import absolute_import
+from frontera.utils.timingwheel import TimingWheel
+import random
+
+
+class TestTimingWheel(object):
+
+    def test_release_order(self):
+        wheel = TimingWheel(resolution=1.0, slots=4, levels=2)
+        wheel.add(b'a', 3)
+        wheel.add(b'b', 1)
+        wheel.add(b'c', 10)
+        wheel.add(b'd', 100)
+        assert len(wheel) == 4
+        assert wheel.advance(0) == []
+        assert wheel.advance(1) == [b'b']
+        assert wheel.advance(5) == [b'a']
+        assert wheel.advance(9) == []
+        assert wheel.advance(10) == [b'c']
+        assert wheel.advance(99) == []
+        assert wheel.advance(100) == [b'd']
+        assert len(wheel) == 0
+
+    def test_remove_and_move(self):
+        wheel = TimingWheel(resolution=1.0, slots=4, levels=2)
+        wheel.add(b'a', 5)
+        wheel.add(b'b', 5)
+        wheel.add(b'a', 12)
+        wheel.remove(b'b')
+        assert b'b' not in wheel
+        assert wheel.advance(11) == []
+        assert wheel.advance(12) == [b'a']
+
+    def test_past_due(self):
+        wheel = TimingWheel(resolution=1.0, slots=4, levels=2, start=100.0)
+        wheel.advance(110)
+        wheel.add(b'a', 50)
+        assert wheel.advance(110) == [b'a']
+
+    def test_random(self):
+        random.seed(1)
+        wheel = TimingWheel(resolution=0.5, slots=8, levels=3)
+        due = dict((i, random.uniform(0, 1000)) for i in range(2000))
+        for key, t in due.items():
+            wheel.add(key, t)
+        now = 0.0
+        while now < 1010:
+            last, now = now, now + random.uniform(0, 20)
+            for key in wheel.advance(now):
+                assert last - 0.5 < due.pop(key) <= now
+        assert not due
@@ -1,5 +1,5 @@
 from frontera.core.models import Request, Response
-from frontera.worker.db import DBWorker, ScoringConsumer, IncomingConsumer, BatchGenerator
+from frontera.worker.db import DBWorker, ScoringConsumer, IncomingConsumer, BatchGenerator, QueueEvictor
 from frontera.settings import Settings
 from frontera.core.components import States
 import unittest
@@ -12,8 +12,8 @@ r3 = Request('https://www.dmoz.org', meta={b'fingerprint': b'3', b'state': State
 
 class TestDBWorker(unittest.TestCase):
 
-    def dbw_setup(self, distributed=False):
-        settings = Settings()
+    def dbw_setup(self, distributed=False, **kwargs):
+        settings = Settings(attributes=kwargs)
         settings.MAX_NEXT_REQUESTS = 64
         settings.MESSAGE_BUS = 'tests.mocks.message_bus.FakeMessageBus'
         if distributed:
@@ -48,6 +48,18 @@ class TestDBWorker(unittest.TestCase):
         assert incoming_consumer.backend.errors[0][0].url == r1.url
         assert incoming_consumer.backend.errors[0][1] == 'error'
 
+    def test_batch_consumed(self):
+        dbw = self.dbw_setup()
+        msgs = [dbw._encoder.encode_page_crawled(Response(r1.url, request=r1)), dbw._encoder.encode_new_job_id(1),
+                dbw._encoder.encode_request_error(r2, 'error')]
+        incoming_consumer = dbw.slot.components[IncomingConsumer]
+        incoming_consumer.spider_log_consumer.put_messages([dbw._encoder.encode_batch(msgs)])
+        incoming_consumer.run()
+        # every message of the batch is handled and counted once
+        assert [r.url for r in incoming_consumer.backend.responses] == [r1.url]
+        assert incoming_consumer.backend.errors[0][0].url == r2.url
+        assert dbw.stats['last_consumed'] == 3
+
     def test_scoring(self):
         dbw = self.dbw_setup(True)
         batch_gen = dbw.slot.components[BatchGenerator]
@@ -62,6 +74,35 @@ class TestDBWorker(unittest.TestCase):
         batch_gen.run()
         assert dbw.stats["last_batch_size"] == 2
 
+    def test_scoring_express_lane(self):
+        dbw = self.dbw_setup(True, EXPRESS_LANE_ENABLED=True, EXPRESS_LANE_RATE=0.001, EXPRESS_LANE_BURST=1)
+        express = [r.copy() for r in [r1, r3]]
+        for r in express:
+            r.meta[b'express'] = True
+        msgs = [dbw._encoder.encode_update_score(express[0], 0.9, True),
+                dbw._encoder.encode_update_score(r2, 0.5, True),
+                dbw._encoder.encode_update_score(express[1], 0.9, True)]
+        scoring_worker = dbw.slot.components[ScoringConsumer]
+        scoring_worker.scoring_log_consumer.put_messages(msgs)
+        scoring_worker.run()
+        # only one express request fits the cap, another one is queued as usual
+        queued = [r.url for r in dbw.backend.queue.requests]
+        assert len(queued) == 2 and r2.url in queued
+        pushed = [r for r in express if r.url not in queued]
+        assert scoring_worker.spider_feed_producer.messages == [dbw._encoder.encode_request(pushed[0])]
+        assert dbw.stats["express_pushed_since_start"] == 1
+
+    def test_scoring_express_lane_no_key(self):
+        dbw = self.dbw_setup(True, EXPRESS_LANE_ENABLED=True, QUEUE_HOSTNAME_PARTITIONING=True)
+        # request without domain can't be partitioned by hostname, so it's queued as usual
+        request = Request('http://www.example.com/', meta={b'fingerprint': b'4', b'express': True})
+        scoring_worker = dbw.slot.components[ScoringConsumer]
+        scoring_worker.scoring_log_consumer.put_messages([dbw._encoder.encode_update_score(request, 0.9, True)])
+        scoring_worker.run()
+        assert [r.url for r in dbw.backend.queue.requests] == [request.url]
+        assert scoring_worker.spider_feed_producer.messages == []
+        assert dbw.stats["express_pushed_since_start"] == 0
+
     def test_new_batch(self):
         dbw = self.dbw_setup(True)
         batch_gen = dbw.slot.components[BatchGenerator]
@@ -71,6 +112,44 @@ class TestDBWorker(unittest.TestCase):
         assert set(batch_gen.spider_feed_producer.messages) == \
             set([dbw._encoder.encode_request(r) for r in [r1, r2, r3]])
 
+    def test_new_batch_politeness(self):
+        dbw = self.dbw_setup(True, POLITENESS_ENABLED=True, POLITENESS_DEFAULT_DELAY=10.0, POLITENESS_HORIZON=10.0)
+        batch_gen = dbw.slot.components[BatchGenerator]
+        r4 = r1.copy()
+        r4.meta[b'fingerprint'] = b'4'
+        batch_gen.backend.queue.put_requests([r1, r2, r4])
+        batch_gen.run()
+        assert dbw.stats["last_batch_size"] == 2
+        assert dbw.stats["politeness_pending"] == 1
+        assert set(batch_gen.spider_feed_producer.messages) == \
+            set([dbw._encoder.encode_request(r) for r in [r1, r2]])
+        # held requests go back to the queue on stop
+        batch_gen.close()
+        assert batch_gen.politeness.get_pending_count() == 0
+        assert batch_gen.backend.queue.count() == 1
+
+    def test_queue_eviction(self):
+        dbw = self.dbw_setup(True, QUEUE_PARTITION_CAPACITY=1)
+        evictor = dbw.slot.components[QueueEvictor]
+        requests = [r.copy() for r in [r1, r2, r3]]
+        dbw.backend.queue.put_requests(requests)
+        evictor.run()
+        assert dbw.stats["evicted_since_start"] == 2
+        assert dbw.backend.queue.requests == requests[:1]
+        # states are reset by strategy worker, fingerprints are sent to it in spider log
+        messages = [dbw._decoder.decode(msg) for msg in evictor.spider_log_producer.messages]
+        assert [typ for typ, _ in messages] == ['requests_evicted']
+        assert set(messages[0][1]) == set(r.meta[b'fingerprint'] for r in requests[1:])
+
+    def test_queue_eviction_disabled(self):
+        dbw = self.dbw_setup(True)
+        assert QueueEvictor not in dbw.slot.components
+
+    def test_get_queue_counts(self):
+        dbw = self.dbw_setup(True)
+        dbw.backend.queue.put_requests([r1, r2, r3])
+        assert dbw.get_queue_counts() == {'count': 3, 'partitions': {0: 3}}
+
     def test_offset(self):
         dbw = self.dbw_setup(True)
         incoming_worker = dbw.slot.components[IncomingConsumer]
@@ -116,4 +116,21 @@ class TestStrategyWorker(TestCase):
         sw.work()
         sw.workflow.states_context.states.set_states(r4)
 
-        assert r4.meta[b'state'] == States.ERROR
\ No newline at end of file
+        assert r4.meta[b'state'] == States.ERROR
+
+    def test_requests_evicted(self):
+        sw = self.sw
+        states = sw.workflow.states_context.states
+        queued, crawled = r1.copy(), r2.copy()
+        queued.meta[b'state'] = States.QUEUED
+        crawled.meta[b'state'] = States.CRAWLED
+        states.update_cache([queued, crawled])
+        msg = sw._encoder.encode_requests_evicted([b'1', b'2'])
+        sw.consumer.put_messages([msg])
+        sw.work()
+        queued, crawled = r1.copy(), r2.copy()
+        states.set_states([queued, crawled])
+        # only queued requests could be evicted, other states are kept
+        assert queued.meta[b'state'] == States.NOT_CRAWLED
+        assert crawled.meta[b'state'] == States.CRAWLED
+        assert sw.stats['consumed_requests_evicted'] == 1
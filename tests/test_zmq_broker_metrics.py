@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import json
+from struct import pack
+
+from six.moves.urllib.request import urlopen
+
+from frontera.contrib.messagebus.zeromq.metrics import BrokerMetrics, MetricsExporter, flatten, get_sequenced_channels
+from frontera.settings import Settings
+
+
+def message(identity, partition_id, seqno, body=b'message'):
+    topic = identity + pack('>B', partition_id) if partition_id is not None else identity
+    return [topic, body, pack('>II', seqno, seqno)]
+
+
+def test_broker_metrics_messages():
+    metrics = BrokerMetrics()
+    for seqno in range(10):
+        metrics.message(message(b'sl', seqno % 2, seqno))
+    metrics.message(message(b'us', None, 0))
+    snapshot = metrics.snapshot()
+    spider_log = snapshot['channels']['spider_log']
+    assert spider_log['messages'] == 10
+    assert spider_log['bytes'] == 10 * (3 + 7 + 8)
+    assert spider_log['messages_per_second'] > 0
+    assert spider_log['partitions']['0']['messages'] == 5
+    assert spider_log['partitions']['1']['messages'] == 5
+    assert snapshot['channels']['scoring_log']['messages'] == 1
+    assert snapshot['channels']['scoring_log']['partitions'] == {}
+    # interleaved sequence numbers of spider log producers aren't drops
+    assert spider_log['dropped'] == 0
+
+    # rates are calculated since previous snapshot
+    assert metrics.snapshot()['channels']['spider_log']['messages_per_second'] == 0
+
+
+def test_broker_metrics_dropped():
+    metrics = BrokerMetrics()
+    for seqno in [0, 1, 2, 5, 6, 10]:
+        metrics.message(message(b'sf', 3, seqno))
+    # restarted producer
+    metrics.message(message(b'sf', 3, 0))
+    metrics.message(message(b'sf', 4, 7))
+    spider_feed = metrics.snapshot()['channels']['spider_feed']
+    assert spider_feed['dropped'] == 5
+    assert spider_feed['partitions']['3']['dropped'] == 5
+    assert spider_feed['partitions']['4']['dropped'] == 0
+
+
+def test_broker_metrics_express_lane():
+    settings = Settings()
+    assert get_sequenced_channels(settings) == frozenset(['spider_feed'])
+    settings.set('EXPRESS_LANE_ENABLED', True)
+    # interleaved sequence numbers of batch generator and express lane producers aren't drops
+    metrics = BrokerMetrics(get_sequenced_channels(settings))
+    for seqno in [0, 100, 1, 101, 2]:
+        metrics.message(message(b'sf', 0, seqno))
+    spider_feed = metrics.snapshot()['channels']['spider_feed']
+    assert spider_feed['messages'] == 5 and spider_feed['dropped'] == 0
+
+
+def test_broker_metrics_subscriptions():
+    metrics = BrokerMetrics()
+    subscribe, unsubscribe = [b'\x01sf\x00'], [b'\x00sf\x00']
+    # only the first subscription and the last unsubscription are forwarded to producers
+    assert metrics.subscription('spiders_in', subscribe)
+    assert not metrics.subscription('spiders_in', subscribe)
+    assert metrics.subscription('sw_in', [b'\x01sl\x01'])
+    assert metrics.subscription('db_in', [b'\x01sl'])
+    snapshot = metrics.snapshot()
+    assert snapshot['channels']['spider_feed']['subscribers'] == 2
+    assert snapshot['channels']['spider_feed']['partitions']['0']['subscribers'] == 2
+    assert snapshot['channels']['spider_log']['subscribers'] == 2
+    assert snapshot['channels']['spider_log']['partitions']['1']['subscribers'] == 1
+
+    assert not metrics.subscription('spiders_in', unsubscribe)
+    assert metrics.subscription('spiders_in', unsubscribe)
+    assert not metrics.subscription('spiders_in', unsubscribe)
+    assert metrics.snapshot()['channels']['spider_feed']['subscribers'] == 0
+
+
+def test_broker_metrics_flatten():
+    metrics = BrokerMetrics()
+    metrics.message(message(b'sf', 2, 0))
+    metrics.set_channel('scoring_log', 100, 1000)
+    stats = flatten(metrics.snapshot())
+    assert stats['spider_feed_messages'] == 1
+    assert stats['spider_feed_2_bytes'] == 3 + 7 + 8
+    assert stats['scoring_log_bytes'] == 1000
+    assert 'spider_feed_partitions' not in stats and 'uptime' in stats
+
+
+def test_broker_metrics_http():
+    settings = Settings()
+    settings.set('ZMQ_BROKER_METRICS_PORT', 5690)
+    metrics = BrokerMetrics()
+    exporter = MetricsExporter(metrics, settings)
+    try:
+        metrics.message(message(b'sl', 0, 0))
+        exporter.export()
+        response = urlopen('http://127.0.0.1:5690/metrics')
+        assert response.headers['Content-Type'] == 'application/json'
+        snapshot = json.loads(response.read().decode('utf-8'))
+        assert snapshot['channels']['spider_log']['partitions']['0']['messages'] == 1
+    finally:
+        exporter.close()
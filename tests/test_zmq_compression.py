@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import pytest
+
+from frontera.contrib.messagebus.zeromq.compression import FrameCompression, BUILTIN_DICTIONARY
+from frontera.settings import Settings
+
+
+FRAME = b''.join(b'http://www.example.com/catalog/item-%d.html' % i for i in range(100))
+
+
+@pytest.mark.parametrize('dictionary', [None, BUILTIN_DICTIONARY])
+def test_frame_compression(dictionary):
+    stats = {}
+    compression = FrameCompression('zlib', level=6, dictionary=dictionary)
+    compressed, extra = compression.compress(FRAME, stats, 'producer-sl')
+    assert len(extra) == 1 and len(compressed) < len(FRAME)
+    assert stats['producer-sl-raw-bytes'] == len(FRAME)
+    assert stats['producer-sl-compressed-bytes'] == len(compressed)
+    assert stats['producer-sl-compression-ratio'] == float(len(FRAME)) / len(compressed)
+
+    # consumers decompress frames without compression of their own
+    consumer = FrameCompression(dictionary=dictionary)
+    assert consumer.compress(FRAME, stats, 'producer-sf') == (FRAME, [])
+    assert consumer.decompress(compressed, extra[0], stats, 'consumer-sl') == FRAME
+    assert 'consumer-sl-decompression-time' in stats
+
+
+def test_frame_compression_settings():
+    settings = Settings()
+    assert FrameCompression.from_settings(settings).codec is None
+    settings.set('ZMQ_COMPRESSION', 'zlib')
+    settings.set('ZMQ_COMPRESSION_DICTIONARY', 'builtin')
+    compression = FrameCompression.from_settings(settings)
+    assert compression.dictionary == BUILTIN_DICTIONARY
+    assert compression.compress(b'short', {}, 'producer-sl') == (b'short', [])
+
+    compressed, extra = compression.compress(FRAME, {}, 'producer-sl')
+    with pytest.raises(ValueError):
+        FrameCompression().decompress(compressed, extra[0], {}, 'consumer-sl')
+    with pytest.raises(ValueError):
+        FrameCompression('snappy')